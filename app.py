@@ -1 +1,36 @@
-// ... conteúdo completo do app.py ...
\ No newline at end of file
+// ... conteúdo completo do app.py ...
+# Exportações geradas em segundo plano
+from routes.exports import exports_bp
+app.register_blueprint(exports_bp)
+
+# Importação em massa de produtos e clientes
+from routes.imports import imports_bp
+app.register_blueprint(imports_bp)
+
+# Busca textual em clientes, produtos e vendas
+from routes.search import search_bp
+app.register_blueprint(search_bp)
+
+# Comandos de linha de comando (flask <comando>)
+import commands
+
+# Métricas por requisição e log de requisições lentas
+from routes.metrics import metrics_bp
+app.register_blueprint(metrics_bp)
+
+# Perfis de desempenho sob demanda (?_profile=1, só administradores)
+from routes.profiles import profiles_bp
+app.register_blueprint(profiles_bp)
+
+# Atrás do roteador do Heroku (ou de um nginx) o remote_addr é o IP do proxy e
+# todos os clientes dividiriam o mesmo limite de tentativas de login e cadastro.
+# PROXY_FIX_HOPS é o número de proxies confiáveis na frente da aplicação
+# (configuração ou variável de ambiente; o Procfile usa 1, para o roteador do
+# Heroku). O padrão é 0, que ignora os cabeçalhos X-Forwarded-*: sem proxy na
+# frente (gunicorn direto, desenvolvimento), o cliente poderia escolher o
+# próprio IP e escapar do limite.
+import os
+from werkzeug.middleware.proxy_fix import ProxyFix
+_proxy_hops = int(app.config.get('PROXY_FIX_HOPS', os.environ.get('PROXY_FIX_HOPS') or 0))
+if _proxy_hops:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=_proxy_hops, x_proto=_proxy_hops)
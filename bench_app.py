@@ -0,0 +1,420 @@
+import argparse
+import io
+import json
+import platform
+import random
+import resource
+import subprocess
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import app
+from config import db
+from models import User, Category, Client, ClientImage, Product, ProductImage, Sale, InventoryMovement
+
+# Benchmark das páginas mais usadas. Três comandos:
+#
+#   seed     gera um conjunto de dados sintético (categorias, usuários, clientes,
+#            produtos com imagens e vendas financiadas ou não ao longo de vários
+#            anos) direto no banco configurado, já criado pelas migrações
+#            (flask db upgrade). Com a mesma --seed os dados são sempre os mesmos.
+#   run      percorre as páginas com o test client do Flask e grava em JSON a
+#            latência (p50/p95/p99), as consultas SQL por requisição e o pico de
+#            memória (RSS). Cria e finaliza vendas: para comparar execuções,
+#            gere os dados de novo antes de cada uma.
+#   compare  compara dois resultados (ex.: antes e depois de um commit).
+#
+# Uso:
+#   python bench_app.py seed [--clients 2000] [--products 500] [--sales 50000] [--years 3] [--seed 42]
+#   python bench_app.py run [--requests 50] [--output resultado.json]
+#   python bench_app.py compare antes.json depois.json
+
+BATCH_SIZE = 5000
+PASSWORD = 'benchmark'
+
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduardo', 'Fernanda', 'Gabriel', 'Helena', 'Igor',
+               'Juliana', 'Kenji', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sakura',
+               'Thiago', 'Vanessa', 'Yuki', 'José', 'Maria', 'João', 'Márcia']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida',
+              'Nakamura', 'Tanaka', 'Suzuki', 'Yamamoto', 'Watanabe', 'Ito', 'Carvalho', 'Gomes', 'Araújo']
+CITIES = ['Hamamatsu-shi, Shizuoka', 'Toyota-shi, Aichi', 'Oizumi-machi, Gunma', 'Ota-shi, Gunma',
+          'Suzuka-shi, Mie', 'Kani-shi, Gifu', 'Toyohashi-shi, Aichi', 'Kawasaki-shi, Kanagawa']
+CATEGORIES = ['Eletrônicos', 'Móveis', 'Eletrodomésticos', 'Informática', 'Celulares', 'Decoração',
+              'Cama e Banho', 'Ferramentas', 'Esporte', 'Brinquedos']
+PRODUCT_WORDS = ['Smart', 'Pro', 'Max', 'Plus', 'Compacto', 'Premium', 'Básico', 'Slim', 'Ultra', 'Duo']
+STATUSES = (['completed'] * 14) + (['pending'] * 2) + ['negotiating'] + (['cancelled'] * 3)
+
+
+# Geração dos dados
+
+def _insert(model, rows, return_defaults=False):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.bulk_insert_mappings(model, rows[start:start + BATCH_SIZE], return_defaults=return_defaults)
+
+def _image(rng, label):
+    # JPEG pequeno e distinto por imagem, para as rotas de imagem e miniaturas
+    from PIL import Image, ImageDraw
+    image = Image.new('RGB', (480, 360), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(480), rng.randrange(360)
+        draw.rectangle([x, y, x + rng.randrange(20, 160), y + rng.randrange(20, 120)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    draw.text((20, 20), label, fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+def _store_images(rng, count, prefix):
+    from services.blob_store import get_blob_store
+    store = get_blob_store()
+    return [store.put(_image(rng, f'{prefix} {number}')) for number in range(count)]
+
+def seed(options):
+    from services.passwords import hash_password
+    from services.financing import monthly_payments, financed_totals
+    rng = random.Random(options.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.monotonic()
+
+    if Sale.query.first() is not None and not options.force:
+        raise SystemExit('O banco já tem vendas. Use um banco vazio ou --force para acrescentar os dados.')
+
+    # Um único hash para todos os usuários gerados
+    password = hash_password(PASSWORD)
+    tag = now.strftime('%Y%m%d%H%M%S')
+    users = [{'username': f'bench-{tag}-{number}', 'email': f'bench-{tag}-{number}@example.com',
+              'password': password, 'is_admin': number == 0, 'created_at': now}
+             for number in range(options.users)]
+    _insert(User, users, return_defaults=True)
+
+    categories = [{'name': f'{name} {tag}' if options.force else name, 'created_at': now} for name in CATEGORIES]
+    _insert(Category, categories, return_defaults=True)
+
+    clients = []
+    for number in range(options.clients):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}'
+        clients.append({
+            'full_name': name,
+            'japan_address': f'{rng.randint(1, 9)}-{rng.randint(1, 30)}-{rng.randint(1, 20)} {rng.choice(CITIES)}',
+            'japan_phone': f'090-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}',
+            'japan_id': f'bench-{tag}-{number}',
+            'email': f'cliente-{tag}-{number}@example.com',
+            'created_at': now,
+            'updated_at': now,
+        })
+    _insert(Client, clients, return_defaults=True)
+
+    products = []
+    for number in range(options.products):
+        category = rng.choice(categories)
+        price = rng.randrange(5, 400) * 1000
+        products.append({
+            'name': f'{category["name"].split()[0]} {rng.choice(PRODUCT_WORDS)} {number}',
+            'description': f'{category["name"]} modelo {rng.choice(PRODUCT_WORDS)} {number}',
+            'price': price,
+            'stock': rng.randint(0, 100),
+            'reserved': 0,
+            'is_active': True,
+            'data_entrada': now - timedelta(days=rng.randint(0, options.years * 365)),
+            'created_at': now,
+            'updated_at': now,
+            'custo1': round(price * rng.uniform(0.3, 0.6)),
+            'custo2': round(price * rng.uniform(0, 0.1)),
+            'custo3': 0, 'custo4': 0, 'custo5': 0,
+            'category_id': category['id'],
+        })
+
+    # Vendas ao longo de `years` anos; pendentes reservam estoque e finalizadas
+    # já saíram do estoque (sold)
+    sales = []
+    sold = {}
+    for _ in range(options.sales):
+        product = rng.choice(products)
+        quantity = rng.choice((1, 1, 1, 2, 3))
+        status = rng.choice(STATUSES)
+        discount = rng.choice((0, 0, 0, 5, 10))
+        original_price = round(product['price'] * quantity)
+        total_price = round(original_price * (1 - discount / 100))
+        financed = rng.random() < options.financed
+        sale_date = now - timedelta(days=rng.randint(0, options.years * 365), minutes=rng.randint(0, 1440))
+        if status in ('pending', 'negotiating'):
+            product['reserved'] += quantity
+        elif status == 'completed':
+            sold[id(product)] = sold.get(id(product), 0) + quantity
+        sales.append({
+            'client_id': rng.choice(clients)['id'],
+            'product_id': product,  # trocado pelo id depois de inserir os produtos
+            'seller_id': rng.choice(users)['id'],
+            'quantity': quantity,
+            'original_price': original_price,
+            'discount_percentage': discount,
+            'total_price': total_price,
+            'status': status,
+            'stock_updated': status == 'completed',
+            'notes': rng.choice(('', '', '', 'Entrega agendada', 'Cliente indicado', 'Pagamento em dinheiro')),
+            'sale_date': sale_date,
+            'updated_at': sale_date,
+            'is_financed': financed,
+            'financing_years': rng.randint(1, 5) if financed else None,
+            'interest_rate': rng.choice((3.0, 5.0, 8.0, 12.0)) if financed else None,
+            'monthly_payment': total_price,
+            'total_financed': total_price,
+            'total_amount': total_price,
+        })
+
+    for product in products:
+        product['stock'] = max(product['stock'], product['reserved'])
+        product['is_active'] = product['stock'] > 0
+    _insert(Product, products, return_defaults=True)
+
+    financed = [sale for sale in sales if sale['is_financed']]
+    if financed:
+        terms = ([sale['total_price'] for sale in financed],
+                 [sale['interest_rate'] for sale in financed],
+                 [sale['financing_years'] for sale in financed])
+        payments = monthly_payments(*terms)
+        totals = financed_totals(*terms, payments)
+        for sale, payment, total in zip(financed, payments.tolist(), totals.tolist()):
+            sale['monthly_payment'] = payment
+            sale['total_financed'] = sale['total_amount'] = total
+    # Livro de estoque consistente com Product.stock (flask inventory reconcile):
+    # a entrada inicial cobre o estoque atual mais o que foi vendido, e cada
+    # venda finalizada tem a sua saída, como em services/stock.py
+    started_at = now - timedelta(days=options.years * 365 + 1)
+    movements = [{'product_id': product['id'], 'quantity': product['stock'] + sold.get(id(product), 0),
+                  'reason': 'initial', 'created_at': started_at}
+                 for product in products if product['stock'] + sold.get(id(product), 0)]
+    for sale in sales:
+        sale['product_id'] = sale['product_id']['id']
+    _insert(Sale, sales, return_defaults=True)
+    movements.extend({'product_id': sale['product_id'], 'quantity': -sale['quantity'], 'reason': 'sale',
+                      'sale_id': sale['id'], 'created_at': sale['sale_date']}
+                     for sale in sales if sale['status'] == 'completed')
+    _insert(InventoryMovement, movements)
+
+    # Imagens: um conjunto de arquivos distintos reaproveitado entre os registros
+    product_digests = _store_images(rng, options.distinct_images, 'Produto')
+    _insert(ProductImage, [
+        {'product_id': product['id'], 'mime_type': 'image/jpeg', 'content_hash': rng.choice(product_digests),
+         'created_at': now}
+        for product in products for _ in range(options.images_per_product)
+    ])
+    client_digests = _store_images(rng, max(1, options.distinct_images // 4), 'Cliente')
+    _insert(ClientImage, [
+        {'client_id': client['id'], 'mime_type': 'image/jpeg', 'content_hash': rng.choice(client_digests),
+         'created_at': now}
+        for client in clients if rng.random() < options.client_images
+    ])
+    db.session.commit()
+
+    # Tabelas derivadas, como depois de uma importação
+    from services import sales_rollup, financing, search
+    sales_rollup.rebuild()
+    financing.rebuild()
+    search.rebuild()
+    print(f'Gerados: {len(users)} usuários, {len(clients)} clientes, {len(products)} produtos, '
+          f'{len(sales)} vendas ({len(financed)} financiadas) em {time.monotonic() - started:.1f}s.')
+    print(f'Administrador: {users[0]["email"]} / {PASSWORD}')
+
+
+# Execução
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+def peak_rss_mb():
+    # ru_maxrss vem em KB no Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def _sale_form(rng, product_id, client_id):
+    return {
+        'product_id': product_id, 'client_id': client_id, 'quantity': 1, 'discount_percentage': 0,
+        'sale_date': datetime.utcnow().strftime('%Y-%m-%d'), 'financing_years': rng.randint(1, 5),
+        'interest_rate': 5, 'is_financed': 'y' if rng.random() < 0.3 else '', 'notes': 'benchmark',
+    }
+
+def scenarios(rng):
+    # (nome, método, função que devolve (url, dados))
+    product_ids = [product_id for (product_id,) in db.session.query(Product.id)
+                   .filter(Product.is_active.is_(True), Product.stock - Product.reserved > 10).limit(500)]
+    client_ids = [client_id for (client_id,) in db.session.query(Client.id).limit(500)]
+    product_images = [image_id for (image_id,) in db.session.query(ProductImage.id).limit(500)]
+    client_images = [image_id for (image_id,) in db.session.query(ClientImage.id).limit(500)]
+    pending = [sale_id for (sale_id,) in db.session.query(Sale.id)
+               .filter(Sale.status == 'pending').order_by(Sale.id.desc()).limit(5000)]
+    rng.shuffle(pending)
+    result = [
+        ('dashboard', 'GET', lambda: ('/dashboard', None)),
+        ('sales', 'GET', lambda: ('/sales', None)),
+        ('sales_data', 'GET', lambda: ('/sales/data?page=2', None)),
+        ('products_gallery', 'GET', lambda: ('/products/gallery', None)),
+        ('clients', 'GET', lambda: ('/clients', None)),
+    ]
+    if product_images:
+        result.append(('product_image', 'GET', lambda: (f'/product/image/{rng.choice(product_images)}', None)))
+    if client_images:
+        result.append(('client_image', 'GET', lambda: (f'/client/image/{rng.choice(client_images)}', None)))
+    if product_ids and client_ids:
+        result.append(('sale_create', 'POST', lambda: (
+            '/sales/new', _sale_form(rng, rng.choice(product_ids), rng.choice(client_ids)))))
+    if pending:
+        # Cada venda só pode ser finalizada uma vez: sem pendentes, o cenário para
+        result.append(('sale_complete', 'POST',
+                       lambda: (f'/sales/{pending.pop()}/complete', None) if pending else None))
+    return result
+
+def run(options):
+    rng = random.Random(options.seed)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        admin = User.get_active_users().filter_by(is_admin=True).first()
+        if admin is None:
+            raise SystemExit('Nenhum administrador cadastrado (rode antes: python bench_app.py seed).')
+        dataset = {
+            'clients': Client.query.count(),
+            'products': Product.query.count(),
+            'sales': Sale.query.count(),
+            'product_images': ProductImage.query.count(),
+        }
+        engine = db.engine
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(1))
+
+    results = {}
+    with app.app_context():
+        scenario_list = scenarios(rng)
+    for name, method, request_for in scenario_list:
+        if options.only and name not in options.only:
+            continue
+        latencies, counts, sizes, errors = [], [], [], 0
+        for number in range(options.warmup + options.requests):
+            request = request_for()
+            if request is None:
+                print(f'{name}: dados esgotados depois de {max(0, number - options.warmup)} requisições '
+                      f'(gere os dados de novo ou use menos --requests)')
+                break
+            url, data = request
+            queries.clear()
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            elapsed = (time.perf_counter() - started) * 1000
+            body = response.get_data()
+            if number < options.warmup:
+                continue
+            # Formulário recusado volta para a própria página
+            if response.status_code >= 400 or (method == 'POST' and (response.location or '').endswith(url)):
+                errors += 1
+            latencies.append(elapsed)
+            counts.append(len(queries))
+            sizes.append(len(body))
+        if not latencies:
+            continue
+        results[name] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(max(latencies), 2),
+            'queries_p50': percentile(counts, 0.5),
+            'queries_max': max(counts),
+            'bytes_p50': percentile(sizes, 0.5),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        print(f'{name:<18} p50 {results[name]["p50_ms"]:>8.1f} ms  p95 {results[name]["p95_ms"]:>8.1f} ms  '
+              f'p99 {results[name]["p99_ms"]:>8.1f} ms  consultas {results[name]["queries_p50"]:>3}  '
+              f'erros {errors}')
+
+    report = {
+        'commit': _commit(),
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': engine.dialect.name,
+        'dataset': dataset,
+        'requests_per_scenario': options.requests,
+        'scenarios': results,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    print(f'Pico de memória: {report["peak_rss_mb"]} MB')
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Resultado gravado em {options.output}')
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Comparação
+
+def compare(options):
+    with open(options.before) as f:
+        before = json.load(f)
+    with open(options.after) as f:
+        after = json.load(f)
+    print(f'{before.get("commit") or options.before} -> {after.get("commit") or options.after}')
+    for name, new in after['scenarios'].items():
+        old = before['scenarios'].get(name)
+        if old is None:
+            print(f'{name:<18} (novo)')
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0
+            changes.append(f'{key[:-3]} {old[key]:.1f} -> {new[key]:.1f} ms ({change:+.0f}%)')
+        changes.append(f'consultas {old["queries_p50"]} -> {new["queries_p50"]}')
+        print(f'{name:<18} ' + '  '.join(changes))
+    print(f'pico de memória {before["peak_rss_mb"]} -> {after["peak_rss_mb"]} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das páginas principais.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='gera dados sintéticos')
+    seed_parser.add_argument('--clients', type=int, default=2000)
+    seed_parser.add_argument('--products', type=int, default=500)
+    seed_parser.add_argument('--sales', type=int, default=50000)
+    seed_parser.add_argument('--users', type=int, default=5)
+    seed_parser.add_argument('--years', type=int, default=3)
+    seed_parser.add_argument('--financed', type=float, default=0.3, help='fração das vendas financiadas')
+    seed_parser.add_argument('--images-per-product', type=int, default=1)
+    seed_parser.add_argument('--distinct-images', type=int, default=40, help='arquivos de imagem distintos')
+    seed_parser.add_argument('--client-images', type=float, default=0.2, help='fração dos clientes com imagem')
+    seed_parser.add_argument('--seed', type=int, default=42)
+    seed_parser.add_argument('--force', action='store_true', help='acrescenta mesmo se já houver vendas')
+
+    run_parser = commands.add_parser('run', help='mede as páginas')
+    run_parser.add_argument('--requests', type=int, default=50, help='requisições por página')
+    run_parser.add_argument('--warmup', type=int, default=3)
+    run_parser.add_argument('--only', nargs='+', help='páginas a medir (ex.: dashboard sales)')
+    run_parser.add_argument('--output', help='arquivo JSON do resultado')
+    run_parser.add_argument('--seed', type=int, default=42)
+
+    compare_parser = commands.add_parser('compare', help='compara dois resultados')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    options = parser.parse_args()
+    if options.command == 'seed':
+        with app.app_context():
+            seed(options)
+    elif options.command == 'run':
+        run(options)
+    else:
+        compare(options)
+
+if __name__ == '__main__':
+    main()
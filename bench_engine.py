@@ -0,0 +1,114 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from config import app, db
+from services.engine import tuned_engine
+
+# Vazão de escrita com vários processos gravando ao mesmo tempo, com o engine
+# padrão do SQLAlchemy e com o ajuste de services/engine.py. Cada transação
+# insere uma linha e atualiza um contador compartilhado, como uma venda que
+# baixa o estoque do mesmo produto.
+# No SQLite cada modo usa um arquivo temporário novo (o modo WAL fica gravado
+# no arquivo); no PostgreSQL usa o banco configurado, numa tabela temporária
+# bench_engine_write apagada ao final.
+# Uso: python bench_engine.py [--workers 8] [--transactions 200] [--reads 4]
+
+MODES = ('padrao', 'ajustado')
+
+
+def _url(mode, scratch_dir):
+    with app.app_context():
+        url = db.engine.url
+    if url.get_backend_name() == 'sqlite':
+        return make_url(f'sqlite:///{os.path.join(scratch_dir, f"bench-{mode}.db")}')
+    return url
+
+def _engine(mode, url):
+    return tuned_engine(url) if mode == 'ajustado' else create_engine(url)
+
+def setup(mode, url):
+    engine = _engine(mode, url)
+    with engine.begin() as conn:
+        conn.execute(text('DROP TABLE IF EXISTS bench_engine_write'))
+        conn.execute(text('DROP TABLE IF EXISTS bench_engine_counter'))
+        conn.execute(text('CREATE TABLE bench_engine_write (id INTEGER PRIMARY KEY, worker INTEGER, '
+                          'payload VARCHAR(200), created_at FLOAT)'))
+        conn.execute(text('CREATE TABLE bench_engine_counter (id INTEGER PRIMARY KEY, value INTEGER)'))
+        conn.execute(text('INSERT INTO bench_engine_counter (id, value) VALUES (1, 0)'))
+    engine.dispose()
+
+def cleanup(url):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text('DROP TABLE IF EXISTS bench_engine_write'))
+        conn.execute(text('DROP TABLE IF EXISTS bench_engine_counter'))
+    engine.dispose()
+
+def worker(args):
+    mode, url, number, transactions, reads = args
+    engine = _engine(mode, url)
+    latencies, errors = [], 0
+    for sequence in range(transactions):
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                # Leituras da página antes da gravação
+                for _ in range(reads):
+                    conn.execute(text('SELECT count(*) FROM bench_engine_write WHERE worker = :worker'),
+                                 {'worker': number}).scalar()
+                conn.execute(text('INSERT INTO bench_engine_write (worker, payload, created_at) '
+                                  'VALUES (:worker, :payload, :created_at)'),
+                             {'worker': number, 'payload': f'{number}-{sequence}' * 10, 'created_at': time.time()})
+                conn.execute(text('UPDATE bench_engine_counter SET value = value + 1 WHERE id = 1'))
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            # "database is locked" e afins: a transação é perdida
+            errors += 1
+    engine.dispose()
+    return latencies, errors
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+def run(mode, url, workers, transactions, reads):
+    setup(mode, url)
+    jobs = [(mode, url, number, transactions, reads) for number in range(workers)]
+    started = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        results = pool.map(worker, jobs)
+    elapsed = time.perf_counter() - started
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    errors = sum(worker_errors for _, worker_errors in results)
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        counter = conn.execute(text('SELECT value FROM bench_engine_counter WHERE id = 1')).scalar()
+    engine.dispose()
+    print(f'{mode:<9} {len(latencies) / elapsed:>8.0f} transações/s  '
+          f'p50 {percentile(latencies, 0.5) * 1000:>7.1f} ms  p99 {percentile(latencies, 0.99) * 1000:>8.1f} ms  '
+          f'falhas {errors:>4}  contador {counter}/{workers * transactions}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Vazão de escrita concorrente por ajuste do engine.')
+    parser.add_argument('--workers', type=int, default=8, help='processos gravando ao mesmo tempo')
+    parser.add_argument('--transactions', type=int, default=200, help='transações por processo')
+    parser.add_argument('--reads', type=int, default=4, help='consultas antes de cada gravação')
+    parser.add_argument('--mode', choices=MODES, help='roda só um dos modos')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for mode in [options.mode] if options.mode else MODES:
+            url = _url(mode, scratch_dir)
+            try:
+                run(mode, url, options.workers, options.transactions, options.reads)
+            finally:
+                cleanup(url)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from app import app
+from config import db, bcrypt
+from models import User
+from services.passwords import hash_password
+
+# Custo do hash de senhas e latência do login sob carga. Primeiro mede quanto
+# CPU o bcrypt gasta por hash em cada custo (rounds); depois dispara logins
+# simultâneos pela rota /login, que verifica a senha no pool de
+# services/passwords.py, e mostra p50/p99 e quantos foram recusados (503).
+# Cria um usuário próprio e o remove ao final.
+# Uso: python bench_passwords.py [--rounds 10 11 12 13] [--workers 16] [--logins 64]
+
+def bench_rounds(rounds, samples):
+    for log_rounds in rounds:
+        started = time.process_time()
+        wall = time.perf_counter()
+        for _ in range(samples):
+            bcrypt.generate_password_hash('benchmark', rounds=log_rounds)
+        cpu_ms = (time.process_time() - started) * 1000 / samples
+        wall_ms = (time.perf_counter() - wall) * 1000 / samples
+        print(f'rounds={log_rounds}: {cpu_ms:.0f} ms de CPU por hash ({wall_ms:.0f} ms)')
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+def bench_logins(email, password, workers, logins):
+    def login(_):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', data={'email': email, 'password': password})
+        return response.status_code, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    accepted = [ms for status, ms in results if status == 302]
+    rejected = sum(1 for status, _ in results if status == 503)
+    failed = len(results) - len(accepted) - rejected
+    print(f'{logins} logins com {workers} simultâneos em {elapsed:.2f}s: '
+          f'{len(accepted)} aceitos, {rejected} recusados (503), {failed} outros')
+    print(f'latência dos aceitos: p50 {percentile(accepted, 0.5):.0f} ms, '
+          f'p99 {percentile(accepted, 0.99):.0f} ms')
+    rejected_ms = [ms for status, ms in results if status == 503]
+    if rejected_ms:
+        print(f'latência dos recusados: p99 {percentile(rejected_ms, 0.99):.0f} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do hash de senhas e do login.')
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=16, help='logins simultâneos')
+    parser.add_argument('--logins', type=int, default=64)
+    options = parser.parse_args()
+
+    bench_rounds(options.rounds, options.samples)
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    # O limite de tentativas recusaria quase tudo: aqui mede-se só o hash
+    app.config['RATE_LIMIT_ENABLED'] = False
+    tag = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+    email, password = f'bench-{tag}@example.com', f'bench-{tag}'
+    with app.app_context():
+        user = User(username=f'bench-{tag}', email=email, password=hash_password(password), is_admin=False)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    try:
+        bench_logins(email, password, options.workers, options.logins)
+    finally:
+        with app.app_context():
+            db.session.delete(db.session.get(User, user_id))
+            db.session.commit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from app import app
+from config import db
+from models import MailMessage
+from services.mail_queue import enqueue, get_queue, run_worker
+
+# Confere a fila de emails (services/mail_queue.py) entre processos, como em
+# produção (web e worker em dynos diferentes): este processo grava mensagens
+# com enqueue() e WORKERS processos separados as entregam ao mesmo tempo com
+# o transporte 'file'. Cada mensagem deve ser entregue uma única vez e ficar
+# como 'sent'. Precisa de uma fila sem emails pendentes (senão os workers os
+# entregariam em arquivo); as mensagens do teste são apagadas ao final.
+# Uso: python check_mail_queue.py [--messages 20] [--workers 2]
+
+def deliver(path):
+    # Processo worker: entrega o que estiver pendente em arquivos .eml
+    app.config['MAIL_TRANSPORT'] = 'file'
+    app.config['MAIL_FILE_PATH'] = path
+    with app.app_context():
+        sent, failed = run_worker(batch_size=5, once=True)
+    print(f'{sent} {failed}')
+
+def start_worker(path):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])))
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), '--deliver', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+
+def check(message_ids, paths):
+    problems = []
+    delivered = {}
+    for path in paths:
+        for name in os.listdir(path):
+            message_id = int(name.split('.')[0])
+            delivered[message_id] = delivered.get(message_id, 0) + 1
+    missing = sorted(set(message_ids) - set(delivered))
+    if missing:
+        problems.append(f'{len(missing)} mensagem(ns) não entregue(s): {missing[:10]}')
+    repeated = sorted(message_id for message_id, count in delivered.items() if count > 1)
+    if repeated:
+        problems.append(f'{len(repeated)} mensagem(ns) entregue(s) mais de uma vez: {repeated[:10]}')
+    statuses = dict(db.session.query(MailMessage.id, MailMessage.status)
+                    .filter(MailMessage.id.in_(message_ids)))
+    not_sent = sorted(message_id for message_id in message_ids if statuses.get(message_id) != 'sent')
+    if not_sent:
+        problems.append(f'{len(not_sent)} mensagem(ns) não marcada(s) como enviada(s): {not_sent[:10]}')
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Fila de emails entre processos.')
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--deliver', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.deliver:
+        deliver(options.deliver)
+        return 0
+
+    with app.app_context():
+        pending = get_queue().counts()['pending']
+        if pending:
+            print(f'A fila tem {pending} email(s) pendente(s); rode com a fila vazia.')
+            return 1
+        tag = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+        message_ids = [enqueue(f'check_mail_queue {tag} #{number}', [f'check-{number}@example.com'], 'teste')
+                       for number in range(options.messages)]
+        paths = [tempfile.mkdtemp(prefix='check_mail_queue-') for _ in range(options.workers)]
+        try:
+            workers = [start_worker(path) for path in paths]
+            problems = []
+            for worker in workers:
+                stdout, stderr = worker.communicate(timeout=120)
+                if worker.returncode != 0:
+                    problems.append(f'worker terminou com erro:\n{stderr[-2000:]}')
+                else:
+                    print(f'worker {worker.pid}: enviados/falhas {stdout.strip()}')
+            if not problems:
+                problems = check(message_ids, paths)
+        finally:
+            db.session.rollback()
+            MailMessage.query.filter(MailMessage.id.in_(message_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            for path in paths:
+                shutil.rmtree(path, ignore_errors=True)
+
+    for problem in problems:
+        print(f'!! {problem}')
+    print('Fila de emails ok.' if not problems else f'{len(problems)} problema(s).')
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import app
+from config import db
+from models import User
+
+# Conta as consultas SQL de cada página de listagem e falha se alguma passar
+# do orçamento. O número de consultas não deve crescer com o número de linhas
+# (N+1); rode com o banco populado para conferir.
+# Uso: python check_query_budget.py
+
+QUERY_BUDGET = 8
+
+PAGES = [
+    'sales.list_sales',
+    'sales.sales_data',
+    'products.list_products',
+    'products.gallery_products',
+    'clients.list_clients',
+]
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def check_query_budget(budget=QUERY_BUDGET):
+    with app.app_context():
+        admin = User.query.filter_by(is_admin=True).first()
+        if admin is None:
+            print('Nenhum administrador cadastrado.')
+            return 1
+        user_id = admin.id
+        with app.test_request_context():
+            from flask import url_for
+            urls = [(endpoint, url_for(endpoint)) for endpoint in PAGES]
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    problems = 0
+    with app.app_context():
+        for endpoint, url in urls:
+            with count_queries() as statements:
+                response = client.get(url)
+            over = response.status_code != 200 or len(statements) > budget
+            problems += over
+            print(f'{"!!" if over else "ok"} {url}: {len(statements)} consulta(s), status {response.status_code}')
+            if over:
+                for statement in statements:
+                    print(f'     {" ".join(statement.split())[:150]}')
+    print()
+    if problems:
+        print(f'{problems} página(s) acima do orçamento de {budget} consultas.')
+    else:
+        print(f'Todas as páginas dentro do orçamento de {budget} consultas.')
+    return problems
+
+if __name__ == '__main__':
+    raise SystemExit(1 if check_query_budget() else 0)
@@ -0,0 +1,122 @@
+from config import app, db
+from models import Sale, Product, Client
+from sqlalchemy import func
+from datetime import datetime, timedelta
+
+# Mostra o plano de execução das consultas do dashboard e das listas, para
+# conferir se usam os índices (migração add_access_path_indexes).
+# Uso: python check_query_plans.py
+
+def get_queries():
+    from services.dashboard_metrics import period_bounds, sale_total_expr
+    from services.sales_query import parse_filters, filtered_sales_query
+    from models import SaleDailyRollup
+
+    start_date, end_date = period_bounds('monthly', datetime.utcnow())
+    filters = parse_filters({'status': 'completed'})
+
+    # (nome, consulta, tabelas que não podem ser varridas por completo)
+    return [
+        ('dashboard: vendas por dia (rollup)',
+         db.session.query(SaleDailyRollup.date, func.sum(SaleDailyRollup.revenue))
+            .filter(SaleDailyRollup.date >= start_date.date(), SaleDailyRollup.date < end_date.date())
+            .group_by(SaleDailyRollup.date),
+         ['sale_daily_rollup']),
+        ('dashboard: produtos mais vendidos (rollup)',
+         db.session.query(Product.name, func.sum(SaleDailyRollup.quantity))
+            .join(SaleDailyRollup, SaleDailyRollup.product_id == Product.id)
+            .group_by(Product.id, Product.name),
+         ['sale_daily_rollup']),
+        ('dashboard: clientes mais ativos (rollup)',
+         db.session.query(Client.full_name, func.sum(SaleDailyRollup.revenue))
+            .join(SaleDailyRollup, SaleDailyRollup.client_id == Client.id)
+            .group_by(Client.id, Client.full_name),
+         ['sale_daily_rollup']),
+        ('dashboard: estoque baixo',
+         Product.query.filter(Product.stock < 10).order_by(Product.stock.asc()),
+         ['product']),
+        ('vendas finalizadas no período',
+         db.session.query(func.count(Sale.id), func.sum(sale_total_expr()))
+            .filter(Sale.status == 'completed', Sale.sale_date >= start_date, Sale.sale_date < end_date),
+         ['sale']),
+        ('vendas finalizadas por produto',
+         db.session.query(func.sum(Sale.quantity))
+            .filter(Sale.product_id == 1, Sale.status == 'completed'),
+         ['sale']),
+        ('vendas finalizadas por cliente',
+         db.session.query(func.count(Sale.id))
+            .filter(Sale.client_id == 1, Sale.status == 'completed'),
+         ['sale']),
+        ('lista de vendas: primeira página',
+         filtered_sales_query(parse_filters({})).order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(51),
+         ['sale']),
+        ('lista de vendas: filtro por status',
+         filtered_sales_query(filters).order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(51),
+         ['sale']),
+        ('lista de vendas: filtro por período',
+         filtered_sales_query(parse_filters({'date_start': (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%d')}))
+            .order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(51),
+         ['sale']),
+        ('lista de vendas: menor preço',
+         db.session.query(func.min(Sale.total_price)),
+         ['sale']),
+        ('lista de vendas: maior preço',
+         db.session.query(func.max(Sale.total_price)),
+         ['sale']),
+        ('produtos por categoria',
+         Product.query.filter_by(category_id=1),
+         ['product']),
+        ('vendas por vendedor',
+         Sale.query.filter_by(seller_id=1),
+         ['sale']),
+        ('autocompletar de clientes',
+         Client.query.with_entities(Client.id, Client.full_name)
+            .order_by(Client.full_name, Client.id).limit(21),
+         ['client']),
+        ('autocompletar de produtos ativos',
+         Product.query.with_entities(Product.id, Product.name, Product.price)
+            .filter(Product.is_active == True).order_by(Product.name, Product.id).limit(21),
+         ['product']),
+    ]
+
+def explain(query):
+    dialect = db.engine.dialect.name
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    if dialect == 'sqlite':
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).fetchall()
+        return [row[-1] for row in rows]
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN {compiled}', compiled.params).fetchall()
+    return [row[0] for row in rows]
+
+def uses_full_scan(plan, dialect, tables):
+    # Varredura completa de uma das tabelas indica que falta índice
+    for line in plan:
+        for table in tables:
+            if dialect == 'sqlite' and line.startswith(f'SCAN {table}') and 'USING' not in line \
+                    and line.split()[1] == table:
+                return True
+            if dialect == 'postgresql' and f'Seq Scan on {table} ' in f'{line} ':
+                return True
+    return False
+
+def check_query_plans():
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        problems = 0
+        for name, query, tables in get_queries():
+            plan = explain(query)
+            full_scan = uses_full_scan(plan, dialect, tables)
+            problems += full_scan
+            print(f'{"!!" if full_scan else "ok"} {name}')
+            for line in plan:
+                print(f'     {line}')
+        print()
+        if problems:
+            print(f'{problems} consulta(s) com varredura completa.')
+        else:
+            print('Todas as consultas usam índices.')
+        return problems
+
+if __name__ == '__main__':
+    raise SystemExit(1 if check_query_plans() else 0)
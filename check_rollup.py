@@ -0,0 +1,81 @@
+from datetime import datetime
+from app import app
+from config import db
+from models import Product, Client, Sale, SaleDailyRollup, InventoryMovement, StockSnapshot
+from services.inventory import record_movement
+from services.sales_rollup import sale_contribution, apply_sale_delta, NO_SELLER
+
+# Confere a manutenção incremental do sale_daily_rollup (services/sales_rollup.py)
+# com uma venda finalizada sem vendedor: depois de duas alterações ela deve
+# continuar numa única linha do rollup, com os totais da venda atual.
+# Cria um produto, um cliente e a venda próprios e remove tudo ao final, pela
+# sessão (o índice de busca acompanha) e com as movimentações de estoque.
+# Uso: python check_rollup.py
+
+def setup():
+    tag = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+    product = Product(name=f'rollup-{tag}', description='rollup', price=100, stock=10, custo1=30)
+    client = Client(full_name=f'rollup-{tag}', japan_id=f'rollup-{tag}', email=f'rollup-{tag}@example.com')
+    db.session.add_all([product, client])
+    db.session.flush()
+    # Entrada inicial no livro, como na criação pela tela de produtos
+    record_movement(product.id, product.stock, 'initial')
+    sale = Sale(product_id=product.id, client_id=client.id, seller_id=None, quantity=1,
+                original_price=100, discount_percentage=0, total_price=100, total_amount=100,
+                status='completed', sale_date=datetime.utcnow())
+    db.session.add(sale)
+    db.session.flush()
+    apply_sale_delta(None, sale_contribution(sale))
+    db.session.commit()
+    return product.id, client.id, sale.id
+
+def edit(sale, quantity):
+    before = sale_contribution(sale)
+    sale.quantity = quantity
+    sale.original_price = sale.total_price = sale.total_amount = 100 * quantity
+    apply_sale_delta(before, sale_contribution(sale))
+    db.session.commit()
+
+def check(product_id, client_id, sale_id):
+    sale = Sale.query.get(sale_id)
+    rows = SaleDailyRollup.query.filter_by(product_id=product_id, client_id=client_id).all()
+    problems = []
+    if len(rows) != 1:
+        problems.append(f'{len(rows)} linhas no rollup para uma venda (esperado 1)')
+    if any(row.seller_id != NO_SELLER for row in rows):
+        problems.append(f'seller_id do rollup deveria ser {NO_SELLER} para venda sem vendedor')
+    totals = (sum(row.count for row in rows), sum(row.quantity for row in rows), sum(row.revenue for row in rows))
+    if totals != (1, sale.quantity, sale.total_amount):
+        problems.append(f'totais do rollup {totals} não batem com a venda '
+                        f'{(1, sale.quantity, sale.total_amount)}')
+    return problems
+
+def cleanup(product_id, client_id, sale_id):
+    db.session.rollback()
+    SaleDailyRollup.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+    InventoryMovement.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+    StockSnapshot.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+    db.session.delete(Sale.query.get(sale_id))
+    db.session.flush()
+    db.session.delete(Client.query.get(client_id))
+    db.session.delete(Product.query.get(product_id))
+    db.session.commit()
+
+def main():
+    with app.app_context():
+        product_id, client_id, sale_id = setup()
+        try:
+            sale = Sale.query.get(sale_id)
+            edit(sale, 2)
+            edit(sale, 3)
+            problems = check(product_id, client_id, sale_id)
+        finally:
+            cleanup(product_id, client_id, sale_id)
+
+    for problem in problems:
+        print(f'!! {problem}')
+    print('Rollup consistente.' if not problems else f'{len(problems)} problema(s).')
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Tempo de inicialização e memória de cada worker: importa o módulo indicado
+# num processo novo com python -X importtime, várias vezes, e mostra o tempo
+# total, o pico de memória (RSS) e os módulos mais lentos. Falha se algum
+# módulo pesado, que deve ser importado só no primeiro uso (exportação,
+# importação de planilhas, miniaturas, financiamento), já estiver carregado
+# ao subir a aplicação.
+# Uso: python check_startup.py [--runs 5] [--budget-ms 1500] [--output inicio.json]
+
+TARGETS = ['app', 'init_admin']
+
+# Módulos que a inicialização não pode importar
+DEFERRED = ['numpy', 'openpyxl', 'reportlab', 'PIL', 'pandas']
+
+CODE = 'import resource, {module}; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+
+def measure(module):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CODE.format(module=module)],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise SystemExit(f'Erro ao importar {module}:\n{result.stderr[-2000:]}')
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        try:
+            imports.append((name.strip(), int(cumulative), len(name) - len(name.lstrip())))
+        except ValueError:
+            continue  # cabeçalho
+    total = sum(cumulative for _, cumulative, indent in imports if indent == 1)
+    rss_kb = int(result.stdout.strip().splitlines()[-1])
+    return {'total_ms': total / 1000, 'rss_mb': rss_kb / 1024, 'imports': imports}
+
+def check(module, runs, budget_ms):
+    results = [measure(module) for _ in range(runs)]
+    total_ms = statistics.median(result['total_ms'] for result in results)
+    rss_mb = statistics.median(result['rss_mb'] for result in results)
+    loaded = {name for name, _, _ in results[-1]['imports']}
+    deferred = [name for name in DEFERRED if name in loaded]
+
+    print(f'{module}: {total_ms:.0f} ms de importação (mediana de {runs}), pico de memória {rss_mb:.1f} MB')
+    slowest = sorted(results[-1]['imports'], key=lambda item: item[1], reverse=True)
+    for name, cumulative, indent in [item for item in slowest if item[2] <= 5][:10]:
+        print(f'   {cumulative / 1000:8.1f} ms  {" " * (indent - 1)}{name}')
+    problems = [f'{module} importa {name} na inicialização' for name in deferred]
+    if budget_ms and total_ms > budget_ms:
+        problems.append(f'{module} leva {total_ms:.0f} ms para importar (orçamento {budget_ms} ms)')
+    return {'total_ms': round(total_ms, 1), 'rss_mb': round(rss_mb, 1), 'deferred_loaded': deferred}, problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo de inicialização e memória por worker.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=int, help='falha se a importação passar disto')
+    parser.add_argument('--output', help='arquivo JSON do resultado')
+    options = parser.parse_args()
+
+    report, problems = {}, []
+    for module in TARGETS:
+        report[module], module_problems = check(module, options.runs, options.budget_ms)
+        problems.extend(module_problems)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    for problem in problems:
+        print(f'!! {problem}')
+    print('Inicialização ok.' if not problems else f'{len(problems)} problema(s).')
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,259 @@
+import click
+from config import app
+from services.engine import disable_statement_timeout
+
+# Os grupos de manutenção rodam sem o statement_timeout das requisições
+# (services/engine.py); a fila de emails e as exportações mantêm o limite.
+
+@app.cli.group()
+def rollup():
+    """Manutenção do agregado diário de vendas."""
+    disable_statement_timeout()
+
+@rollup.command('rebuild')
+def rollup_rebuild():
+    """Reconstrói sale_daily_rollup a partir do histórico de vendas."""
+    from services.sales_rollup import rebuild
+    rows = rebuild()
+    click.echo(f'Rollup reconstruído: {rows} linhas.')
+
+@app.cli.group()
+def images():
+    """Armazenamento de imagens em disco."""
+    disable_statement_timeout()
+
+@images.command('gc')
+def images_gc():
+    """Remove arquivos de imagem que nenhum registro referencia."""
+    from services.images import collect_garbage
+    removed = collect_garbage()
+    click.echo(f'Arquivos removidos: {removed}.')
+
+@app.cli.group()
+def exports():
+    """Exportações geradas em segundo plano."""
+
+@exports.command('purge')
+@click.option('--hours', type=float, help='Idade mínima; padrão EXPORT_MAX_AGE (24h).')
+def exports_purge(hours):
+    """Apaga as exportações criadas há mais de HOURS horas."""
+    from services.exports import purge_jobs
+    removed = purge_jobs(hours * 3600 if hours is not None else None)
+    click.echo(f'Exportações removidas: {removed}.')
+
+@app.cli.group()
+def financing():
+    """Parcelas e projeções das vendas financiadas."""
+    disable_statement_timeout()
+
+@financing.command('rebuild')
+def financing_rebuild():
+    """Regera as parcelas de todas as vendas financiadas."""
+    from services.financing import rebuild
+    rows = rebuild()
+    click.echo(f'Parcelas geradas: {rows}.')
+
+@financing.command('report')
+@click.option('--months', default=12, show_default=True, help='Meses projetados.')
+def financing_report(months):
+    """Mostra os valores a receber e a projeção mensal de juros."""
+    from services.financing import receivables, monthly_projection
+    summary = receivables()
+    click.echo(f'A receber: ¥ {summary["total"]:,.0f} em {summary["installments"]} parcelas '
+               f'(principal ¥ {summary["principal"]:,.0f}, juros ¥ {summary["interest"]:,.0f}).')
+    for month in monthly_projection(months):
+        click.echo(f'{month["month"]}  total ¥ {month["total"]:>12,.0f}  juros ¥ {month["interest"]:>10,.0f}')
+
+@financing.command('simulate')
+@click.option('--rate', type=float, help='Taxa anual (%) aplicada a todas as vendas.')
+@click.option('--delta', type=float, default=0.0, help='Pontos percentuais somados à taxa de cada venda.')
+def financing_simulate(rate, delta):
+    """Simula a carteira financiada com outra taxa de juros."""
+    from services.financing import simulate_rate
+    result = simulate_rate(annual_rate=rate, rate_delta=delta)
+    click.echo(f'Vendas financiadas: {result["sales"]}.')
+    for label, key in (('Atual', 'current'), ('Simulado', 'simulated')):
+        totals = result[key]
+        click.echo(f'{label:<9} parcelas/mês ¥ {totals["monthly_payments"]:>12,.0f}  '
+                   f'total ¥ {totals["total"]:>14,.0f}  juros ¥ {totals["interest"]:>14,.0f}')
+
+@app.cli.group()
+def inventory():
+    """Livro de movimentações de estoque."""
+    disable_statement_timeout()
+
+@inventory.command('snapshot')
+def inventory_snapshot():
+    """Grava snapshots do estoque dos produtos com movimentações recentes."""
+    from services.inventory import snapshot_all
+    count = snapshot_all()
+    click.echo(f'Snapshots gravados: {count}.')
+
+@inventory.command('reconcile')
+def inventory_reconcile():
+    """Compara o estoque dos produtos com o livro de movimentações."""
+    from services.inventory import reconcile
+    differences = reconcile()
+    for product, stock, ledger in differences:
+        click.echo(f'{product.id} {product.name}: estoque {stock}, livro {ledger}')
+    click.echo(f'Produtos com diferença: {len(differences)}.')
+
+@inventory.command('history')
+@click.argument('product_id', type=int)
+@click.option('--at', 'at', type=click.DateTime(), help='Mostra o estoque nesta data.')
+def inventory_history(product_id, at):
+    """Mostra as movimentações de um produto."""
+    from services.inventory import movements, stock_at, REASONS
+    if at:
+        click.echo(f'Estoque em {at:%d/%m/%Y %H:%M}: {stock_at(product_id, at)}')
+    for movement in movements(product_id, end=at):
+        sale = f' venda {movement.sale_id}' if movement.sale_id else ''
+        click.echo(f'{movement.created_at:%d/%m/%Y %H:%M}  {movement.quantity:+6d}  '
+                   f'{REASONS.get(movement.reason, movement.reason)}{sale}')
+
+@app.cli.group('import')
+def import_group():
+    """Importação em massa de produtos e clientes (CSV ou XLSX)."""
+    disable_statement_timeout()
+
+def _run_import(kind, path, report, batch_size):
+    from services.imports import import_file, file_format
+    fmt = file_format(path)
+    if fmt is None:
+        raise click.BadParameter('use um arquivo .csv ou .xlsx (XLSX requer openpyxl).', param_hint='FILE')
+    report = report or f'{path.rsplit(".", 1)[0]}-erros.csv'
+
+    def progress(stats):
+        click.echo(f'{stats["processed"]} linhas, {stats["rows_per_sec"]} linhas/s')
+
+    with open(path, 'rb') as upload, open(report, 'w', newline='', encoding='utf-8-sig') as report_file:
+        stats = import_file(kind, upload, fmt, report_file, batch_size=batch_size, progress=progress)
+    click.echo(f'Processadas: {stats["processed"]}, importadas: {stats["imported"]}, '
+               f'rejeitadas: {stats["rejected"]} ({stats["elapsed"]}s, {stats["rows_per_sec"]} linhas/s).')
+    if stats['rejected']:
+        click.echo(f'Relatório de erros: {report}')
+
+@import_group.command('products')
+@click.argument('path', metavar='FILE', type=click.Path(exists=True, dir_okay=False))
+@click.option('--report', type=click.Path(dir_okay=False), help='Arquivo CSV do relatório de erros.')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def import_products(path, report, batch_size):
+    """Importa produtos de FILE."""
+    _run_import('products', path, report, batch_size)
+
+@import_group.command('clients')
+@click.argument('path', metavar='FILE', type=click.Path(exists=True, dir_okay=False))
+@click.option('--report', type=click.Path(dir_okay=False), help='Arquivo CSV do relatório de erros.')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def import_clients(path, report, batch_size):
+    """Importa clientes de FILE."""
+    _run_import('clients', path, report, batch_size)
+
+@app.cli.group()
+def sales():
+    """Operações em lote sobre vendas."""
+    disable_statement_timeout()
+
+def _run_bulk(action, sale_ids, status, date_start, date_end, **options):
+    from services.bulk_sales import run, selected_sale_ids
+    from services.sales_query import parse_filters
+    if not sale_ids:
+        if not (status or date_start or date_end):
+            raise click.UsageError('informe IDs de vendas ou ao menos um filtro (--status, --from, --to).')
+        sale_ids = selected_sale_ids(parse_filters({'status': status, 'date_start': date_start, 'date_end': date_end}))
+    result = run(action, sale_ids, **options)
+    for error in result['errors']:
+        click.echo(f'Erro: {error}', err=True)
+    click.echo(f'Selecionadas: {result["selected"]}, processadas: {result["processed"]}, '
+               f'ignoradas: {result["skipped"]} ({result["elapsed"]}s, {result["sales_per_sec"]} vendas/s).')
+    if result['errors']:
+        raise SystemExit(1)
+
+@sales.command('complete')
+@click.argument('sale_ids', nargs=-1, type=int)
+@click.option('--status', type=click.Choice(['negotiating', 'pending', 'completed', 'cancelled']))
+@click.option('--from', 'date_start', help='Data inicial (AAAA-MM-DD).')
+@click.option('--to', 'date_end', help='Data final (AAAA-MM-DD).')
+def sales_complete(sale_ids, status, date_start, date_end):
+    """Finaliza as vendas indicadas (IDs ou filtros) numa única transação."""
+    _run_bulk('complete', sale_ids, status, date_start, date_end)
+
+@sales.command('cancel')
+@click.argument('sale_ids', nargs=-1, type=int)
+@click.option('--status', type=click.Choice(['negotiating', 'pending', 'completed', 'cancelled']))
+@click.option('--from', 'date_start', help='Data inicial (AAAA-MM-DD).')
+@click.option('--to', 'date_end', help='Data final (AAAA-MM-DD).')
+def sales_cancel(sale_ids, status, date_start, date_end):
+    """Cancela as vendas indicadas (IDs ou filtros) numa única transação."""
+    _run_bulk('cancel', sale_ids, status, date_start, date_end)
+
+@sales.command('reprice')
+@click.argument('sale_ids', nargs=-1, type=int)
+@click.option('--status', type=click.Choice(['negotiating', 'pending', 'completed', 'cancelled']))
+@click.option('--from', 'date_start', help='Data inicial (AAAA-MM-DD).')
+@click.option('--to', 'date_end', help='Data final (AAAA-MM-DD).')
+@click.option('--discount', type=float, help='Novo desconto (%); sem ele mantém o desconto de cada venda.')
+def sales_reprice(sale_ids, status, date_start, date_end, discount):
+    """Recalcula as vendas pendentes com o preço atual dos produtos."""
+    _run_bulk('reprice', sale_ids, status, date_start, date_end, discount_percentage=discount)
+
+@app.cli.group()
+def search():
+    """Índice de busca textual."""
+    disable_statement_timeout()
+
+@search.command('rebuild')
+def search_rebuild():
+    """Regera o índice de busca a partir de clientes, produtos e vendas."""
+    from services.search import rebuild
+    count = rebuild()
+    click.echo(f'Documentos indexados: {count}.')
+
+@search.command('query')
+@click.argument('text')
+@click.option('--kind', type=click.Choice(['client', 'product', 'sale']))
+@click.option('--limit', type=int, default=20, show_default=True)
+def search_query(text, kind, limit):
+    """Executa uma busca e mostra os resultados."""
+    from services.search import search as run_search
+    result = run_search(text, kind=kind, limit=limit)
+    for item in result['results']:
+        click.echo(f'{item["kind"]:<8} {item["id"]:>8}  {item["label"]}')
+    click.echo(f'{len(result["results"])} resultado(s) em {result["elapsed_ms"]} ms.')
+
+@app.cli.group()
+def mail():
+    """Fila de envio de emails."""
+
+@mail.command('worker')
+@click.option('--batch-size', type=int, default=50, show_default=True)
+@click.option('--interval', type=float, default=5, show_default=True, help='Segundos entre verificações da fila.')
+@click.option('--once', is_flag=True, help='Envia o que estiver pendente e termina.')
+def mail_worker(batch_size, interval, once):
+    """Envia os emails da fila, com novas tentativas em caso de falha."""
+    from services.mail_queue import run_worker
+    sent, failed = run_worker(batch_size=batch_size, poll_interval=interval, once=once)
+    click.echo(f'Enviados: {sent}, falhas: {failed}.')
+
+@mail.command('status')
+def mail_status():
+    """Mostra quantos emails estão pendentes, enviados e com falha."""
+    from services.mail_queue import get_queue
+    queue = get_queue()
+    counts = queue.counts()
+    click.echo(f'Pendentes: {counts["pending"]}, enviados: {counts["sent"]}, com falha: {counts["failed"]}.')
+    for message_id, attempts, error in queue.errors():
+        click.echo(f'{message_id:>8}  {attempts} tentativa(s)  {error}')
+
+@mail.command('retry')
+def mail_retry():
+    """Coloca de volta na fila os emails que esgotaram as tentativas."""
+    from services.mail_queue import get_queue
+    click.echo(f'Emails recolocados na fila: {get_queue().retry_failed()}.')
+
+@mail.command('purge')
+@click.option('--days', type=int, default=30, show_default=True)
+def mail_purge(days):
+    """Apaga da fila os emails enviados há mais de DAYS dias."""
+    from services.mail_queue import get_queue
+    click.echo(f'Emails apagados: {get_queue().purge_sent(days * 86400)}.')
@@ -1 +1,5 @@
-// ... conteúdo completo do config.py ...
\ No newline at end of file
+// ... conteúdo completo do config.py ...
+# Ajuste do banco (services/engine.py): PRAGMAs do SQLite, pool e timeouts do
+# PostgreSQL. Fica aqui para valer também nos scripts que importam só o config.
+from services.engine import configure_engine
+configure_engine()
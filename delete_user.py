@@ -1,15 +1,35 @@
-import sqlite3
+from sqlalchemy import String, cast
+from config import app, db
+from models import Sale
+from services.dashboard_cache import mark_dirty
+from services.engine import disable_statement_timeout
+from services.financing import delete_installments
+from services.sales_rollup import rebuild as rebuild_rollup
+from services.search import delete_documents
+from services.stock import release_deleted_sales
 
-# Conectar ao banco de dados
-conn = sqlite3.connect('instance/gestao.db')
-cursor = conn.cursor()
+# Usa o engine da aplicação (mesmo banco, pool e ajustes de services/engine.py),
+# sem o limite de tempo por comando das requisições
+disable_statement_timeout()
+with app.app_context():
+    # Selecionar as vendas
+    sales = Sale.query.filter(cast(Sale.client_id, String).like('%1%')).all()
+    sale_ids = [sale.id for sale in sales]
 
-# Executar o DELETE
-cursor.execute('DELETE FROM sale WHERE client_id LIKE "%1%"')
+    # Vendas pendentes/em negociação liberam a reserva de estoque antes de sumir
+    if not release_deleted_sales(sales):
+        db.session.rollback()
+        raise SystemExit('Alguma venda foi alterada durante a exclusão. Nada foi apagado; rode novamente.')
 
-# Commit das alterações e mostrar número de registros afetados
-conn.commit()
-print('Registros deletados:', cursor.rowcount)
+    # Executar o DELETE, junto com as parcelas e o índice de busca
+    delete_installments(sale_ids)
+    delete_documents('sale', sale_ids)
+    deleted = Sale.query.filter(Sale.id.in_(sale_ids)).delete(synchronize_session=False)
+    mark_dirty()
 
-# Fechar a conexão
-conn.close()
\ No newline at end of file
+    # Commit das alterações e mostrar número de registros afetados
+    db.session.commit()
+    print('Registros deletados:', deleted)
+
+    # O agregado diário é refeito sem as vendas removidas
+    rebuild_rollup()
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, FloatField, IntegerField, SelectField, DateField, TextAreaField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -95,4 +96,9 @@ class RequestResetForm(FlaskForm):
 class ResetPasswordForm(FlaskForm):
     password = PasswordField('Nova Senha', validators=[DataRequired()])
     confirm_password = PasswordField('Confirmar Nova Senha', validators=[DataRequired(), EqualTo('password')])
-    submit = SubmitField('Redefinir Senha')
\ No newline at end of file
+    submit = SubmitField('Redefinir Senha')
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Importar', choices=[('products', 'Produtos'), ('clients', 'Clientes')])
+    file = FileField('Arquivo', validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'Envie um arquivo CSV ou XLSX.')])
+    submit = SubmitField('Importar')
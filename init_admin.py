@@ -1,4 +1,5 @@
-from config import app, db, bcrypt
+from config import app, db
+from services.passwords import hash_password
 from models import User
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text
@@ -18,7 +19,7 @@ def init_admin():
                 admin = User.query.filter_by(is_admin=True).first()
                 if not admin:
                     # Cria o administrador padrão
-                    hashed_password = bcrypt.generate_password_hash('admin123', rounds=12).decode('utf-8')
+                    hashed_password = hash_password('admin123')
                     admin = User(
                         username='admin',
                         email='admin@sistema.com',
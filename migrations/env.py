@@ -94,6 +94,9 @@ def run_migrations_online():
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 
+    # Migrações longas não podem cair no statement_timeout das requisições
+    from services.engine import disable_statement_timeout
+    disable_statement_timeout()
     connectable = get_engine()
 
     with connectable.connect() as connection:
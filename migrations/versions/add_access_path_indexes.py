@@ -0,0 +1,59 @@
+"""add access path indexes to sale, product and sale_daily_rollup
+
+Revision ID: add_access_path_indexes
+Revises: offload_image_blobs
+Create Date: 2025-05-12 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_access_path_indexes'
+down_revision = 'offload_image_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Vendas: filtros por status/data do dashboard, ordenação da lista (sale_date, id)
+    # e junções por produto, cliente e vendedor
+    op.create_index('ix_sale_status_sale_date', 'sale', ['status', 'sale_date'])
+    op.create_index('ix_sale_sale_date_id', 'sale', ['sale_date', 'id'])
+    op.create_index('ix_sale_product_id_status', 'sale', ['product_id', 'status'])
+    op.create_index('ix_sale_client_id_status', 'sale', ['client_id', 'status'])
+    op.create_index('ix_sale_seller_id', 'sale', ['seller_id'])
+
+    # Produtos: filtro por categoria e relatório de estoque baixo
+    op.create_index('ix_product_category_id', 'product', ['category_id'])
+    op.create_index('ix_product_stock', 'product', ['stock'])
+
+    # Índice parcial só com os produtos de estoque baixo, onde o banco suporta
+    dialect = op.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        op.create_index('ix_product_low_stock', 'product', ['stock'],
+                        sqlite_where=sa.text('stock < 10'),
+                        postgresql_where=sa.text('stock < 10'))
+
+    # Rollup diário: rankings de produtos e clientes
+    op.create_index('ix_sale_daily_rollup_product_id', 'sale_daily_rollup', ['product_id'])
+    op.create_index('ix_sale_daily_rollup_client_id', 'sale_daily_rollup', ['client_id'])
+
+
+def downgrade():
+    op.drop_index('ix_sale_daily_rollup_client_id', table_name='sale_daily_rollup')
+    op.drop_index('ix_sale_daily_rollup_product_id', table_name='sale_daily_rollup')
+
+    dialect = op.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        op.drop_index('ix_product_low_stock', table_name='product')
+
+    op.drop_index('ix_product_stock', table_name='product')
+    op.drop_index('ix_product_category_id', table_name='product')
+
+    op.drop_index('ix_sale_seller_id', table_name='sale')
+    op.drop_index('ix_sale_client_id_status', table_name='sale')
+    op.drop_index('ix_sale_product_id_status', table_name='sale')
+    op.drop_index('ix_sale_sale_date_id', table_name='sale')
+    op.drop_index('ix_sale_status_sale_date', table_name='sale')
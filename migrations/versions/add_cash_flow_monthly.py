@@ -0,0 +1,60 @@
+"""add cash_flow_monthly
+
+Revision ID: add_cash_flow_monthly
+Revises: add_sale_installment
+Create Date: 2025-05-27 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_cash_flow_monthly'
+down_revision = 'add_sale_installment'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade():
+    op.create_table('cash_flow_monthly',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('installments', sa.Integer(), nullable=False),
+    sa.Column('principal', sa.Float(), nullable=False),
+    sa.Column('interest', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('month')
+    )
+
+    # Carga inicial: soma das parcelas por mês de vencimento, lendo
+    # sale_installment em lotes pela chave (sale_id, number)
+    bind = op.get_bind()
+    select = sa.text(
+        "SELECT sale_id, number, due_date, principal, interest FROM sale_installment "
+        "WHERE sale_id > :sale_id OR (sale_id = :sale_id AND number > :number) "
+        "ORDER BY sale_id, number LIMIT :limit"
+    ).columns(due_date=sa.Date)
+    totals = {}
+    position = {'sale_id': 0, 'number': 0}
+    while True:
+        rows = bind.execute(select, dict(position, limit=BATCH_SIZE)).all()
+        if not rows:
+            break
+        for row in rows:
+            entry = totals.setdefault(row.due_date.replace(day=1), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += row.principal
+            entry[2] += row.interest
+        position = {'sale_id': rows[-1].sale_id, 'number': rows[-1].number}
+    if totals:
+        monthly = sa.table('cash_flow_monthly', sa.column('month'), sa.column('installments'),
+                           sa.column('principal'), sa.column('interest'))
+        bind.execute(monthly.insert(), [
+            {'month': month, 'installments': count, 'principal': principal, 'interest': interest}
+            for month, (count, principal, interest) in totals.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('cash_flow_monthly')
@@ -0,0 +1,58 @@
+"""add content_hash to product_image and client_image
+
+Revision ID: add_image_content_hash
+Revises: add_sale_daily_rollup
+Create Date: 2025-05-05 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import hashlib
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_image_content_hash'
+down_revision = 'add_sale_daily_rollup'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 100
+
+
+def _backfill(table):
+    # Calcula o hash das imagens existentes em lotes, sem carregar todos os BLOBs de uma vez
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(f'SELECT id, image_data FROM {table} WHERE id > :last_id AND image_data IS NOT NULL '
+                    'ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        for image_id, image_data in rows:
+            conn.execute(
+                sa.text(f'UPDATE {table} SET content_hash = :hash WHERE id = :id'),
+                {'hash': hashlib.sha256(image_data).hexdigest(), 'id': image_id}
+            )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    with op.batch_alter_table('client_image', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    _backfill('product_image')
+    _backfill('client_image')
+
+
+def downgrade():
+    with op.batch_alter_table('client_image', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
+
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,59 @@
+"""add inventory_movement and stock_snapshot
+
+Revision ID: add_inventory_movement
+Revises: add_product_reserved
+Create Date: 2025-06-09 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_inventory_movement'
+down_revision = 'add_product_reserved'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_movement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(length=20), nullable=False),
+    sa.Column('sale_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_inventory_movement_product_id_id', 'inventory_movement', ['product_id', 'id'])
+    op.create_index('ix_inventory_movement_created_at', 'inventory_movement', ['created_at'])
+
+    op.create_table('stock_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('movement_id', sa.Integer(), nullable=False),
+    sa.Column('stock', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_snapshot_product_id_taken_at', 'stock_snapshot', ['product_id', 'taken_at'])
+
+    # O histórico começa com o estoque atual de cada produto
+    op.execute(sa.text(
+        "INSERT INTO inventory_movement (product_id, quantity, reason, created_at) "
+        "SELECT id, COALESCE(stock, 0), 'initial', CURRENT_TIMESTAMP FROM product"
+    ))
+    op.execute(sa.text(
+        "INSERT INTO stock_snapshot (product_id, movement_id, stock, taken_at) "
+        "SELECT product_id, id, quantity, created_at FROM inventory_movement"
+    ))
+
+
+def downgrade():
+    op.drop_index('ix_stock_snapshot_product_id_taken_at', table_name='stock_snapshot')
+    op.drop_table('stock_snapshot')
+    op.drop_index('ix_inventory_movement_created_at', table_name='inventory_movement')
+    op.drop_index('ix_inventory_movement_product_id_id', table_name='inventory_movement')
+    op.drop_table('inventory_movement')
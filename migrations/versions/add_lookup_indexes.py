@@ -0,0 +1,27 @@
+"""add name indexes for client and product lookups
+
+Revision ID: add_lookup_indexes
+Revises: add_search_index
+Create Date: 2025-06-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_lookup_indexes'
+down_revision = 'add_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Paginação por (nome, id) do autocompletar de clientes e produtos ativos
+    op.create_index('ix_client_full_name_id', 'client', ['full_name', 'id'])
+    op.create_index('ix_product_is_active_name_id', 'product', ['is_active', 'name', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_product_is_active_name_id', table_name='product')
+    op.drop_index('ix_client_full_name_id', table_name='client')
@@ -0,0 +1,40 @@
+"""add mail_queue
+
+Revision ID: add_mail_queue
+Revises: add_sale_total_price_index
+Create Date: 2025-07-03 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_mail_queue'
+down_revision = 'add_sale_total_price_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A fila ficava num arquivo SQLite do processo web, que o worker (outro
+    # dyno) não enxerga. Mensagens antigas desse arquivo não são migradas.
+    op.create_table('mail_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=10), server_default='pending', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=32), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_mail_queue_status_next_attempt_at', 'mail_queue', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_mail_queue_status_next_attempt_at', table_name='mail_queue')
+    op.drop_table('mail_queue')
@@ -0,0 +1,31 @@
+"""add reserved to product
+
+Revision ID: add_product_reserved
+Revises: add_cash_flow_monthly
+Create Date: 2025-06-02 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_reserved'
+down_revision = 'add_cash_flow_monthly'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('product', sa.Column('reserved', sa.Integer(), nullable=False, server_default='0'))
+    # Reserva inicial: quantidades das vendas pendentes e em negociação
+    op.execute(sa.text(
+        "UPDATE product SET reserved = COALESCE("
+        "(SELECT SUM(sale.quantity) FROM sale WHERE sale.product_id = product.id "
+        "AND sale.status IN ('pending', 'negotiating')), 0)"
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_column('reserved')
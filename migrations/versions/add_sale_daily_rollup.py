@@ -0,0 +1,56 @@
+"""add sale_daily_rollup
+
+Revision ID: add_sale_daily_rollup
+Revises: a5c6bfc6dbba
+Create Date: 2025-05-02 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_sale_daily_rollup'
+down_revision = 'a5c6bfc6dbba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sale_daily_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('seller_id', sa.Integer(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['client.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('date', 'product_id', 'client_id', 'seller_id', name='uq_sale_daily_rollup_key')
+    )
+    op.create_index('ix_sale_daily_rollup_date', 'sale_daily_rollup', ['date'])
+
+    # Carga inicial a partir do histórico de vendas finalizadas
+    from sqlalchemy import text
+    op.execute(
+        text(
+            "INSERT INTO sale_daily_rollup (date, product_id, client_id, seller_id, count, quantity, revenue, cost) "
+            "SELECT date(sale.sale_date), sale.product_id, sale.client_id, sale.seller_id, "
+            "COUNT(sale.id), SUM(sale.quantity), "
+            "SUM(ROUND(COALESCE(CASE WHEN sale.is_financed THEN sale.total_amount ELSE sale.total_price END, 0))), "
+            "SUM(sale.quantity * (COALESCE(product.custo1, 0) + COALESCE(product.custo2, 0) + "
+            "COALESCE(product.custo3, 0) + COALESCE(product.custo4, 0) + COALESCE(product.custo5, 0))) "
+            "FROM sale JOIN product ON product.id = sale.product_id "
+            "WHERE sale.status = 'completed' "
+            "GROUP BY date(sale.sale_date), sale.product_id, sale.client_id, sale.seller_id"
+        )
+    )
+
+
+def downgrade():
+    op.drop_index('ix_sale_daily_rollup_date', table_name='sale_daily_rollup')
+    op.drop_table('sale_daily_rollup')
@@ -0,0 +1,101 @@
+"""add sale_installment
+
+Revision ID: add_sale_installment
+Revises: add_access_path_indexes
+Create Date: 2025-05-20 10:00:00.000000
+
+"""
+import calendar
+import math
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_sale_installment'
+down_revision = 'add_access_path_indexes'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+# Mesmo cronograma de services/financing.py (tabela Price), sem NumPy: parcelas
+# fixas e a última quitando o saldo, fechando no total financiado da venda
+
+def _due_date(start, months):
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+def _installments(sale):
+    rate = sale.interest_rate / 100 / 12
+    n = sale.financing_years * 12
+    payment = sale.monthly_payment
+    start = sale.sale_date.date() if isinstance(sale.sale_date, datetime) else (sale.sale_date or date.today())
+    balance = float(sale.total_price)
+    rows = []
+    for number in range(1, n + 1):
+        interest = balance * rate
+        if number < n:
+            principal = payment - interest
+            amount = payment
+        else:
+            principal = balance
+            if sale.total_financed is not None:
+                amount = sale.total_financed - payment * (n - 1)
+            else:
+                amount = math.ceil(round(balance * (1 + rate), 6))
+        balance = balance - principal if number < n else 0.0
+        principal = round(principal, 2)
+        rows.append({
+            'sale_id': sale.id,
+            'number': number,
+            'due_date': _due_date(start, number),
+            'principal': principal,
+            'interest': round(round(amount, 2) - principal, 2),
+            'balance': round(balance, 2),
+        })
+    return rows
+
+
+def upgrade():
+    op.create_table('sale_installment',
+    sa.Column('sale_id', sa.Integer(), nullable=False),
+    sa.Column('number', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('due_date', sa.Date(), nullable=False),
+    sa.Column('principal', sa.Float(), nullable=False),
+    sa.Column('interest', sa.Float(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['sale_id'], ['sale.id'], ),
+    sa.PrimaryKeyConstraint('sale_id', 'number')
+    )
+    op.create_index('ix_sale_installment_due_date', 'sale_installment', ['due_date'])
+
+    # Parcelas das vendas financiadas não canceladas, em lotes por id
+    # (também disponível como flask financing rebuild)
+    bind = op.get_bind()
+    installment = sa.table('sale_installment',
+                           *(sa.column(name) for name in ('sale_id', 'number', 'due_date',
+                                                          'principal', 'interest', 'balance')))
+    select = sa.text(
+        "SELECT id, sale_date, total_price, interest_rate, financing_years, monthly_payment, total_financed "
+        "FROM sale WHERE is_financed = :financed AND financing_years > 0 AND interest_rate IS NOT NULL "
+        "AND monthly_payment IS NOT NULL AND monthly_payment > 0 AND status != 'cancelled' AND id > :last_id "
+        "ORDER BY id LIMIT :limit"
+    ).columns(sale_date=sa.DateTime)
+    last_id = 0
+    while True:
+        sales = bind.execute(select, {'financed': True, 'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not sales:
+            break
+        rows = [row for sale in sales for row in _installments(sale)]
+        if rows:
+            bind.execute(installment.insert(), rows)
+        last_id = sales[-1].id
+
+
+def downgrade():
+    op.drop_index('ix_sale_installment_due_date', table_name='sale_installment')
+    op.drop_table('sale_installment')
@@ -0,0 +1,25 @@
+"""add total_price index for the sales list price range
+
+Revision ID: add_sale_total_price_index
+Revises: rollup_no_seller_key
+Create Date: 2025-07-02 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_sale_total_price_index'
+down_revision = 'rollup_no_seller_key'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # MIN/MAX do controle de faixa de preço e filtros price_min/price_max
+    op.create_index('ix_sale_total_price', 'sale', ['total_price'])
+
+
+def downgrade():
+    op.drop_index('ix_sale_total_price', table_name='sale')
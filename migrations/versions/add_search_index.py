@@ -0,0 +1,103 @@
+"""add search_index
+
+Revision ID: add_search_index
+Revises: add_inventory_movement
+Create Date: 2025-06-16 10:00:00.000000
+
+"""
+import re
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_index'
+down_revision = 'add_inventory_movement'
+branch_labels = None
+depends_on = None
+
+KINDS = {'client': 1, 'product': 2, 'sale': 3}
+BATCH_SIZE = 1000
+
+
+def normalize(value):
+    value = unicodedata.normalize('NFD', str(value or ''))
+    return ''.join(c for c in value if not unicodedata.combining(c)).lower().strip()
+
+
+def _batches(bind, sql):
+    # Keyset por id, BATCH_SIZE linhas por vez, sem carregar a tabela inteira
+    last_id = 0
+    while True:
+        rows = bind.execute(sql, {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1].id
+
+
+def _client(row):
+    body = ' '.join(filter(None, (row.japan_address, row.japan_phone, re.sub(r'\D', '', row.japan_phone or ''),
+                                  row.japan_id, row.email)))
+    return 'client', row.id, row.full_name, row.full_name, body
+
+
+def _product(row):
+    return 'product', row.id, row.name, row.name, row.description
+
+
+def _sale(row):
+    notes = row.notes.strip()
+    return 'sale', row.id, f'Venda #{row.id} - {notes[:60]}', '', notes
+
+
+def document_batches(bind):
+    # Mesmos documentos de services/search.py, um lote por vez
+    sources = (
+        ("SELECT id, full_name, japan_address, japan_phone, japan_id, email FROM client "
+         "WHERE id > :last_id ORDER BY id LIMIT :limit", _client),
+        ("SELECT id, name, description FROM product "
+         "WHERE id > :last_id ORDER BY id LIMIT :limit", _product),
+        ("SELECT id, notes FROM sale WHERE notes IS NOT NULL AND notes <> '' "
+         "AND id > :last_id ORDER BY id LIMIT :limit", _sale),
+    )
+    for sql, document in sources:
+        for rows in _batches(bind, sa.text(sql)):
+            yield [document(row) for row in rows]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute(sa.text(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, label UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+    else:
+        op.execute(sa.text(
+            "CREATE TABLE search_index ("
+            "rowid BIGINT PRIMARY KEY, kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, "
+            "label TEXT, title TEXT, body TEXT, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED)"
+        ))
+        op.execute(sa.text("CREATE INDEX ix_search_index_document ON search_index USING gin (document)"))
+
+    # Carga inicial (também disponível como flask search rebuild), em lotes
+    insert = sa.text(
+        "INSERT INTO search_index (rowid, kind, ref_id, label, title, body) "
+        "VALUES (:rowid, :kind, :ref_id, :label, :title, :body)"
+    )
+    for documents in document_batches(bind):
+        bind.execute(insert, [
+            {'rowid': ref_id * 4 + KINDS[kind], 'kind': kind, 'ref_id': ref_id, 'label': label or '',
+             'title': normalize(title), 'body': normalize(body)}
+            for kind, ref_id, label, title, body in documents
+        ])
+
+
+def downgrade():
+    op.execute(sa.text("DROP TABLE search_index"))
@@ -0,0 +1,89 @@
+"""offload image blobs to the file store
+
+Revision ID: offload_image_blobs
+Revises: add_image_content_hash
+Create Date: 2025-05-08 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'offload_image_blobs'
+down_revision = 'add_image_content_hash'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 100
+
+
+def _offload(table):
+    # Move os BLOBs para o armazenamento em disco em lotes e limpa a coluna
+    from services.blob_store import get_blob_store
+    store = get_blob_store()
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(f'SELECT id, image_data FROM {table} WHERE id > :last_id AND image_data IS NOT NULL '
+                    'ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        for image_id, image_data in rows:
+            digest = store.put(image_data)
+            conn.execute(
+                sa.text(f'UPDATE {table} SET content_hash = :hash, image_data = NULL WHERE id = :id'),
+                {'hash': digest, 'id': image_id}
+            )
+        last_id = rows[-1][0]
+
+
+def _restore(table):
+    # Traz o conteúdo de volta para a coluna image_data
+    from services.blob_store import get_blob_store
+    store = get_blob_store()
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(f'SELECT id, content_hash FROM {table} WHERE id > :last_id AND image_data IS NULL '
+                    'ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        for image_id, digest in rows:
+            if digest and store.exists(digest):
+                with open(store.path(digest), 'rb') as f:
+                    conn.execute(
+                        sa.text(f'UPDATE {table} SET image_data = :data WHERE id = :id'),
+                        {'data': f.read(), 'id': image_id}
+                    )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.alter_column('image_data', existing_type=sa.LargeBinary(), nullable=True)
+        batch_op.create_index('ix_product_image_content_hash', ['content_hash'])
+
+    with op.batch_alter_table('client_image', schema=None) as batch_op:
+        batch_op.alter_column('image_data', existing_type=sa.LargeBinary(), nullable=True)
+        batch_op.create_index('ix_client_image_content_hash', ['content_hash'])
+
+    _offload('product_image')
+    _offload('client_image')
+
+
+def downgrade():
+    _restore('client_image')
+    _restore('product_image')
+
+    with op.batch_alter_table('client_image', schema=None) as batch_op:
+        batch_op.drop_index('ix_client_image_content_hash')
+
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_image_content_hash')
@@ -0,0 +1,45 @@
+"""store sales without seller as seller_id 0 in sale_daily_rollup
+
+Revision ID: rollup_no_seller_key
+Revises: add_lookup_indexes
+Create Date: 2025-07-01 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'rollup_no_seller_key'
+down_revision = 'add_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL não conflita na restrição única: cada alteração de venda sem vendedor
+    # gerou uma linha nova. Junta essas linhas numa só por chave, com seller_id = 0.
+    op.execute(
+        "INSERT INTO sale_daily_rollup (date, product_id, client_id, seller_id, count, quantity, revenue, cost) "
+        "SELECT date, product_id, client_id, 0, SUM(count), SUM(quantity), SUM(revenue), SUM(cost) "
+        "FROM sale_daily_rollup WHERE seller_id IS NULL "
+        "GROUP BY date, product_id, client_id"
+    )
+    op.execute('DELETE FROM sale_daily_rollup WHERE seller_id IS NULL')
+    # Linhas que só acumulavam diferenças e zeraram não servem para nada
+    op.execute('DELETE FROM sale_daily_rollup WHERE count = 0 AND quantity = 0 AND revenue = 0 AND cost = 0')
+
+    with op.batch_alter_table('sale_daily_rollup') as batch_op:
+        batch_op.alter_column('seller_id',
+                    existing_type=sa.Integer(),
+                    nullable=False,
+                    server_default='0')
+
+
+def downgrade():
+    with op.batch_alter_table('sale_daily_rollup') as batch_op:
+        batch_op.alter_column('seller_id',
+                    existing_type=sa.Integer(),
+                    nullable=True,
+                    server_default=None)
+    op.execute('UPDATE sale_daily_rollup SET seller_id = NULL WHERE seller_id = 0')
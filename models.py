@@ -1 +1,115 @@
-// ... conteúdo completo do models.py ...
\ No newline at end of file
+// ... conteúdo completo do models.py ...
+
+class SaleDailyRollup(db.Model):
+    # Agregado diário das vendas finalizadas, mantido incrementalmente pelas rotas de vendas.
+    # Venda sem vendedor entra com seller_id = 0: NULL não se repete em
+    # restrição única e cada alteração criaria uma linha nova.
+    __table_args__ = (
+        db.UniqueConstraint('date', 'product_id', 'client_id', 'seller_id', name='uq_sale_daily_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    seller_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0)
+
+
+class SaleInstallment(db.Model):
+    # Parcelas do financiamento de cada venda (tabela Price), geradas por services/financing.py
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), primary_key=True)
+    number = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    due_date = db.Column(db.Date, nullable=False, index=True)
+    principal = db.Column(db.Float, nullable=False)
+    interest = db.Column(db.Float, nullable=False)
+    balance = db.Column(db.Float, nullable=False)
+
+    @property
+    def amount(self):
+        return self.principal + self.interest
+
+
+class CashFlowMonthly(db.Model):
+    # Soma mensal das parcelas a receber, mantida junto com sale_installment
+    month = db.Column(db.Date, primary_key=True)
+    installments = db.Column(db.Integer, nullable=False, default=0)
+    principal = db.Column(db.Float, nullable=False, default=0)
+    interest = db.Column(db.Float, nullable=False, default=0)
+
+
+class InventoryMovement(db.Model):
+    # Livro de movimentações de estoque, só recebe inserções (services/inventory.py).
+    # product_id sem chave estrangeira: o histórico continua após excluir o produto.
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)
+    sale_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class StockSnapshot(db.Model):
+    # Estoque de um produto depois da movimentação movement_id
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    movement_id = db.Column(db.Integer, nullable=False)
+    stock = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+
+
+
+class MailMessage(db.Model):
+    # Fila de emails (services/mail_queue.py): gravada pelas rotas, entregue
+    # pelo worker em outro processo. locked_by/locked_until marcam a reserva.
+    __tablename__ = 'mail_queue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending', server_default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(32), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+# Hash SHA-256 do conteúdo das imagens, usado como ETag nas rotas de imagem e
+# como nome do arquivo no armazenamento em disco (services/blob_store.py)
+ProductImage.content_hash = db.Column(db.String(64), nullable=True, index=True)
+ClientImage.content_hash = db.Column(db.String(64), nullable=True, index=True)
+
+
+# Quantidade reservada por vendas pendentes/em negociação (services/stock.py)
+Product.reserved = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+# Índices dos caminhos de acesso do dashboard e das listas (migração add_access_path_indexes)
+db.Index('ix_sale_status_sale_date', Sale.status, Sale.sale_date)
+db.Index('ix_sale_sale_date_id', Sale.sale_date, Sale.id)
+db.Index('ix_sale_product_id_status', Sale.product_id, Sale.status)
+db.Index('ix_sale_client_id_status', Sale.client_id, Sale.status)
+db.Index('ix_sale_seller_id', Sale.seller_id)
+db.Index('ix_product_category_id', Product.category_id)
+db.Index('ix_product_stock', Product.stock)
+db.Index('ix_product_low_stock', Product.stock,
+         sqlite_where=Product.stock < 10, postgresql_where=Product.stock < 10)
+db.Index('ix_sale_daily_rollup_product_id', SaleDailyRollup.product_id)
+db.Index('ix_sale_daily_rollup_client_id', SaleDailyRollup.client_id)
+db.Index('ix_inventory_movement_product_id_id', InventoryMovement.product_id, InventoryMovement.id)
+db.Index('ix_inventory_movement_created_at', InventoryMovement.created_at)
+db.Index('ix_stock_snapshot_product_id_taken_at', StockSnapshot.product_id, StockSnapshot.taken_at)
+
+# Autocompletar do formulário de vendas: páginas ordenadas por nome (migração add_lookup_indexes)
+db.Index('ix_client_full_name_id', Client.full_name, Client.id)
+db.Index('ix_product_is_active_name_id', Product.is_active, Product.name, Product.id)
+
+# Faixa de preço da lista de vendas (migração add_sale_total_price_index)
+db.Index('ix_sale_total_price', Sale.total_price)
+
+# Mensagens vencidas do worker de emails (migração add_mail_queue)
+db.Index('ix_mail_queue_status_next_attempt_at', MailMessage.status, MailMessage.next_attempt_at)
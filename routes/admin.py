@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import User, db
 from routes.auth import admin_required
-from config import bcrypt
+from services.passwords import hash_password, PasswordHasherBusy
 from forms import AdminForm
 
 admin_bp = Blueprint('admin', __name__)
@@ -29,7 +29,11 @@ def create_admin():
             flash('Email já está registrado.', 'danger')
             return redirect(url_for('admin.create_admin'))
         
-        hashed_password = bcrypt.generate_password_hash(form.password.data, rounds=12).decode('utf-8')
+        try:
+            hashed_password = hash_password(form.password.data)
+        except PasswordHasherBusy:
+            flash('O sistema está ocupado. Por favor, tente novamente em instantes.', 'warning')
+            return render_template('admin/create.html', form=form), 503
         new_admin = User(username=form.username.data, email=form.email.data.lower(), password=hashed_password, is_admin=True)
         
         try:
@@ -1,12 +1,14 @@
 from flask import Blueprint, render_template, url_for, flash, redirect, request
 from flask_login import login_user, current_user, logout_user, login_required
-from config import db, bcrypt, mail, app
+from config import db, app
 from models import User
-from flask_mail import Message
 from functools import wraps
 from forms import LoginForm, RegistrationForm, RequestResetForm, ResetPasswordForm
 import os
 from itsdangerous import URLSafeTimedSerializer
+from services.passwords import hash_password, check_password, verify_and_update, PasswordHasherBusy
+from services.rate_limit import attempt
+from services.mail_queue import enqueue
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -23,22 +25,18 @@ def verify_reset_token(token, expiration=1800):
     return User.get_active_users().filter_by(email=email).first()
 
 def send_reset_email(user):
+    # Só coloca o email na fila; o envio fica com o worker (flask mail worker)
     try:
         token = get_reset_token(user)
-        msg = Message('Solicitação de Redefinição de Senha',
-                    sender=app.config['MAIL_DEFAULT_SENDER'],
-                    recipients=[user.email])
-        msg.body = f'''Para redefinir sua senha, visite o seguinte link:
+        body = f'''Para redefinir sua senha, visite o seguinte link:
 {url_for('auth.reset_token', token=token, _external=True)}
 
 Se você não fez esta solicitação, simplesmente ignore este email e nenhuma alteração será feita.
 '''
-        print(f'Tentando enviar email para: {user.email}')
-        mail.send(msg)
-        print(f'Email enviado com sucesso para: {user.email}')
+        enqueue('Solicitação de Redefinição de Senha', [user.email], body)
         return True
     except Exception as e:
-        print(f'Erro ao enviar email: {str(e)}')
+        app.logger.error(f'Erro ao enfileirar email para {user.email}: {e}')
         return False
 
 def admin_required(f):
@@ -58,9 +56,21 @@ def login():
     form = LoginForm()
     if request.method == 'POST':
         if form.validate_on_submit():
+            wait = attempt(login_ip=request.remote_addr, login_email=form.email.data.lower())
+            if wait:
+                flash(f'Muitas tentativas de login. Tente novamente em {wait} segundos.', 'danger')
+                return render_template('auth/login.html', form=form), 429
+            
             user = User.get_active_users().filter_by(email=form.email.data).first()
+            try:
+                valid = user is not None and verify_and_update(user, form.password.data)
+            except PasswordHasherBusy:
+                flash('O sistema está ocupado. Por favor, tente novamente em instantes.', 'warning')
+                return render_template('auth/login.html', form=form), 503
             
-            if user and bcrypt.check_password_hash(user.password, form.password.data):
+            if valid:
+                # Grava o hash regravado com o custo atual, se for o caso
+                db.session.commit()
                 login_user(user, remember=form.remember_me.data)
                 next_page = request.args.get('next')
                 return redirect(next_page) if next_page else redirect(url_for('index'))
@@ -80,9 +90,22 @@ def register():
     
     form = RegistrationForm()
     if form.validate_on_submit():
+        # A senha do administrador é conferida aqui: limitar as tentativas por IP
+        wait = attempt(register_ip=request.remote_addr)
+        if wait:
+            flash(f'Muitas tentativas. Tente novamente em {wait} segundos.', 'danger')
+            return render_template('auth/register.html', form=form), 429
+        
         # Verificar a senha do administrador
         admin = User.get_active_users().filter_by(is_admin=True).first()
-        if not admin or not bcrypt.check_password_hash(admin.password, form.admin_password.data):
+        try:
+            admin_valid = admin is not None and check_password(admin.password, form.admin_password.data)
+            if admin_valid:
+                hashed_password = hash_password(form.password.data)
+        except PasswordHasherBusy:
+            flash('O sistema está ocupado. Por favor, tente novamente em instantes.', 'warning')
+            return render_template('auth/register.html', form=form), 503
+        if not admin_valid:
             flash('Senha do administrador incorreta.', 'danger')
             return redirect(url_for('auth.register'))
 
@@ -94,8 +117,6 @@ def register():
             flash('Email já está registrado.', 'danger')
             return redirect(url_for('auth.register'))
             
-        hashed_password = bcrypt.generate_password_hash(form.password.data, rounds=12).decode('utf-8')
-        
         # Criar usuário normal
         user = User(username=form.username.data, email=form.email.data.lower(), password=hashed_password, is_admin=False)
         db.session.add(user)
@@ -140,8 +161,11 @@ def reset_token(token):
         return redirect(url_for('auth.reset_request'))
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data, rounds=12).decode('utf-8')
-        user.password = hashed_password
+        try:
+            user.password = hash_password(form.password.data)
+        except PasswordHasherBusy:
+            flash('O sistema está ocupado. Por favor, tente novamente em instantes.', 'warning')
+            return render_template('auth/reset_token.html', form=form), 503
         db.session.commit()
         flash('Sua senha foi atualizada! Você já pode fazer login.', 'success')
         return redirect(url_for('auth.login'))
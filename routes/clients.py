@@ -1,11 +1,19 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
 from flask_login import login_required
 from models import Client, ClientImage, Sale
 from config import db
 from routes.auth import admin_required
+from services.sales_rollup import delete_client_rows
+from services.dashboard_cache import mark_dirty
+from services.images import image_response, store_upload, release_image
+from services.list_queries import clients_list_query
+from services.financing import delete_installments
+from services.search import delete_documents
+from services.lookups import client_page
+from services.stock import release_deleted_sales
+from services.exports import export_response, parse_client_filters
 from werkzeug.utils import secure_filename
 from datetime import datetime
-from io import BytesIO
 
 
 
@@ -18,16 +26,24 @@ def allowed_file(filename):
 @clients_bp.route('/clients')
 @login_required
 def list_clients():
-    clients = Client.query.all()
+    clients = clients_list_query().all()
     return render_template('clients/list.html', clients=clients)
 
+@clients_bp.route('/clients/lookup')
+@login_required
+def lookup_clients():
+    # Autocompletar do formulário de vendas: ?q=texto&after=cursor
+    return jsonify(client_page(request.args.get('q', ''), cursor=request.args.get('after'),
+                               page_size=request.args.get('limit', type=int)))
+
+@clients_bp.route('/clients/export/<fmt>')
+@login_required
+def export_clients(fmt):
+    return export_response('clients', fmt, parse_client_filters(request.args), 'clients.list_clients')
+
 @clients_bp.route('/client/image/<int:image_id>')
 def get_client_image(image_id):
-    image = ClientImage.query.get_or_404(image_id)
-    return send_file(
-        BytesIO(image.image_data),
-        mimetype=image.mime_type
-    )
+    return image_response(ClientImage, image_id)
 
 from forms import ClientForm
 
@@ -61,14 +77,15 @@ def create_client():
         )
         
         db.session.add(client)
+        mark_dirty()
         db.session.commit()
         
         # Processar até 5 imagens
         for i, image in enumerate(images[:5]):
             if image and allowed_file(image.filename):
-                image_data = image.read()
                 mime_type = image.content_type
-                client_image = ClientImage(client_id=client.id, image_data=image_data, mime_type=mime_type)
+                client_image = ClientImage(client_id=client.id, mime_type=mime_type,
+                                           content_hash=store_upload(image))
                 db.session.add(client_image)
         
         db.session.commit()
@@ -97,6 +114,7 @@ def edit_client(id):
             return redirect(url_for('clients.edit_client', id=id))
             
         form.populate_obj(client)
+        mark_dirty()
         
         # Processar imagens
         images = request.files.getlist('images[]')
@@ -111,9 +129,9 @@ def edit_client(id):
             
             for image in images:
                 if image and allowed_file(image.filename):
-                    image_data = image.read()
                     mime_type = image.content_type
-                    client_image = ClientImage(client_id=client.id, image_data=image_data, mime_type=mime_type)
+                    client_image = ClientImage(client_id=client.id, mime_type=mime_type,
+                                               content_hash=store_upload(image))
                     db.session.add(client_image)
         
         db.session.commit()
@@ -132,6 +150,7 @@ def delete_client_image(image_id):
         # Remove o registro do banco de dados
         db.session.delete(client_image)
         db.session.commit()
+        release_image(client_image.content_hash)
         
         return {'success': True, 'message': 'Imagem excluída com sucesso'}
     except Exception as e:
@@ -146,7 +165,17 @@ def delete_client(id):
     
     try:
         # Delete all associated sales records first
+        sales = Sale.query.filter_by(client_id=id).all()
+        # Vendas pendentes devolvem a reserva de estoque antes de sumir
+        if not release_deleted_sales(sales):
+            db.session.rollback()
+            flash('Uma venda do cliente foi alterada por outro usuário. Tente novamente.', 'warning')
+            return redirect(url_for('clients.list_clients'))
+        sale_ids = [sale.id for sale in sales]
+        delete_installments(sale_ids)
+        delete_documents('sale', sale_ids)
         Sale.query.filter_by(client_id=id).delete()
+        delete_client_rows(id)
         
         db.session.delete(client)
         db.session.commit()
@@ -0,0 +1,27 @@
+from flask import Blueprint, render_template, flash, redirect, url_for, send_file, abort
+from flask_login import login_required, current_user
+from services.exports import get_job, job_file_path, MIMETYPES
+
+exports_bp = Blueprint('exports', __name__)
+
+def _get_user_job(job_id):
+    job = get_job(job_id)
+    if job is None or (job['user_id'] != current_user.id and not current_user.is_admin):
+        abort(404)
+    return job
+
+@exports_bp.route('/exports/<job_id>')
+@login_required
+def job_status(job_id):
+    job = _get_user_job(job_id)
+    return render_template('exports/job.html', job=job)
+
+@exports_bp.route('/exports/<job_id>/download')
+@login_required
+def download(job_id):
+    job = _get_user_job(job_id)
+    if job['status'] != 'done':
+        flash('A exportação ainda não está pronta.', 'warning')
+        return redirect(url_for('exports.job_status', job_id=job_id))
+    return send_file(job_file_path(job), mimetype=MIMETYPES[job['format']], as_attachment=True,
+                     download_name=job['filename'])
@@ -0,0 +1,43 @@
+from flask import Blueprint, render_template, flash, redirect, url_for, send_file, abort
+from flask_login import login_required, current_user
+from routes.auth import admin_required
+from forms import ImportForm
+from services.imports import start_job, get_job, report_path, file_format
+
+imports_bp = Blueprint('imports', __name__)
+
+@imports_bp.route('/imports', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def upload():
+    form = ImportForm()
+    if form.validate_on_submit():
+        if file_format(form.file.data.filename) is None:
+            flash('Formato de arquivo indisponível.', 'danger')
+            return redirect(url_for('imports.upload'))
+        job = start_job(form.kind.data, form.file.data, current_user.id)
+        return redirect(url_for('imports.job_status', job_id=job['id']))
+    return render_template('imports/upload.html', form=form)
+
+def _get_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+@imports_bp.route('/imports/<job_id>')
+@login_required
+@admin_required
+def job_status(job_id):
+    return render_template('imports/job.html', job=_get_job(job_id))
+
+@imports_bp.route('/imports/<job_id>/report')
+@login_required
+@admin_required
+def report(job_id):
+    job = _get_job(job_id)
+    if job['status'] == 'running':
+        flash('A importação ainda está em andamento.', 'warning')
+        return redirect(url_for('imports.job_status', job_id=job_id))
+    return send_file(report_path(job), mimetype='text/csv; charset=utf-8', as_attachment=True,
+                     download_name=f'erros-{job["filename"].rsplit(".", 1)[0]}.csv')
@@ -0,0 +1,19 @@
+import hmac
+from flask import Blueprint, Response, request, abort
+from flask_login import current_user
+from config import app
+from services.metrics import render
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    # Coletor do Prometheus: Authorization: Bearer <METRICS_TOKEN>. Sem token
+    # configurado, só administradores logados.
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+    elif not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -1,12 +1,18 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
 from flask_login import login_required
 from models import Product, ProductImage, Category
 from config import db
 from routes.auth import admin_required
+from services.sales_rollup import update_product_cost
+from services.dashboard_cache import mark_dirty
+from services.images import image_response, store_upload, release_image
+from services.list_queries import products_list_query, categories_with_products
+from services.inventory import record_movement, stock_at, movements, REASONS
+from services.stock import set_stock
+from services.lookups import product_page
 from flask_wtf import FlaskForm
 from werkzeug.utils import secure_filename
-from datetime import datetime
-from io import BytesIO
+from datetime import datetime, timedelta
 
 products_bp = Blueprint('products', __name__)
 
@@ -39,30 +45,29 @@ def list_products():
     view_type = request.args.get('view', 'list')
     category_id = request.args.get('category')
     
-    if category_id:
-        products = Product.query.filter_by(category_id=category_id).all()
-    else:
-        products = Product.query.all()
+    products = products_list_query(category_id).all()
     categories = Category.query.all()
     if view_type == 'gallery':
         return render_template('products/gallery.html', products=products, categories=categories)
     return render_template('products/list.html', products=products, categories=categories)
 
+@products_bp.route('/products/lookup')
+@login_required
+def lookup_products():
+    # Autocompletar do formulário de vendas (só produtos ativos): ?q=texto&after=cursor
+    return jsonify(product_page(request.args.get('q', ''), cursor=request.args.get('after'),
+                                page_size=request.args.get('limit', type=int)))
+
 @products_bp.route('/products/gallery')
 @login_required
 def gallery_products():
-    products = Product.query.all()
-    # Obtém apenas as categorias que têm produtos
-    categories = Category.query.join(Product).distinct().all()
+    products = products_list_query().all()
+    categories = categories_with_products().all()
     return render_template('products/gallery.html', products=products, categories=categories)
 
 @products_bp.route('/product/image/<int:image_id>')
 def get_product_image(image_id):
-    image = ProductImage.query.get_or_404(image_id)
-    return send_file(
-        BytesIO(image.image_data),
-        mimetype=image.mime_type
-    )
+    return image_response(ProductImage, image_id)
 
 from wtforms import StringField, FloatField, IntegerField, BooleanField, SubmitField, DateField
 from wtforms.validators import DataRequired, Length, NumberRange
@@ -124,15 +129,19 @@ def create_product():
         )
         product.update_status()
         db.session.add(product)
+        # Produto novo muda o total de produtos do resumo do dashboard
+        mark_dirty()
         
         for image in images:
             if image and allowed_file(image.filename):
-                image_data = image.read()
                 mime_type = image.content_type
-                product_image = ProductImage(product=product, image_data=image_data, mime_type=mime_type)
+                product_image = ProductImage(product=product, mime_type=mime_type,
+                                             content_hash=store_upload(image))
                 db.session.add(product_image)
         
         try:
+            db.session.flush()
+            record_movement(product.id, product.stock, 'initial')
             db.session.commit()
             flash('Produto criado com sucesso!', 'success')
             return redirect(url_for('products.list_products'))
@@ -143,6 +152,10 @@ def create_product():
         
     return render_template('products/create.html', form=form)
 
+def _costs(product):
+    return tuple(cost or 0 for cost in (product.custo1, product.custo2, product.custo3,
+                                        product.custo4, product.custo5))
+
 @products_bp.route('/products/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -151,10 +164,20 @@ def edit_product(id):
     form = ProductForm()
     
     if request.method == 'POST' and form.validate_on_submit():
+        costs_before = _costs(product)
+        shown_before = (product.name, product.price, product.stock)
+        if form.stock.data < (product.reserved or 0):
+            flash(f'O estoque não pode ficar abaixo da quantidade reservada por vendas pendentes ({product.reserved}).', 'danger')
+            return redirect(url_for('products.edit_product', id=id))
+        # Estoque mostrado quando o formulário foi aberto
+        loaded_stock = request.form.get('loaded_stock', type=int)
+        if not set_stock(product, form.stock.data, loaded_stock):
+            db.session.rollback()
+            flash('O estoque foi alterado por outra operação. Confira o valor e tente novamente.', 'warning')
+            return redirect(url_for('products.edit_product', id=id))
         product.name = form.name.data
         product.description = form.description.data
         product.price = form.price.data
-        product.stock = form.stock.data
         product.data_entrada = form.data_entrada.data
         product.custo1 = form.custo1.data
         product.custo2 = form.custo2.data
@@ -165,6 +188,13 @@ def edit_product(id):
         product.category = form.category.data
         product.update_status()
         
+        # O cache do dashboard só é invalidado se algo que ele mostra mudou
+        if _costs(product) != costs_before:
+            # Mantém o custo do agregado diário alinhado com os novos custos
+            update_product_cost(product)
+        elif (product.name, product.price, product.stock) != shown_before:
+            mark_dirty()
+        
         images = request.files.getlist('images[]')
         if images and any(image.filename for image in images):
             existing_images_count = len(product.images)
@@ -176,9 +206,9 @@ def edit_product(id):
             
             for image in images:
                 if image and allowed_file(image.filename):
-                    image_data = image.read()
                     mime_type = image.content_type
-                    product_image = ProductImage(product=product, image_data=image_data, mime_type=mime_type)
+                    product_image = ProductImage(product=product, mime_type=mime_type,
+                                                 content_hash=store_upload(image))
                     db.session.add(product_image)
         
         db.session.commit()
@@ -187,6 +217,34 @@ def edit_product(id):
         
     return render_template('products/edit.html', product=product, form=form)
 
+@products_bp.route('/products/<int:id>/stock-history')
+@login_required
+@admin_required
+def stock_history(id):
+    # Auditoria: movimentações do produto e estoque numa data (?at=AAAA-MM-DD)
+    product = Product.query.get_or_404(id)
+    at = request.args.get('at')
+    try:
+        at = datetime.strptime(at, '%Y-%m-%d') + timedelta(days=1) if at else None
+    except ValueError:
+        return jsonify({'errors': ['Data inválida; use AAAA-MM-DD.']}), 400
+    return jsonify({
+        'product_id': product.id,
+        'stock': product.stock,
+        'ledger_stock': stock_at(product.id, at),
+        'movements': [
+            {
+                'id': movement.id,
+                'quantity': movement.quantity,
+                'reason': REASONS.get(movement.reason, movement.reason),
+                'sale_id': movement.sale_id,
+                'user_id': movement.user_id,
+                'created_at': movement.created_at.isoformat(),
+            }
+            for movement in movements(product.id, end=at)
+        ],
+    })
+
 @products_bp.route('/products/delete_image/<int:image_id>', methods=['POST'])
 @login_required
 @admin_required
@@ -196,6 +254,7 @@ def delete_product_image(image_id):
     try:
         db.session.delete(product_image)
         db.session.commit()
+        release_image(product_image.content_hash)
         return {'success': True}
     except Exception as e:
         db.session.rollback()
@@ -212,7 +271,10 @@ def delete_product(id):
         return redirect(url_for('products.list_products'))
     
     try:
+        record_movement(product.id, -(product.stock or 0), 'delete')
         db.session.delete(product)
+        # Total de produtos e estoque baixo do resumo do dashboard
+        mark_dirty()
         db.session.commit()
         flash('Produto excluído com sucesso!', 'success')
         return redirect(url_for('products.list_products'))
@@ -0,0 +1,42 @@
+from flask import Blueprint, render_template, request, send_file, abort
+from flask_login import login_required
+from routes.auth import admin_required
+from services.profiling import list_profiles, get_profile, profile_path, top_functions
+
+profiles_bp = Blueprint('profiles', __name__)
+
+SORTS = {'cumulative': 'Tempo acumulado', 'tottime': 'Tempo próprio', 'ncalls': 'Chamadas'}
+DOWNLOADS = {'prof': 'application/octet-stream', 'folded': 'text/plain; charset=utf-8'}
+
+def _get_profile(profile_id):
+    profile = get_profile(profile_id)
+    if profile is None:
+        abort(404)
+    return profile
+
+@profiles_bp.route('/admin/profiles')
+@login_required
+@admin_required
+def list_profiles_page():
+    return render_template('admin/profiles.html', profiles=list_profiles())
+
+@profiles_bp.route('/admin/profiles/<profile_id>')
+@login_required
+@admin_required
+def profile_detail(profile_id):
+    profile = _get_profile(profile_id)
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in SORTS:
+        sort = 'cumulative'
+    return render_template('admin/profile.html', profile=profile, sort=sort, sorts=SORTS,
+                           stats=top_functions(profile_id, sort))
+
+@profiles_bp.route('/admin/profiles/<profile_id>.<fmt>')
+@login_required
+@admin_required
+def download_profile(profile_id, fmt):
+    profile = _get_profile(profile_id)
+    if fmt not in DOWNLOADS:
+        abort(404)
+    return send_file(profile_path(profile['id'], f'.{fmt}'), mimetype=DOWNLOADS[fmt], as_attachment=True,
+                     download_name=f'{profile["id"]}.{fmt}')
@@ -1,11 +1,19 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, abort, current_app
 from flask_login import login_required, current_user
-from models import Sale, Product, Client, User
+from models import Sale, Product
 from config import db
 from forms import SaleForm
 from datetime import datetime
 from routes.auth import admin_required
+from services.sales_rollup import sale_contribution, apply_sale_delta
+from services.dashboard_cache import mark_dirty
+from services.sales_query import parse_filters, sales_page, price_range
+from services.exports import export_response
+from services.lookups import client_choices, product_choices
+from services.bulk_sales import ACTIONS, run as run_bulk, selected_sale_ids
+from services.financing import payment_terms, save_installments, delete_installments
+from services.stock import (RESERVING_STATUSES, available, reserve, release, change_reservation,
+                            consume_reservation, restock, transition_sale)
 import math
 
 sales_bp = Blueprint('sales', __name__)
@@ -13,9 +21,61 @@ sales_bp = Blueprint('sales', __name__)
 @sales_bp.route('/sales')
 @login_required
 def list_sales():
-    # Usando LEFT JOIN para incluir vendas mesmo quando o vendedor foi excluído
-    sales = Sale.query.join(Client).join(Product).outerjoin(User, Sale.seller_id == User.id).order_by(Sale.sale_date.desc(), Sale.id.desc()).all()
-    return render_template('sales/list.html', sales=sales)
+    # Primeira página renderizada no servidor; as demais e os filtros vêm de /sales/data
+    filters = parse_filters(request.args)
+    sales, next_cursor = sales_page(filters)
+    price_min, price_max = price_range()
+    return render_template('sales/list.html', sales=sales, next_cursor=next_cursor,
+                           filters=filters, price_min=price_min, price_max=price_max)
+
+@sales_bp.route('/sales/data')
+@login_required
+def sales_data():
+    filters = parse_filters(request.args)
+    sales, next_cursor = sales_page(filters, cursor=request.args.get('after'),
+                                    page_size=request.args.get('limit', type=int))
+    return jsonify({
+        'html': render_template('sales/_rows.html', sales=sales),
+        'count': len(sales),
+        'next_cursor': next_cursor
+    })
+
+@sales_bp.route('/sales/export/<fmt>')
+@login_required
+def export_sales(fmt):
+    # Exporta todas as vendas que atendem aos filtros, não só a página carregada
+    return export_response('sales', fmt, parse_filters(request.args), 'sales.list_sales')
+
+@sales_bp.route('/sales/bulk/<action>', methods=['POST'])
+@login_required
+@admin_required
+def bulk_action(action):
+    # Finaliza, cancela ou reprecifica várias vendas numa única transação. As
+    # vendas vêm como sale_ids (JSON ou formulário) ou pelos filtros da lista.
+    if action not in ACTIONS:
+        abort(404)
+    data = request.get_json(silent=True) or {}
+    sale_ids = data.get('sale_ids') or request.form.getlist('sale_ids', type=int)
+    if not sale_ids:
+        filters = parse_filters(data.get('filters') or request.args)
+        if not any(value not in ('', None) for value in filters.values()):
+            return jsonify({'errors': ['Selecione as vendas ou informe ao menos um filtro.']}), 400
+        sale_ids = selected_sale_ids(filters)
+    try:
+        if not isinstance(sale_ids, list):
+            raise TypeError
+        sale_ids = [int(sale_id) for sale_id in sale_ids]
+    except (TypeError, ValueError):
+        return jsonify({'errors': ['Lista de vendas inválida.']}), 400
+    options = {}
+    if action == 'reprice':
+        discount = data.get('discount_percentage', request.form.get('discount_percentage'))
+        try:
+            options['discount_percentage'] = float(discount) if discount not in (None, '') else None
+        except (TypeError, ValueError):
+            return jsonify({'errors': ['Desconto inválido.']}), 400
+    result = run_bulk(action, sale_ids, **options)
+    return jsonify(result), 409 if result['errors'] else 200
 
 @sales_bp.route('/sales/new', methods=['GET', 'POST'])
 @login_required
@@ -26,16 +86,14 @@ def create_sale():
     if product_id:
         form.product_id.data = product_id
     
-    # Populate select fields
-    form.product_id.choices = [(p.id, f"{p.name} - ¥{p.price}") 
-                              for p in Product.query.filter_by(is_active=True).all()]
-    form.client_id.choices = [(c.id, c.full_name) 
-                             for c in Client.query.all()]
+    # Só as opções escolhidas; as demais vêm do autocompletar (services/lookups.py)
+    form.product_id.choices = product_choices(form.product_id.data)
+    form.client_id.choices = client_choices(form.client_id.data)
     
     if form.validate_on_submit():
         product = Product.query.get_or_404(form.product_id.data)
         
-        if product.stock < form.quantity.data:
+        if available(product) < form.quantity.data:
             flash('Quantidade indisponível em estoque.', 'danger')
             return redirect(url_for('sales.create_sale'))
         
@@ -45,8 +103,8 @@ def create_sale():
         
         # Cálculo do financiamento
         is_financed = form.is_financed.data
-        total_financed = round(total_price)
-        monthly_payment = round(total_price)
+        total_financed = None
+        monthly_payment = None
         
         if is_financed:
             years = form.financing_years.data
@@ -59,12 +117,7 @@ def create_sale():
                 flash('A taxa de juros deve ser maior que zero.', 'danger')
                 return redirect(url_for('sales.create_sale'))
                 
-            annual_rate = annual_rate / 100
-            monthly_rate = annual_rate / 12
-            num_payments = years * 12
-            
-            monthly_payment = total_price * (monthly_rate * (1 + monthly_rate)**num_payments) / ((1 + monthly_rate)**num_payments - 1)
-            total_financed = monthly_payment * num_payments
+            monthly_payment, total_financed = payment_terms(total_price, annual_rate, years)
         
         sale = Sale(
             product_id=form.product_id.data,
@@ -81,13 +134,21 @@ def create_sale():
             is_financed=is_financed,
             financing_years=form.financing_years.data if is_financed else None,
             interest_rate=form.interest_rate.data if is_financed else None,
-            total_financed=total_financed if is_financed else None,
-            monthly_payment=monthly_payment if is_financed else None
+            total_financed=total_financed,
+            monthly_payment=monthly_payment,
+            total_amount=total_financed if is_financed else total_price
         )
         
         try:
-            # Não atualiza o estoque imediatamente para vendas pendentes
+            # Venda pendente não baixa o estoque, apenas reserva a quantidade
+            if not reserve(product.id, sale.quantity):
+                db.session.rollback()
+                flash('Quantidade indisponível em estoque.', 'danger')
+                return redirect(url_for('sales.create_sale'))
             db.session.add(sale)
+            db.session.flush()
+            save_installments(sale)
+            apply_sale_delta(None, sale_contribution(sale))
             db.session.commit()
             flash('Venda registrada com sucesso!', 'success')
             return redirect(url_for('sales.list_sales'))
@@ -113,8 +174,8 @@ def edit_sale(id):
         return redirect(url_for('sales.list_sales'))
     
     form = SaleForm(obj=sale)
-    form.product_id.choices = [(p.id, f"{p.name} - ¥{p.price}") for p in Product.query.filter_by(is_active=True).all()]
-    form.client_id.choices = [(c.id, c.full_name) for c in Client.query.all()]
+    form.product_id.choices = product_choices(form.product_id.data, current_product_id=sale.product_id)
+    form.client_id.choices = client_choices(form.client_id.data)
     
     # Preencher campos de financiamento existentes
     if request.method == 'GET' and sale.is_financed:
@@ -123,8 +184,11 @@ def edit_sale(id):
     
     if form.validate_on_submit():
         try:
-            # Validar e atualizar estoque
-            if not _validate_and_update_stock(sale, form):
+            rollup_before = sale_contribution(sale)
+            
+            # Validar e atualizar a reserva de estoque
+            if not _update_stock_reservation(sale, form):
+                db.session.rollback()
                 return redirect(url_for('sales.edit_sale', id=id))
             
             # Calcular valores da venda
@@ -136,41 +200,42 @@ def edit_sale(id):
             
             # Atualizar dados de financiamento
             if not _update_financing_data(sale, form, sale_values['total_price']):
+                # Desfaz a troca da reserva já feita acima
+                db.session.rollback()
                 return redirect(url_for('sales.edit_sale', id=id))
             
             # Garantir que as alterações sejam salvas
             db.session.add(sale)
+            save_installments(sale)
+            apply_sale_delta(rollup_before, sale_contribution(sale))
             db.session.commit()
             flash('Venda atualizada com sucesso!', 'success')
             return redirect(url_for('sales.list_sales'))
             
         except Exception as e:
             db.session.rollback()
-            print(f"Erro ao atualizar venda: {str(e)}")
+            current_app.logger.error(f'Erro ao atualizar venda {id}: {e}')
             flash('Erro ao atualizar venda. Por favor, tente novamente.', 'danger')
             return redirect(url_for('sales.edit_sale', id=id))
     
     return render_template('sales/edit.html', form=form, sale=sale)
 
-def _validate_and_update_stock(sale, form):
-    product = Product.query.get_or_404(form.product_id.data)
-    quantity_difference = form.quantity.data - sale.quantity
-    
-    # Verificar disponibilidade de estoque
-    if (product.id != sale.product_id and product.stock < form.quantity.data) or \
-       (product.id == sale.product_id and quantity_difference > product.stock):
-        flash(f'Quantidade indisponível em estoque. Estoque atual: {product.stock}', 'danger')
+def _update_stock_reservation(sale, form):
+    # A edição vale para o status lido: a troca condicional (para o mesmo status)
+    # falha se outra requisição finalizou ou cancelou a venda nesse meio tempo,
+    # e segura a linha até o commit
+    if not transition_sale(sale, [sale.status], sale.status):
+        flash('A venda foi alterada por outro usuário. Tente novamente.', 'warning')
         return False
-    
-    # Atualizar estoque
-    if product.id != sale.product_id:
-        old_product = Product.query.get(sale.product_id)
-        old_product.stock += sale.quantity
-        old_product.update_status()
-        product.stock -= form.quantity.data
-    else:
-        product.stock -= quantity_difference
-    product.update_status()
+    # Só vendas pendentes/em negociação reservam estoque; a troca da reserva é atômica
+    if sale.status not in RESERVING_STATUSES:
+        return True
+    if not change_reservation(sale.product_id, sale.quantity, form.product_id.data, form.quantity.data):
+        product = Product.query.get_or_404(form.product_id.data)
+        flash(f'Quantidade indisponível em estoque. Disponível: {available(product)}', 'danger')
+        return False
+    # Estoque alterado: a lista de estoque baixo do dashboard muda
+    mark_dirty()
     return True
 
 def _calculate_sale_values(product, form):
@@ -203,15 +268,8 @@ def _update_financing_data(sale, form, total_price):
         flash('Período de financiamento e taxa de juros devem ser maiores que zero.', 'danger')
         return False
     
-    monthly_rate = (form.interest_rate.data / 100) / 12
-    num_payments = form.financing_years.data * 12
-    
-    if monthly_rate > 0:
-        monthly_payment = round(total_price * (monthly_rate * (1 + monthly_rate)**num_payments) / ((1 + monthly_rate)**num_payments - 1))
-        total_financed = round(monthly_payment * num_payments)
-    else:
-        monthly_payment = round(total_price / num_payments)
-        total_financed = round(total_price)
+    monthly_payment, total_financed = payment_terms(
+        total_price, form.interest_rate.data, form.financing_years.data)
     
     sale.financing_years = form.financing_years.data
     sale.interest_rate = form.interest_rate.data
@@ -230,22 +288,27 @@ def complete_sale(id):
         return redirect(url_for('sales.list_sales'))
     
     try:
-        # Atualiza o estoque do produto
-        product = Product.query.get(sale.product_id)
-        if not product:
-            flash('Produto não encontrado. Não é possível finalizar a venda.', 'danger')
+        rollup_before = sale_contribution(sale)
+        # A troca de status e a baixa de estoque são condicionais: se outra
+        # requisição finalizou a venda ou o estoque acabou, nada é gravado
+        if not transition_sale(sale, RESERVING_STATUSES, 'completed'):
+            db.session.rollback()
+            flash('Esta venda já foi finalizada ou cancelada.', 'warning')
+            return redirect(url_for('sales.list_sales'))
+        
+        if not consume_reservation(sale.product_id, sale.quantity, sale_id=sale.id):
+            db.session.rollback()
+            flash('Estoque insuficiente para finalizar a venda.', 'danger')
             return redirect(url_for('sales.list_sales'))
-            
-        product.stock -= sale.quantity
-        product.update_status()
         
-        sale.status = 'completed'
         sale.updated_at = datetime.utcnow()
+        apply_sale_delta(rollup_before, sale_contribution(sale))
+        mark_dirty()
         db.session.commit()
         flash('Venda finalizada com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
-        print(f'Erro ao finalizar venda: {str(e)}')
+        current_app.logger.error(f'Erro ao finalizar venda {id}: {e}')
         flash('Erro ao finalizar venda. Por favor, tente novamente.', 'danger')
     
     return redirect(url_for('sales.list_sales'))
@@ -265,13 +328,27 @@ def cancel_sale(id):
         return redirect(url_for('sales.list_sales'))
     
     try:
-        # Só restaura o estoque se a venda estava completa
-        if sale.status == 'completed':
-            product.stock += sale.quantity
-            product.update_status()
+        rollup_before = sale_contribution(sale)
+        previous_status = sale.status
+        if not transition_sale(sale, [previous_status], 'cancelled'):
+            db.session.rollback()
+            flash('A venda foi alterada por outro usuário. Tente novamente.', 'warning')
+            return redirect(url_for('sales.list_sales'))
+        
+        # Venda finalizada devolve o estoque; pendente apenas libera a reserva
+        if previous_status == 'completed':
+            restock(product.id, sale.quantity, sale_id=sale.id)
+        elif previous_status in RESERVING_STATUSES and not release(product.id, sale.quantity):
+            # A venda é cancelada mesmo assim; a reserva já estava menor que a
+            # venda (conferir com reserved_quantities)
+            current_app.logger.warning(f'Cancelamento da venda {id}: nada a liberar na reserva '
+                                       f'do produto {product.id} ({sale.quantity} unidades)')
+        mark_dirty()
         
-        sale.status = 'cancelled'
         sale.updated_at = datetime.utcnow()
+        apply_sale_delta(rollup_before, sale_contribution(sale))
+        # Venda cancelada sai da previsão de recebimentos
+        delete_installments([sale.id])
         
         db.session.commit()
         flash('Venda cancelada com sucesso!', 'success')
@@ -280,5 +357,5 @@ def cancel_sale(id):
     except Exception as e:
         db.session.rollback()
         flash('Erro ao cancelar venda. Por favor, tente novamente.', 'danger')
-        print(f'Erro ao cancelar venda: {str(e)}')
+        current_app.logger.error(f'Erro ao cancelar venda {id}: {e}')
         return redirect(url_for('sales.list_sales'))
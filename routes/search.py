@@ -0,0 +1,12 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from services.search import search as run_search
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/search')
+@login_required
+def search():
+    # ?q=texto[&kind=client|product|sale][&limit=N]
+    return jsonify(run_search(request.args.get('q', ''), kind=request.args.get('kind') or None,
+                              limit=request.args.get('limit', type=int)))
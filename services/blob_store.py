@@ -0,0 +1,132 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from config import app
+
+# Armazenamento de arquivos endereçado por conteúdo: cada arquivo é gravado com o
+# nome do seu hash SHA-256, então uploads idênticos ocupam um único arquivo.
+#
+# Um upload que reaproveita um arquivo existente atualiza a data de modificação
+# dele antes de gravar a linha no banco; a exclusão (delete_unused) não apaga
+# arquivos modificados há menos de `grace` segundos. Assim um arquivo liberado
+# por uma exclusão não some debaixo de um upload do mesmo conteúdo ainda não
+# confirmado.
+
+CHUNK_SIZE = 64 * 1024
+DERIVED_DIR = 'derived'
+
+
+class FileBlobStore:
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        # Dois níveis de subdiretórios para não acumular milhares de arquivos num só
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def _store_temp(self, temp_path, digest):
+        final_path = self.path(digest)
+        if self._touch(final_path):
+            # Conteúdo já armazenado: deduplicação
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+        return digest
+
+    def _touch(self, path):
+        # Marca o arquivo como em uso agora; False se ele não existe (ou acabou de ser removido)
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put_file(self, fileobj):
+        # Copia em blocos calculando o hash, sem carregar o arquivo inteiro na memória
+        os.makedirs(self.root, exist_ok=True)
+        sha = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    temp.write(chunk)
+            return self._store_temp(temp_path, sha.hexdigest())
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if self._touch(self.path(digest)):
+            return digest
+        os.makedirs(self.root, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        with os.fdopen(fd, 'wb') as temp:
+            temp.write(data)
+        return self._store_temp(temp_path, digest)
+
+    def derived_path(self, digest, name):
+        # Arquivos derivados (miniaturas etc.) ficam separados dos originais
+        return os.path.join(self.root, DERIVED_DIR, digest[:2], f'{digest}-{name}')
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+        self._delete_derived(digest)
+
+    def delete_unused(self, digest, grace):
+        # Remove o arquivo se ele não foi usado por um upload nos últimos `grace`
+        # segundos. O arquivo é primeiro renomeado (atômico): um upload
+        # concorrente ou já atualizou a data antes disso, e o arquivo volta, ou
+        # não o encontra mais e grava o conteúdo de novo. Retorna True se removeu.
+        path = self.path(digest)
+        trash = os.path.join(os.path.dirname(path), f'.deleting-{uuid.uuid4().hex}')
+        try:
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(trash).st_mtime < grace:
+            os.replace(trash, path)
+            return False
+        os.remove(trash)
+        self._delete_derived(digest)
+        return True
+
+    def _delete_derived(self, digest):
+        derived_dir = os.path.dirname(self.derived_path(digest, ''))
+        if os.path.isdir(derived_dir):
+            for filename in os.listdir(derived_dir):
+                if filename.startswith(f'{digest}-'):
+                    os.remove(os.path.join(derived_dir, filename))
+
+    def digests(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root and DERIVED_DIR in dirnames:
+                dirnames.remove(DERIVED_DIR)
+            for filename in filenames:
+                if not filename.startswith('.'):
+                    yield filename
+
+
+_store = None
+
+def get_blob_store():
+    global _store
+    if _store is None:
+        root = app.config.get('IMAGE_STORE_PATH', os.path.join(app.instance_path, 'blobs'))
+        _store = FileBlobStore(root)
+    return _store
@@ -0,0 +1,167 @@
+import time
+from datetime import datetime
+from config import app, db
+from models import Sale, Product
+from services.dashboard_cache import mark_dirty
+from services.financing import monthly_payments, financed_totals, delete_installments, replace_installments
+from services.sales_query import filtered_sales_query
+from services.sales_rollup import sale_contribution, apply_sale_deltas
+from services.stock import (RESERVING_STATUSES, quantities_by_product, transition_sales,
+                            consume_reservations, restock_sales, release_sales)
+
+# Operações em lote sobre vendas (fechamento do mês): finalizar, cancelar ou
+# reprecificar muitas vendas numa única transação. As vendas e os produtos são
+# carregados em duas consultas, o status muda num único UPDATE e o estoque
+# recebe um UPDATE por produto com a soma das quantidades. O estoque é
+# validado antes de qualquer gravação; se algo falhar, nada é gravado.
+
+ACTIONS = ('complete', 'cancel', 'reprice')
+
+
+def selected_sale_ids(filters):
+    # IDs das vendas que atendem aos filtros da lista de vendas
+    return [sale_id for (sale_id,) in filtered_sales_query(filters).with_entities(Sale.id)]
+
+def _load(sale_ids):
+    if not sale_ids:
+        return [], {}
+    sales = Sale.query.filter(Sale.id.in_(sale_ids)).order_by(Sale.id).all()
+    # Produtos de uma vez: sale_contribution() os encontra no identity map
+    product_ids = {sale.product_id for sale in sales}
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids))}
+    return sales, products
+
+def _missing_products(sales, products):
+    return [f'Produto {product_id} não encontrado.'
+            for product_id in sorted({sale.product_id for sale in sales} - set(products))]
+
+def _result(action, selected, sales, started, errors=()):
+    elapsed = time.monotonic() - started
+    processed = 0 if errors else len(sales)
+    return {
+        'action': action,
+        'selected': selected,
+        'processed': processed,
+        'skipped': selected - len(sales),
+        'errors': list(errors),
+        'elapsed': round(elapsed, 3),
+        'sales_per_sec': round(processed / elapsed) if elapsed else 0,
+    }
+
+def _fail(action, selected, sales, started, errors):
+    db.session.rollback()
+    return _result(action, selected, sales, started, errors)
+
+def complete_sales(sale_ids):
+    # Finaliza as vendas pendentes/em negociação; as demais são ignoradas
+    started = time.monotonic()
+    sale_ids = set(sale_ids)
+    sales, products = _load(sale_ids)
+    sales = [sale for sale in sales if sale.status in RESERVING_STATUSES]
+
+    errors = _missing_products(sales, products)
+    for product_id, quantity in quantities_by_product(sales).items():
+        product = products.get(product_id)
+        if product is not None and (product.stock or 0) < quantity:
+            errors.append(f'Estoque insuficiente para "{product.name}": '
+                          f'{quantity} necessários, {product.stock or 0} em estoque.')
+    if errors:
+        return _fail('complete', len(sale_ids), sales, started, errors)
+
+    before = [sale_contribution(sale) for sale in sales]
+    # As gravações continuam condicionais: se outra requisição alterou uma
+    # venda ou o estoque depois da validação, tudo é desfeito
+    if not transition_sales(sales, RESERVING_STATUSES, 'completed', updated_at=datetime.utcnow()):
+        return _fail('complete', len(sale_ids), sales, started,
+                     ['Alguma venda foi alterada por outro usuário. Tente novamente.'])
+    if not consume_reservations(sales):
+        return _fail('complete', len(sale_ids), sales, started,
+                     ['O estoque foi alterado durante a operação. Tente novamente.'])
+    apply_sale_deltas(zip(before, [sale_contribution(sale) for sale in sales]))
+    mark_dirty()
+    db.session.commit()
+    return _result('complete', len(sale_ids), sales, started)
+
+def cancel_sales(sale_ids):
+    # Cancela as vendas: finalizadas devolvem o estoque, pendentes liberam a reserva
+    started = time.monotonic()
+    sale_ids = set(sale_ids)
+    sales, products = _load(sale_ids)
+    completed = [sale for sale in sales if sale.status == 'completed']
+    reserving = [sale for sale in sales if sale.status in RESERVING_STATUSES]
+    sales = completed + reserving
+
+    errors = _missing_products(sales, products)
+    if errors:
+        return _fail('cancel', len(sale_ids), sales, started, errors)
+
+    before = [sale_contribution(sale) for sale in sales]
+    now = datetime.utcnow()
+    if not (transition_sales(completed, ['completed'], 'cancelled', updated_at=now) and
+            transition_sales(reserving, RESERVING_STATUSES, 'cancelled', updated_at=now)):
+        return _fail('cancel', len(sale_ids), sales, started,
+                     ['Alguma venda foi alterada por outro usuário. Tente novamente.'])
+    if not restock_sales(completed):
+        return _fail('cancel', len(sale_ids), sales, started,
+                     ['Não foi possível devolver o estoque. Tente novamente.'])
+    if not release_sales(reserving):
+        # As vendas são canceladas mesmo assim; alguma reserva já estava menor
+        # que as vendas (conferir com reserved_quantities)
+        app.logger.warning(f'Cancelamento em lote: reserva não liberada para parte das '
+                           f'{len(reserving)} vendas pendentes')
+    apply_sale_deltas(zip(before, [sale_contribution(sale) for sale in sales]))
+    # Vendas canceladas saem da previsão de recebimentos
+    delete_installments([sale.id for sale in sales])
+    mark_dirty()
+    db.session.commit()
+    return _result('cancel', len(sale_ids), sales, started)
+
+def reprice_sales(sale_ids, discount_percentage=None):
+    # Recalcula as vendas pendentes/em negociação com o preço atual do produto
+    # (e, opcionalmente, um novo desconto), como na edição da venda
+    started = time.monotonic()
+    sale_ids = set(sale_ids)
+    if discount_percentage is not None and not 0 <= discount_percentage <= 100:
+        return _result('reprice', len(sale_ids), [], started, ['O desconto deve estar entre 0% e 100%'])
+    sales, products = _load(sale_ids)
+    sales = [sale for sale in sales if sale.status in RESERVING_STATUSES]
+
+    errors = _missing_products(sales, products)
+    if errors:
+        return _fail('reprice', len(sale_ids), sales, started, errors)
+
+    # Novos valores calculados antes de gravar; cada venda é gravada num UPDATE
+    # condicional ao status lido, como em transition_sales, para não
+    # reprecificar uma venda finalizada ou cancelada nesse meio tempo
+    now = datetime.utcnow()
+    values = {}
+    for sale in sales:
+        discount = sale.discount_percentage if discount_percentage is None else discount_percentage
+        original_price = round(products[sale.product_id].price * sale.quantity)
+        total_price = round(original_price * (1 - (discount or 0) / 100))
+        values[sale.id] = dict(discount_percentage=discount, original_price=original_price,
+                               total_price=total_price, monthly_payment=total_price,
+                               total_financed=total_price, total_amount=total_price, updated_at=now)
+
+    # Parcelas de todas as vendas financiadas num único cálculo vetorizado
+    financed = [sale for sale in sales if sale.is_financed and sale.financing_years and sale.interest_rate]
+    if financed:
+        terms = ([values[sale.id]['total_price'] for sale in financed],
+                 [sale.interest_rate for sale in financed],
+                 [sale.financing_years for sale in financed])
+        payments = monthly_payments(*terms)
+        totals = financed_totals(*terms, payments)
+        for sale, payment, total in zip(financed, payments.tolist(), totals.tolist()):
+            values[sale.id].update(monthly_payment=payment, total_financed=total, total_amount=total)
+
+    for sale in sales:
+        if not transition_sales([sale], [sale.status], sale.status, **values[sale.id]):
+            return _fail('reprice', len(sale_ids), sales, started,
+                         ['Alguma venda foi alterada por outro usuário. Tente novamente.'])
+
+    replace_installments(sales)
+    db.session.commit()
+    return _result('reprice', len(sale_ids), sales, started)
+
+def run(action, sale_ids, **options):
+    return {'complete': complete_sales, 'cancel': cancel_sales, 'reprice': reprice_sales}[action](sale_ids, **options)
@@ -0,0 +1,299 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import event
+from config import app, db
+from services.dashboard_metrics import period_bounds, get_sales_by_date, get_summary
+
+# Cache de resultados do dashboard.
+# - 'period:<período>:<início>' guarda sales_by_date de um período (diário/semanal/mensal/anual)
+# - 'summary' guarda os totais, rankings e estoque baixo, que não dependem do período
+# - 'cashflow:<mês>' guarda a previsão de recebimentos das vendas financiadas a partir do mês
+# As rotas de escrita marcam o que mudou na sessão (mark_dirty) e a invalidação
+# acontece depois do commit, para não apagar o cache com dados ainda não gravados.
+
+PERIODS = ('daily', 'weekly', 'monthly', 'yearly')
+SUMMARY_KEY = 'summary'
+
+def period_key(period, date):
+    start_date, _ = period_bounds(period, date)
+    return f'period:{period}:{start_date.strftime("%Y-%m-%d")}'
+
+def cash_flow_key(date):
+    return f'cashflow:{date.strftime("%Y-%m")}'
+
+
+class MemoryCache:
+    # Cache em memória do processo, com TTL e remoção LRU
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._stats['sets'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend='memory', entries=len(self._entries),
+                        max_entries=self.max_entries, ttl=self.ttl)
+
+
+class SQLiteCache:
+    # Cache em arquivo SQLite, compartilhado entre os workers do gunicorn
+
+    FLUSH_INTERVAL = 10
+
+    def __init__(self, path, ttl=60, max_entries=256):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        # Acertos, falhas e acessos ficam em memória e são gravados de tempos em
+        # tempos (FLUSH_INTERVAL): a leitura do cache não disputa a trava de escrita
+        self._pending_lock = threading.Lock()
+        self._pending_counts = {}
+        self._pending_access = {}
+        self._flushed_at = time.time()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at ON cache_entry (accessed_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, name, amount=1):
+        conn.execute('INSERT INTO cache_stats (name, value) VALUES (?, ?) '
+                     'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, amount))
+
+    def _record(self, name, key=None, now=None):
+        with self._pending_lock:
+            self._pending_counts[name] = self._pending_counts.get(name, 0) + 1
+            if key is not None:
+                self._pending_access[key] = now
+            due = now is not None and now - self._flushed_at >= self.FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def _take_pending(self):
+        with self._pending_lock:
+            counts, access = self._pending_counts, self._pending_access
+            self._pending_counts, self._pending_access = {}, {}
+            self._flushed_at = time.time()
+        return counts, access
+
+    def _write_pending(self, conn, counts, access):
+        for name, amount in counts.items():
+            self._count(conn, name, amount)
+        conn.executemany('UPDATE cache_entry SET accessed_at = MAX(accessed_at, ?) WHERE key = ?',
+                         [(accessed_at, key) for key, accessed_at in access.items()])
+
+    def flush(self):
+        # Grava os contadores e horários de acesso acumulados desde a última vez
+        counts, access = self._take_pending()
+        if not counts and not access:
+            return
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._write_pending(conn, counts, access)
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # Estatística perdida não afeta o cache; só registra
+            app.logger.warning(f'Falha ao gravar estatísticas do cache do dashboard: {e}')
+
+    def get(self, key):
+        now = time.time()
+        row = self._connect().execute('SELECT value FROM cache_entry WHERE key = ? AND expires_at >= ?',
+                                      (key, now)).fetchone()
+        if row is None:
+            self._record('misses', now=now)
+            return None
+        self._record('hits', key, now)
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        counts, access = self._take_pending()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Aproveita a transação de escrita para gravar o que estava pendente
+            self._write_pending(conn, counts, access)
+            conn.execute('INSERT OR REPLACE INTO cache_entry (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value), now + self.ttl, now))
+            self._count(conn, 'sets')
+            # Remove expirados e, se ainda passar do limite, os menos acessados
+            conn.execute('DELETE FROM cache_entry WHERE expires_at < ?', (now,))
+            evicted = conn.execute('DELETE FROM cache_entry WHERE key IN ('
+                                   'SELECT key FROM cache_entry ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                                   (self.max_entries,)).rowcount
+            if evicted:
+                self._count(conn, 'evictions', evicted)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        conn = self._connect()
+        deleted = conn.execute(f'DELETE FROM cache_entry WHERE key IN ({",".join("?" * len(keys))})', keys).rowcount
+        if deleted:
+            self._count(conn, 'invalidations', deleted)
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_entry')
+
+    def stats(self):
+        self.flush()
+        conn = self._connect()
+        stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'invalidations': 0}
+        stats.update(dict(conn.execute('SELECT name, value FROM cache_stats').fetchall()))
+        entries = conn.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        return dict(stats, backend='sqlite', entries=entries, max_entries=self.max_entries, ttl=self.ttl)
+
+
+class NullCache:
+    # Cache desligado (DASHBOARD_CACHE_BACKEND = 'none')
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': 'none'}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend = app.config.get('DASHBOARD_CACHE_BACKEND', 'sqlite')
+                ttl = app.config.get('DASHBOARD_CACHE_TTL', 60)
+                max_entries = app.config.get('DASHBOARD_CACHE_MAX_ENTRIES', 256)
+                if backend == 'memory':
+                    _cache = MemoryCache(ttl=ttl, max_entries=max_entries)
+                elif backend == 'sqlite':
+                    path = app.config.get('DASHBOARD_CACHE_PATH',
+                                          os.path.join(app.instance_path, 'dashboard_cache.db'))
+                    _cache = SQLiteCache(path, ttl=ttl, max_entries=max_entries)
+                else:
+                    _cache = NullCache()
+    return _cache
+
+def cached_dashboard(period, date=None):
+    if date is None:
+        date = datetime.utcnow()
+    cache = get_cache()
+
+    key = period_key(period, date)
+    sales_by_date = cache.get(key)
+    if sales_by_date is None:
+        start_date, end_date = period_bounds(period, date)
+        sales_by_date = get_sales_by_date(start_date, end_date)
+        cache.set(key, sales_by_date)
+
+    summary = cache.get(SUMMARY_KEY)
+    if summary is None:
+        summary = get_summary()
+        cache.set(SUMMARY_KEY, summary)
+
+    return dict(summary, sales_by_date=sales_by_date)
+
+def keys_for_dates(dates):
+    # Chaves de todos os períodos que contêm alguma das datas
+    keys = set()
+    for day in dates:
+        if not isinstance(day, datetime):
+            day = datetime(day.year, day.month, day.day)
+        for period in PERIODS:
+            keys.add(period_key(period, day))
+    return keys
+
+def mark_dirty(dates=()):
+    # Registra na sessão o que deve ser invalidado quando a transação for confirmada.
+    # O resumo (totais, rankings, estoque) é sempre invalidado.
+    dirty = db.session.info.setdefault('dashboard_cache_dirty', set())
+    dirty.add(SUMMARY_KEY)
+    dirty.update(keys_for_dates(d for d in dates if d is not None))
+
+def mark_cash_flow_dirty():
+    # Parcelas alteradas: só a previsão de recebimentos muda
+    dirty = db.session.info.setdefault('dashboard_cache_dirty', set())
+    dirty.add(cash_flow_key(datetime.utcnow()))
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    dirty = session.info.pop('dashboard_cache_dirty', None)
+    if dirty:
+        try:
+            get_cache().delete(dirty)
+        except Exception as e:
+            # O TTL limita o tempo de dados desatualizados se a invalidação falhar
+            app.logger.warning(f'Falha ao invalidar cache do dashboard: {e}')
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('dashboard_cache_dirty', None)
@@ -0,0 +1,123 @@
+from sqlalchemy import func, case
+from datetime import datetime, timedelta
+from config import db
+from models import Sale, Product, Client, SaleDailyRollup
+
+# Métricas do dashboard calculadas com GROUP BY no banco de dados, a partir do
+# agregado diário sale_daily_rollup (ver services/sales_rollup.py), sem carregar
+# as vendas nem acessar sale.product/sale.client linha a linha.
+
+def sale_total_expr():
+    # Mesmo critério de Sale.get_total_value(): vendas financiadas usam total_amount
+    return func.coalesce(case((Sale.is_financed == True, Sale.total_amount), else_=Sale.total_price), 0)
+
+def unit_cost_expr():
+    # Equivalente SQL de Product.total_custos()
+    return func.coalesce(Product.custo1, 0) + func.coalesce(Product.custo2, 0) + \
+        func.coalesce(Product.custo3, 0) + func.coalesce(Product.custo4, 0) + \
+        func.coalesce(Product.custo5, 0)
+
+def period_bounds(period, date):
+    if period == 'daily':
+        start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_date = start_date + timedelta(days=1)
+    elif period == 'weekly':
+        start_date = date - timedelta(days=date.weekday())
+        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_date = start_date + timedelta(days=7)
+    elif period == 'yearly':
+        start_date = date.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        end_date = start_date.replace(year=start_date.year + 1)
+    else:  # monthly
+        start_date = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if start_date.month == 12:
+            end_date = start_date.replace(year=start_date.year + 1, month=1)
+        else:
+            end_date = start_date.replace(month=start_date.month + 1)
+    return start_date, end_date
+
+def _format_day(value):
+    # A coluna Date volta como date; linhas gravadas via SQL cru podem vir como texto
+    if isinstance(value, str):
+        return value
+    return value.strftime('%Y-%m-%d')
+
+def get_sales_by_date(start_date, end_date):
+    # Lido do agregado diário (sale_daily_rollup), não das vendas
+    rows = db.session.query(SaleDailyRollup.date, func.sum(SaleDailyRollup.revenue))\
+        .filter(SaleDailyRollup.date >= start_date.date())\
+        .filter(SaleDailyRollup.date < end_date.date())\
+        .group_by(SaleDailyRollup.date)\
+        .having(func.sum(SaleDailyRollup.count) > 0)\
+        .order_by(SaleDailyRollup.date)\
+        .all()
+    return [{'date': _format_day(d), 'total': round(total or 0)} for d, total in rows]
+
+def get_top_products(limit=5):
+    total_quantity = func.sum(SaleDailyRollup.quantity)
+    rows = db.session.query(Product.name, total_quantity, func.sum(SaleDailyRollup.revenue))\
+        .join(SaleDailyRollup, SaleDailyRollup.product_id == Product.id)\
+        .group_by(Product.id, Product.name)\
+        .having(func.sum(SaleDailyRollup.count) > 0)\
+        .order_by(total_quantity.desc())\
+        .limit(limit)\
+        .all()
+    return [{'name': name, 'total_quantity': quantity or 0, 'total_revenue': round(revenue or 0)}
+            for name, quantity, revenue in rows]
+
+def get_top_clients(limit=5):
+    total_spent = func.sum(SaleDailyRollup.revenue)
+    rows = db.session.query(Client.full_name, func.sum(SaleDailyRollup.count), total_spent)\
+        .join(SaleDailyRollup, SaleDailyRollup.client_id == Client.id)\
+        .group_by(Client.id, Client.full_name)\
+        .having(func.sum(SaleDailyRollup.count) > 0)\
+        .order_by(total_spent.desc())\
+        .limit(limit)\
+        .all()
+    return [{'full_name': name, 'total_purchases': purchases, 'total_spent': round(spent or 0)}
+            for name, purchases, spent in rows]
+
+def get_totals():
+    total_sales, total_revenue, total_custos = db.session.query(
+            func.sum(SaleDailyRollup.count),
+            func.sum(SaleDailyRollup.revenue),
+            func.sum(SaleDailyRollup.cost))\
+        .one()
+    return {
+        'total_sales': total_sales or 0,
+        'total_revenue': round(total_revenue or 0),
+        'total_custos': total_custos or 0,
+    }
+
+def get_low_stock_products(threshold=10):
+    # Product.stock é mantido pelas movimentações (services/stock.py), então
+    # basta ler o valor pelo índice parcial de estoque baixo
+    return db.session.query(Product.name, Product.stock)\
+        .filter(Product.stock < threshold)\
+        .order_by(Product.stock.asc())\
+        .all()
+
+def get_summary():
+    # Parte do dashboard que não depende do período filtrado; só tipos simples,
+    # para poder ser guardada no cache (services/dashboard_cache.py)
+    totals = get_totals()
+    # Cálculo do lucro (receita - custos)
+    lucro_total = round(totals['total_revenue'] - totals['total_custos'])
+
+    return {
+        'top_products': get_top_products(),
+        'low_stock_products': [{'name': p.name, 'stock': p.stock} for p in get_low_stock_products()],
+        'top_clients': get_top_clients(),
+        'total_sales': totals['total_sales'],
+        'total_revenue': totals['total_revenue'],
+        'total_clients': Client.query.count(),
+        'total_products': Product.query.count(),
+        'total_custos': totals['total_custos'],
+        'lucro_total': lucro_total,
+    }
+
+def compute_dashboard(period, date=None):
+    if date is None:
+        date = datetime.utcnow()
+    start_date, end_date = period_bounds(period, date)
+    return dict(get_summary(), sales_by_date=get_sales_by_date(start_date, end_date))
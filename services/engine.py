@@ -0,0 +1,110 @@
+from sqlalchemy import create_engine, event
+from config import app, db
+
+# Ajuste do engine do SQLAlchemy conforme o banco.
+#
+# SQLite: cada conexão nova recebe os PRAGMAs abaixo. WAL deixa leituras e
+# uma escrita acontecerem ao mesmo tempo (sem WAL, um commit bloqueia todos os
+# workers do gunicorn); synchronous=NORMAL é seguro com WAL e evita um fsync
+# por commit; busy_timeout faz a escrita concorrente esperar em vez de falhar
+# com "database is locked"; mmap_size lê o arquivo por memória mapeada.
+#
+# PostgreSQL: o engine é recriado com pool dimensionado para workers
+# síncronos (uma requisição por vez, mais as threads de exportação e
+# importação), pre_ping para descartar conexões derrubadas pelo servidor e
+# limites de tempo por comando e por transação ociosa.
+#
+# O limite por comando vale para as requisições web. Migrações, comandos de
+# manutenção (flask ... rebuild, importações, operações em lote) e scripts
+# como delete_user.py chamam disable_statement_timeout() antes de usar o banco.
+#
+# Tudo pode ser alterado pela configuração (SQLITE_PRAGMAS, DB_POOL_SIZE,
+# DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_STATEMENT_TIMEOUT_MS,
+# DB_IDLE_IN_TRANSACTION_TIMEOUT_MS) ou desligado com DB_TUNING = False.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+POSTGRES_POOL_SIZE = 3
+POSTGRES_MAX_OVERFLOW = 5
+POSTGRES_POOL_TIMEOUT = 10
+POSTGRES_POOL_RECYCLE = 1800
+STATEMENT_TIMEOUT_MS = 30000
+IDLE_IN_TRANSACTION_TIMEOUT_MS = 60000
+
+
+def sqlite_pragmas():
+    return dict(SQLITE_PRAGMAS, **app.config.get('SQLITE_PRAGMAS', {}))
+
+def postgres_options(statement_timeout=None):
+    if statement_timeout is None:
+        statement_timeout = app.config.get('DB_STATEMENT_TIMEOUT_MS', STATEMENT_TIMEOUT_MS)
+    idle_timeout = app.config.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', IDLE_IN_TRANSACTION_TIMEOUT_MS)
+    return {
+        'pool_size': app.config.get('DB_POOL_SIZE', POSTGRES_POOL_SIZE),
+        'max_overflow': app.config.get('DB_MAX_OVERFLOW', POSTGRES_MAX_OVERFLOW),
+        'pool_timeout': app.config.get('DB_POOL_TIMEOUT', POSTGRES_POOL_TIMEOUT),
+        'pool_recycle': app.config.get('DB_POOL_RECYCLE', POSTGRES_POOL_RECYCLE),
+        'pool_pre_ping': True,
+        'connect_args': {
+            'connect_timeout': 10,
+            'application_name': 'gestao',
+            'options': f'-c statement_timeout={statement_timeout} '
+                       f'-c idle_in_transaction_session_timeout={idle_timeout}',
+        },
+    }
+
+def tune_sqlite(engine):
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    return engine
+
+def tuned_engine(url):
+    # Engine avulso com o mesmo ajuste da aplicação (usado pelo bench_engine.py)
+    if url.get_backend_name() == 'postgresql':
+        return create_engine(url, **postgres_options())
+    engine = create_engine(url)
+    return tune_sqlite(engine) if url.get_backend_name() == 'sqlite' else engine
+
+def _replace_engine(engine, options):
+    options = dict(options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    options.setdefault('echo', app.config.get('SQLALCHEMY_ECHO', False))
+    db.engines[None] = create_engine(engine.url, **options)
+    engine.dispose()
+
+def configure_engine():
+    if not app.config.get('DB_TUNING', True):
+        return
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'postgresql':
+            # O Flask-SQLAlchemy cria o engine em init_app; o pool só pode ser
+            # dimensionado criando outro. A sessão procura o engine em
+            # db.engines a cada uso, então a troca vale para tudo.
+            _replace_engine(engine, postgres_options())
+        elif engine.dialect.name == 'sqlite':
+            tune_sqlite(engine)
+            # Conexões abertas antes do ajuste não passaram pelo evento
+            engine.dispose()
+
+def disable_statement_timeout():
+    # Processos de manutenção podem levar mais que o limite das requisições:
+    # o engine é recriado sem statement_timeout (só no PostgreSQL, o único que
+    # tem o limite)
+    if not app.config.get('DB_TUNING', True):
+        return
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'postgresql':
+            _replace_engine(engine, postgres_options(statement_timeout=0))
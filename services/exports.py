@@ -0,0 +1,312 @@
+import csv
+import io
+import json
+from importlib.util import find_spec
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+from flask import Response, send_file, stream_with_context, flash, redirect, url_for
+from flask_login import current_user
+from config import app, db
+from models import Sale, Client
+from services.sales_query import filtered_sales_query
+from services.search import normalize
+
+# Exportação de vendas e clientes gerada no servidor, lendo o banco em lotes
+# (yield_per) para manter a memória constante. Exportações grandes rodam em
+# segundo plano e ficam disponíveis para download em instance/exports, por
+# EXPORT_MAX_AGE segundos (removidas ao iniciar uma nova exportação ou por
+# flask exports purge).
+
+BATCH_SIZE = 1000
+ASYNC_THRESHOLD = 20000
+EXPORT_MAX_AGE = 24 * 60 * 60
+FORMATS = ('csv', 'xlsx', 'pdf')
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+STATUS_LABELS = {
+    'negotiating': 'Em Negociação',
+    'pending': 'Pendente',
+    'completed': 'Finalizada',
+    'cancelled': 'Cancelada',
+}
+
+def _money(value):
+    return round(value) if value is not None else None
+
+SALES_COLUMNS = [
+    ('ID', lambda s: s.id),
+    ('Cliente', lambda s: s.client.full_name),
+    ('Produto', lambda s: s.product.name),
+    ('Quantidade', lambda s: s.quantity),
+    ('Preço Original', lambda s: _money(s.original_price)),
+    ('Desconto (%)', lambda s: s.discount_percentage),
+    ('Preço Final', lambda s: _money(s.total_price)),
+    ('Financiado', lambda s: 'Sim' if s.is_financed else 'Não'),
+    ('Valor Financiado', lambda s: _money(s.total_financed) if s.is_financed else None),
+    ('Parcela Mensal', lambda s: _money(s.monthly_payment) if s.is_financed else None),
+    ('Status', lambda s: STATUS_LABELS.get(s.status, s.status)),
+    ('Vendedor', lambda s: s.seller.username if s.seller else None),
+    ('Data', lambda s: s.sale_date.strftime('%d/%m/%Y') if s.sale_date else None),
+]
+
+CLIENT_COLUMNS = [
+    ('Nome', lambda c: c.full_name),
+    ('Endereço', lambda c: c.japan_address),
+    ('Telefone', lambda c: c.japan_phone),
+    ('ID', lambda c: c.japan_id),
+    ('Email', lambda c: c.email),
+]
+
+def parse_client_filters(args):
+    # Mesmos filtros da página de clientes (filterClients)
+    return {
+        'name': (args.get('name') or '').strip(),
+        'address': (args.get('address') or '').strip(),
+        'phone': (args.get('phone') or '').strip(),
+    }
+
+CLIENT_FILTER_COLUMNS = {'name': Client.full_name, 'address': Client.japan_address, 'phone': Client.japan_phone}
+
+def filtered_clients_query(filters):
+    # Sem acentos e sem diferenciar maiúsculas, como o normalizeText() da
+    # página: o SQLite não remove acentos (e o lower() dele só trata ASCII),
+    # então a comparação é feita em Python e a consulta filtra pelos ids
+    terms = {field: normalize(filters[field]) for field in CLIENT_FILTER_COLUMNS if filters[field]}
+    query = Client.query
+    if not terms:
+        return query
+    rows = db.session.query(Client.id, *(CLIENT_FILTER_COLUMNS[field] for field in terms)).yield_per(BATCH_SIZE)
+    ids = [row[0] for row in rows
+           if all(term in normalize(value) for term, value in zip(terms.values(), row[1:]))]
+    return query.filter(Client.id.in_(ids))
+
+def export_query(kind, filters):
+    if kind == 'sales':
+        query = filtered_sales_query(filters).order_by(Sale.sale_date.desc(), Sale.id.desc())
+        return query, SALES_COLUMNS
+    query = filtered_clients_query(filters).order_by(Client.full_name, Client.id)
+    return query, CLIENT_COLUMNS
+
+def available(fmt):
+    # openpyxl e reportlab só são importados na primeira exportação nesses
+    # formatos; aqui basta saber se estão instalados
+    if fmt == 'xlsx':
+        return find_spec('openpyxl') is not None
+    if fmt == 'pdf':
+        return find_spec('reportlab') is not None
+    return fmt == 'csv'
+
+def iter_rows(query, columns):
+    for obj in query.yield_per(BATCH_SIZE):
+        yield [getter(obj) for _, getter in columns]
+
+def iter_csv(query, columns):
+    # Gera o CSV linha a linha, com BOM para o Excel reconhecer UTF-8
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _ in columns])
+    for row in iter_rows(query, columns):
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def write_csv(query, columns, fileobj):
+    for chunk in iter_csv(query, columns):
+        fileobj.write(chunk.encode('utf-8'))
+
+def write_xlsx(query, columns, fileobj, title):
+    from openpyxl import Workbook
+    # Modo write-only: as linhas vão direto para o arquivo, sem manter a planilha na memória
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append([header for header, _ in columns])
+    for row in iter_rows(query, columns):
+        sheet.append(row)
+    workbook.save(fileobj)
+
+# Helvetica só tem caracteres latinos; textos com outros caracteres (endereços
+# e nomes em japonês) usam uma fonte CID japonesa, que o leitor de PDF já traz
+PDF_CJK_FONT = 'HeiseiKakuGo-W5'
+
+def _pdf_font(text, font):
+    try:
+        text.encode('latin-1')
+        return font
+    except UnicodeEncodeError:
+        return PDF_CJK_FONT
+
+def write_pdf(query, columns, fileobj, title):
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.pdfgen import canvas
+    pdfmetrics.registerFont(UnicodeCIDFont(PDF_CJK_FONT))
+    page_width, page_height = landscape(A4)
+    margin = 20
+    row_height = 11
+    font_size = 7
+    col_width = (page_width - 2 * margin) / len(columns)
+
+    pdf = canvas.Canvas(fileobj, pagesize=(page_width, page_height))
+
+    def draw_cell(x, y, text, font):
+        # Corta pela largura: caracteres japoneses ocupam o dobro dos latinos
+        font = _pdf_font(text, font)
+        while text and pdfmetrics.stringWidth(text, font, font_size) > col_width - 2:
+            text = text[:-1]
+        pdf.setFont(font, font_size)
+        pdf.drawString(x, y, text)
+
+    def start_page():
+        pdf.setFont('Helvetica-Bold', 10)
+        pdf.drawString(margin, page_height - margin, title)
+        y = page_height - margin - 2 * row_height
+        for i, (header, _) in enumerate(columns):
+            draw_cell(margin + i * col_width, y, header, 'Helvetica-Bold')
+        return y - row_height
+
+    y = start_page()
+    for row in iter_rows(query, columns):
+        if y < margin:
+            pdf.showPage()
+            y = start_page()
+        for i, value in enumerate(row):
+            draw_cell(margin + i * col_width, y, '' if value is None else str(value), 'Helvetica')
+        y -= row_height
+    pdf.save()
+
+def write_export(kind, fmt, filters, fileobj):
+    query, columns = export_query(kind, filters)
+    title = 'Vendas' if kind == 'sales' else 'Clientes'
+    if fmt == 'csv':
+        write_csv(query, columns, fileobj)
+    elif fmt == 'xlsx':
+        write_xlsx(query, columns, fileobj, title)
+    else:
+        write_pdf(query, columns, fileobj, f'Relatório de {title}')
+
+def export_filename(kind, fmt):
+    return f'{"vendas" if kind == "sales" else "clientes"}.{fmt}'
+
+def should_run_async(kind, filters):
+    query, _ = export_query(kind, filters)
+    threshold = app.config.get('EXPORT_ASYNC_THRESHOLD', ASYNC_THRESHOLD)
+    return query.order_by(None).count() > threshold
+
+
+# Tarefas em segundo plano. O estado fica em arquivos JSON para ser visível
+# por todos os workers do gunicorn.
+
+def _exports_dir():
+    path = app.config.get('EXPORTS_PATH', os.path.join(app.instance_path, 'exports'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _job_meta_path(job_id):
+    return os.path.join(_exports_dir(), f'{job_id}.json')
+
+def _save_job(job):
+    path = _job_meta_path(job['id'])
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(temp_path, path)
+
+def get_job(job_id):
+    try:
+        uuid.UUID(job_id)
+        with open(_job_meta_path(job_id)) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+def job_file_path(job):
+    return os.path.join(_exports_dir(), f'{job["id"]}.{job["format"]}')
+
+def purge_jobs(max_age=None):
+    # Remove as exportações (arquivo e estado) criadas há mais de max_age segundos
+    if max_age is None:
+        max_age = app.config.get('EXPORT_MAX_AGE', EXPORT_MAX_AGE)
+    path = _exports_dir()
+    cutoff = datetime.utcnow().timestamp() - max_age
+    removed = 0
+    for filename in os.listdir(path):
+        file_path = os.path.join(path, filename)
+        try:
+            if os.path.getmtime(file_path) < cutoff:
+                os.remove(file_path)
+                removed += filename.endswith('.json')
+        except FileNotFoundError:
+            # Outro worker removeu ao mesmo tempo
+            pass
+    return removed
+
+def _run_job(job, filters):
+    with app.app_context():
+        try:
+            with open(job_file_path(job), 'wb') as f:
+                write_export(job['kind'], job['format'], filters, f)
+            job['status'] = 'done'
+        except Exception as e:
+            app.logger.error(f'Erro na exportação {job["id"]}: {e}')
+            job['status'] = 'error'
+        finally:
+            job['finished_at'] = datetime.utcnow().isoformat()
+            db.session.remove()
+        _save_job(job)
+
+def start_job(kind, fmt, filters, user_id):
+    try:
+        purge_jobs()
+    except OSError as e:
+        app.logger.warning(f'Falha ao remover exportações antigas: {e}')
+    job = {
+        'id': uuid.uuid4().hex,
+        'kind': kind,
+        'format': fmt,
+        'user_id': user_id,
+        'filename': export_filename(kind, fmt),
+        'status': 'running',
+        'created_at': datetime.utcnow().isoformat(),
+    }
+    _save_job(job)
+    threading.Thread(target=_run_job, args=(job, filters), daemon=True).start()
+    return job
+
+def send_export(kind, fmt, filters):
+    # Exportação síncrona: CSV é transmitido enquanto é gerado; Excel e PDF
+    # são gravados num arquivo temporário e enviados em seguida
+    if fmt == 'csv':
+        query, columns = export_query(kind, filters)
+        response = Response(stream_with_context(iter_csv(query, columns)), mimetype=MIMETYPES['csv'])
+        response.headers['Content-Disposition'] = f'attachment; filename={export_filename(kind, fmt)}'
+        return response
+
+    temp = tempfile.TemporaryFile()
+    write_export(kind, fmt, filters, temp)
+    temp.seek(0)
+    return send_file(temp, mimetype=MIMETYPES[fmt], as_attachment=True,
+                     download_name=export_filename(kind, fmt))
+
+def export_response(kind, fmt, filters, back_endpoint):
+    if fmt not in FORMATS or not available(fmt):
+        flash('Formato de exportação indisponível.', 'danger')
+        return redirect(url_for(back_endpoint))
+
+    if should_run_async(kind, filters):
+        job = start_job(kind, fmt, filters, current_user.id)
+        flash('A exportação é grande e está sendo gerada em segundo plano.', 'info')
+        return redirect(url_for('exports.job_status', job_id=job['id']))
+
+    return send_export(kind, fmt, filters)
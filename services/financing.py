@@ -0,0 +1,373 @@
+from datetime import datetime, date
+from sqlalchemy import func, insert
+from config import db
+from models import Sale, SaleInstallment, CashFlowMonthly
+from services.dashboard_cache import get_cache, cash_flow_key, mark_cash_flow_dirty
+
+# Financiamento pela tabela Price. Todos os cálculos trabalham com arrays do
+# NumPy (uma linha por venda), então gerar as parcelas ou simular outra taxa
+# para a carteira inteira é uma única operação vetorizada, sem laço por venda.
+# O NumPy é importado por _np(), no primeiro cálculo, e não na inicialização
+# de cada worker.
+#
+# Arredondamento: a parcela mensal é arredondada para o iene inteiro e a última
+# parcela quita o saldo restante (com os juros do mês, arredondada para cima),
+# absorvendo a diferença do arredondamento. O total financiado gravado na venda
+# é a soma das parcelas (financed_totals) e é ele que manda: as parcelas
+# gravadas em sale_installment sempre somam sale.total_financed.
+#
+# sale_installment guarda as parcelas das vendas financiadas não canceladas e
+# cash_flow_monthly a soma delas por mês de vencimento; as duas tabelas são
+# alteradas juntas, então a previsão de recebimentos nunca varre as vendas.
+
+BATCH_SIZE = 5000
+# Maior prazo de financiamento (10 anos) em meses
+MAX_FORECAST_MONTHS = 120
+
+
+def _np():
+    # NumPy só no primeiro cálculo (ver acima)
+    import numpy
+    return numpy
+
+def monthly_rates(annual_rates):
+    # Taxa anual em % (como no formulário) para taxa mensal decimal
+    np = _np()
+    return np.asarray(annual_rates, dtype=float) / 100 / 12
+
+def monthly_payments(principals, annual_rates, years):
+    np = _np()
+    principals = np.asarray(principals, dtype=float)
+    rates = monthly_rates(annual_rates)
+    n = np.asarray(years, dtype=int) * 12
+    growth = (1 + rates) ** n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payments = np.where(rates > 0, principals * rates * growth / (growth - 1), principals / n)
+    return np.round(payments)
+
+def last_payments(principals, annual_rates, years, payments):
+    # Valor da última parcela: saldo após as n-1 parcelas fixas mais os juros do mês
+    np = _np()
+    principals = np.asarray(principals, dtype=float)
+    rates = monthly_rates(annual_rates)
+    n = np.asarray(years, dtype=int) * 12
+    growth = (1 + rates) ** (n - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(rates > 0, (growth - 1) / rates, n - 1)
+    remaining = principals * growth - np.asarray(payments, dtype=float) * annuity
+    # Para cima, para que a última parcela nunca fique abaixo do saldo devedor
+    return np.ceil(np.round(remaining * (1 + rates), 6))
+
+def financed_totals(principals, annual_rates, years, payments):
+    # Total financiado = soma das parcelas (n-1 parcelas fixas mais a última)
+    np = _np()
+    n = np.asarray(years, dtype=int) * 12
+    return np.asarray(payments, dtype=float) * (n - 1) + last_payments(principals, annual_rates, years, payments)
+
+def payment_terms(principal, annual_rate, years):
+    # Parcela mensal e total financiado de uma venda
+    payment = float(monthly_payments([principal], [annual_rate], [years])[0])
+    return payment, float(financed_totals([principal], [annual_rate], [years], [payment])[0])
+
+def amortization_schedules(principals, annual_rates, years, payments=None, totals=None):
+    # Cronogramas de todas as vendas de uma vez: matrizes (vendas x parcelas),
+    # com 'active' marcando as parcelas que existem para cada venda. totals é
+    # o total financiado gravado em cada venda: a última parcela fecha nele.
+    np = _np()
+    principals = np.asarray(principals, dtype=float)
+    rates = monthly_rates(annual_rates)[:, None]
+    n = np.asarray(years, dtype=int) * 12
+    if payments is None:
+        payments = monthly_payments(principals, annual_rates, years)
+    payments = np.asarray(payments, dtype=float)
+    if totals is None:
+        totals = financed_totals(principals, annual_rates, years, payments)
+    last_amount = (np.asarray(totals, dtype=float) - payments * (n - 1))[:, None]
+    payments = payments[:, None]
+
+    number = np.arange(1, n.max() + 1 if len(n) else 1)
+    growth = (1 + rates) ** number
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(rates > 0, (growth - 1) / rates, number)
+    balance = principals[:, None] * growth - payments * annuity
+    previous = np.concatenate([principals[:, None], balance[:, :-1]], axis=1)
+    interest = previous * rates
+    principal = payments - interest
+
+    last = number == n[:, None]
+    principal = np.where(last, previous, principal)
+    interest = np.where(last, last_amount - previous, interest)
+    balance = np.where(last, 0.0, balance)
+    return {
+        'number': number,
+        'principal': principal,
+        'interest': interest,
+        'balance': balance,
+        'active': number <= n[:, None],
+    }
+
+def due_dates(sale_dates, count):
+    # Vencimento mensal no mesmo dia da venda (ou no último dia do mês, se ele for menor)
+    np = _np()
+    start = np.array([_as_date(d) for d in sale_dates], dtype='datetime64[D]')
+    first_month = start.astype('datetime64[M]')
+    day_offset = start - first_month.astype('datetime64[D]')
+    months = first_month[:, None] + np.arange(1, count + 1)
+    month_start = months.astype('datetime64[D]')
+    month_length = (months + 1).astype('datetime64[D]') - month_start
+    return month_start + np.minimum(day_offset[:, None], month_length - np.timedelta64(1, 'D'))
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value or date.today()
+
+
+# Persistência das parcelas
+
+def _installment_rows(sale_ids, sale_dates, principals, annual_rates, years, payments, totals):
+    # totals sem valor (vendas antigas) usam o total calculado
+    np = _np()
+    totals = np.array([np.nan if total is None else total for total in totals], dtype=float)
+    computed = financed_totals(principals, annual_rates, years, payments)
+    schedules = amortization_schedules(principals, annual_rates, years, payments,
+                                       np.where(np.isnan(totals), computed, totals))
+    dates = due_dates(sale_dates, len(schedules['number']))
+    rows, cols = np.nonzero(schedules['active'])
+    sale_ids = np.asarray(sale_ids)[rows]
+    return [
+        _installment_row(sale_id, col, due, principal, interest, balance)
+        for sale_id, col, due, principal, interest, balance in zip(
+            sale_ids, cols, dates[rows, cols],
+            schedules['principal'][rows, cols],
+            schedules['interest'][rows, cols],
+            schedules['balance'][rows, cols])
+    ]
+
+def _installment_row(sale_id, col, due, principal, interest, balance):
+    # Os juros são o valor da parcela menos o principal já arredondado, para que
+    # principal + juros seja exatamente o valor da parcela
+    amount = round(float(principal + interest), 2)
+    principal = round(float(principal), 2)
+    return {
+        'sale_id': int(sale_id),
+        'number': int(col + 1),
+        'due_date': due.item(),
+        'principal': principal,
+        'interest': round(amount - principal, 2),
+        'balance': round(float(balance), 2),
+    }
+
+def _is_financed(sale):
+    return bool(sale.is_financed and sale.financing_years and sale.interest_rate is not None
+                and sale.monthly_payment and sale.status != 'cancelled')
+
+def _monthly_totals(rows):
+    # Agrupa parcelas por mês de vencimento: {mês: [parcelas, principal, juros]}
+    totals = {}
+    for row in rows:
+        month = row['due_date'].replace(day=1)
+        entry = totals.setdefault(month, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += row['principal']
+        entry[2] += row['interest']
+    return totals
+
+def _apply_monthly(totals, sign):
+    if not totals:
+        return
+    mark_cash_flow_dirty()
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Upsert atômico, como no rollup de vendas
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        table = CashFlowMonthly.__table__
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['month'],
+            set_={field: table.c[field] + stmt.excluded[field]
+                  for field in ('installments', 'principal', 'interest')}
+        )
+        db.session.execute(stmt, [
+            {'month': month, 'installments': sign * count,
+             'principal': sign * principal, 'interest': sign * interest}
+            for month, (count, principal, interest) in totals.items()
+        ])
+        return
+
+    for month, (count, principal, interest) in totals.items():
+        row = CashFlowMonthly.query.filter_by(month=month).with_for_update().first()
+        if row is None:
+            row = CashFlowMonthly(month=month, installments=0, principal=0, interest=0)
+            db.session.add(row)
+        row.installments += sign * count
+        row.principal += sign * principal
+        row.interest += sign * interest
+
+def save_installments(sale):
+    # Regrava as parcelas de uma venda; chamado ao criar ou editar a venda
+    return replace_installments([sale])
+
+def replace_installments(sales):
+    # Regrava as parcelas de várias vendas de uma vez (edição em lote)
+    delete_installments([sale.id for sale in sales])
+    financed = [sale for sale in sales if _is_financed(sale)]
+    if not financed:
+        return 0
+    rows = _installment_rows(*zip(*[
+        (sale.id, sale.sale_date, sale.total_price, sale.interest_rate, sale.financing_years,
+         sale.monthly_payment, sale.total_financed)
+        for sale in financed
+    ]))
+    db.session.execute(insert(SaleInstallment), rows)
+    _apply_monthly(_monthly_totals(rows), 1)
+    return len(rows)
+
+def delete_installments(sale_ids):
+    # Remove as parcelas (venda cancelada ou excluída) e desconta do agregado mensal
+    sale_ids = list(sale_ids)
+    if not sale_ids:
+        return
+    query = SaleInstallment.query.filter(SaleInstallment.sale_id.in_(sale_ids))
+    rows = [
+        {'due_date': due_date, 'principal': principal, 'interest': interest}
+        for due_date, principal, interest in query.with_entities(
+            SaleInstallment.due_date, SaleInstallment.principal, SaleInstallment.interest)
+    ]
+    if rows:
+        query.delete(synchronize_session=False)
+        _apply_monthly(_monthly_totals(rows), -1)
+
+def financed_sales_query():
+    return db.session.query(Sale.id, Sale.sale_date, Sale.total_price, Sale.interest_rate,
+                            Sale.financing_years, Sale.monthly_payment, Sale.total_financed)\
+        .filter(Sale.is_financed == True, Sale.financing_years > 0,
+                Sale.interest_rate.isnot(None), Sale.monthly_payment.isnot(None))
+
+def rebuild():
+    # Regera as parcelas de todas as vendas financiadas e o agregado mensal, em lotes
+    db.session.execute(SaleInstallment.__table__.delete())
+    db.session.execute(CashFlowMonthly.__table__.delete())
+    totals = {}
+    count = 0
+    batch = []
+    query = financed_sales_query().filter(Sale.status != 'cancelled').order_by(Sale.id)
+    for sale in query.yield_per(BATCH_SIZE):
+        batch.append(sale)
+        if len(batch) == BATCH_SIZE:
+            count += _insert_batch(batch, totals)
+            batch = []
+    if batch:
+        count += _insert_batch(batch, totals)
+    if totals:
+        db.session.execute(insert(CashFlowMonthly), [
+            {'month': month, 'installments': n, 'principal': principal, 'interest': interest}
+            for month, (n, principal, interest) in totals.items()
+        ])
+    db.session.commit()
+    get_cache().clear()
+    return count
+
+def _insert_batch(sales, totals):
+    rows = _installment_rows(*zip(*sales))
+    db.session.execute(insert(SaleInstallment), rows)
+    for month, (n, principal, interest) in _monthly_totals(rows).items():
+        entry = totals.setdefault(month, [0, 0.0, 0.0])
+        entry[0] += n
+        entry[1] += principal
+        entry[2] += interest
+    return len(rows)
+
+
+# Consultas sobre a carteira de vendas financiadas (só há parcelas de vendas não canceladas)
+
+def receivables(as_of=None):
+    # Valores ainda a receber: parcelas com vencimento a partir de as_of
+    count, principal, interest = db.session.query(
+            func.count(),
+            func.coalesce(func.sum(SaleInstallment.principal), 0),
+            func.coalesce(func.sum(SaleInstallment.interest), 0))\
+        .filter(SaleInstallment.due_date >= _as_date(as_of)).one()
+    return {
+        'installments': count,
+        'principal': float(principal),
+        'interest': float(interest),
+        'total': float(principal + interest),
+    }
+
+def monthly_projection(months=12, start=None):
+    # Principal e juros a receber por mês, a partir do mês de start, lidos do
+    # agregado mensal (uma linha por mês, qualquer que seja o número de vendas)
+    np = _np()
+    first_month = _as_date(start).replace(day=1)
+    months_index = np.datetime64(first_month, 'M') + np.arange(months)
+    end = (months_index[-1] + 1).astype('datetime64[D]').item() if months else first_month
+    rows = {
+        row.month: row for row in CashFlowMonthly.query
+        .filter(CashFlowMonthly.month >= first_month, CashFlowMonthly.month < end)
+    }
+    projection = []
+    for month in months_index.astype('datetime64[D]'):
+        row = rows.get(month.item())
+        principal = round(row.principal, 2) if row else 0.0
+        interest = round(row.interest, 2) if row else 0.0
+        projection.append({
+            'month': str(month)[:7],
+            'installments': row.installments if row else 0,
+            'principal': principal,
+            'interest': interest,
+            'total': round(principal + interest, 2),
+        })
+    return projection
+
+def cash_flow_forecast(months=12):
+    # Previsão dos próximos meses a partir do mês atual, com cache até uma
+    # parcela ser gravada ou removida (mark_cash_flow_dirty). 'outstanding'
+    # soma todos os meses do mês atual em diante.
+    months = max(1, min(int(months), MAX_FORECAST_MONTHS))
+    today = datetime.utcnow()
+    cache = get_cache()
+    key = cash_flow_key(today)
+    projection = cache.get(key)
+    if projection is None:
+        projection = monthly_projection(MAX_FORECAST_MONTHS, today)
+        cache.set(key, projection)
+    outstanding = {
+        field: round(sum(month[field] for month in projection), 2)
+        for field in ('installments', 'principal', 'interest', 'total')
+    }
+    return {'months': projection[:months], 'outstanding': outstanding}
+
+def simulate_rate(annual_rate=None, rate_delta=0.0):
+    # Simulação "e se": recalcula as parcelas da carteira com outra taxa anual
+    # (fixa, ou a taxa atual de cada venda mais rate_delta pontos percentuais)
+    np = _np()
+    rows = financed_sales_query().filter(Sale.status != 'cancelled').all()
+    if not rows:
+        empty = _book_totals([], [], [], [])
+        return {'sales': 0, 'current': empty, 'simulated': empty}
+    _, _, principals, rates, years, payments, _ = (np.array(column) for column in zip(*rows))
+    principals = principals.astype(float)
+    rates = rates.astype(float)
+    years = years.astype(int)
+    new_rates = np.full(len(rows), float(annual_rate)) if annual_rate is not None else rates + rate_delta
+    new_rates = np.maximum(new_rates, 0)
+    new_payments = monthly_payments(principals, new_rates, years)
+    return {
+        'sales': len(rows),
+        'current': _book_totals(principals, rates, years, payments.astype(float)),
+        'simulated': _book_totals(principals, new_rates, years, new_payments),
+    }
+
+def _book_totals(principals, annual_rates, years, payments):
+    np = _np()
+    principals = np.asarray(principals, dtype=float)
+    total = financed_totals(principals, annual_rates, years, payments)
+    return {
+        'monthly_payments': float(np.sum(payments)),
+        'total': float(total.sum()),
+        'interest': float((total - principals).sum()),
+    }
@@ -0,0 +1,124 @@
+import hashlib
+from io import BytesIO
+from flask import request, send_file, current_app
+from sqlalchemy.orm import defer
+from config import db
+from models import ProductImage, ClientImage
+from services.blob_store import get_blob_store
+from services import thumbnails
+
+# Imagens de produtos e clientes ficam no armazenamento em disco (services/blob_store.py),
+# endereçadas pelo hash SHA-256 em content_hash; image_data só é usado por imagens
+# antigas ainda não migradas.
+# Entrega com cache HTTP: ETag pelo hash do conteúdo e cache longo. O conteúdo de
+# uma imagem nunca muda para o mesmo id (só é possível excluir), então o navegador
+# pode guardar a resposta indefinidamente.
+
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+# Arquivos usados por um upload há menos que isto não são apagados (ver services/blob_store.py)
+DELETE_GRACE = 60 * 60
+
+def _delete_grace():
+    return current_app.config.get('IMAGE_DELETE_GRACE', DELETE_GRACE)
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def store_upload(file_storage):
+    # Grava o upload no armazenamento e devolve o hash, usado como content_hash.
+    # As miniaturas são geradas em segundo plano.
+    digest = get_blob_store().put_file(file_storage.stream)
+    thumbnails.schedule(digest)
+    return digest
+
+def release_image(digest):
+    # Remove o arquivo quando nenhuma imagem (de produto ou cliente) o referencia mais.
+    # Um upload recente do mesmo conteúdo, ainda sem linha confirmada no banco,
+    # mantém o arquivo; se ele não for usado, o `flask images gc` o remove depois.
+    if not digest:
+        return
+    if ProductImage.query.filter_by(content_hash=digest).count() or \
+       ClientImage.query.filter_by(content_hash=digest).count():
+        return
+    get_blob_store().delete_unused(digest, _delete_grace())
+
+def collect_garbage():
+    # Remove arquivos órfãos (ex.: produto excluído em cascata, upload com erro no commit)
+    referenced = {digest for (digest,) in db.session.query(ProductImage.content_hash).distinct()}
+    referenced.update(digest for (digest,) in db.session.query(ClientImage.content_hash).distinct())
+    store = get_blob_store()
+    grace = _delete_grace()
+    removed = 0
+    for digest in list(store.digests()):
+        if digest not in referenced:
+            removed += store.delete_unused(digest, grace)
+    return removed
+
+def _cache_headers(response, image, etag):
+    response.set_etag(etag)
+    if image.created_at:
+        response.last_modified = image.created_at
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+def image_response(image_cls, image_id):
+    # Carrega só os metadados; a coluna image_data fica adiada
+    image = image_cls.query.options(defer(image_cls.image_data)).get_or_404(image_id)
+
+    if image.content_hash is None:
+        # Imagem antiga, gravada antes da coluna content_hash
+        image.content_hash = content_hash(image.image_data)
+        db.session.commit()
+
+    # ?size=256|768 devolve a miniatura, em WebP quando o navegador aceita
+    size = request.args.get('size', type=int)
+    variant_path = None
+    if size in thumbnails.SIZES:
+        fmt = thumbnails.negotiate_format(request.accept_mimetypes)
+        # Normalmente já foi gerada após o upload; se não, é gerada agora, uma única vez.
+        # Se o Pillow falhar, serve o original.
+        try:
+            variant_path = thumbnails.generate(image.content_hash, size, fmt)
+        except Exception as e:
+            current_app.logger.warning(f'Erro ao gerar miniatura {size}/{fmt} de {image.content_hash}: {e}')
+            thumbnails.mark_failed(image.content_hash, size, fmt)
+
+    if variant_path:
+        etag = f'{image.content_hash}-{thumbnails.derivative_name(size, fmt)}'
+    else:
+        etag = image.content_hash
+
+    if request.if_none_match.contains(etag):
+        # O navegador já tem esta versão: responde 304 sem ler o BLOB
+        response = _cache_headers(current_app.response_class(status=304), image, etag)
+    else:
+        store = get_blob_store()
+        if variant_path:
+            response = send_file(
+                variant_path,
+                mimetype=f'image/{fmt}',
+                conditional=False,
+                max_age=CACHE_MAX_AGE
+            )
+        elif store.exists(image.content_hash):
+            # Arquivo em disco: o servidor pode usar sendfile, sem passar o conteúdo pelo Python
+            response = send_file(
+                store.path(image.content_hash),
+                mimetype=image.mime_type,
+                conditional=False,
+                max_age=CACHE_MAX_AGE
+            )
+        else:
+            response = send_file(
+                BytesIO(image.image_data),
+                mimetype=image.mime_type,
+                conditional=False,
+                max_age=CACHE_MAX_AGE
+            )
+        response = _cache_headers(response, image, etag)
+
+    if size is not None:
+        response.vary.add('Accept')
+    return response
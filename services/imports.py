@@ -0,0 +1,328 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, date
+from importlib.util import find_spec
+from sqlalchemy import or_
+from werkzeug.datastructures import MultiDict
+from config import app, db
+from models import Client, Product, Category, InventoryMovement
+from services.dashboard_cache import mark_dirty
+from services.search import index_documents
+
+# Importação em massa de produtos e clientes a partir de CSV ou XLSX. O arquivo
+# é lido linha a linha; cada lote de BATCH_SIZE linhas é validado com os mesmos
+# formulários WTForms do cadastro, checado contra duplicados com uma única
+# consulta e gravado com bulk_insert_mappings. As linhas rejeitadas vão para
+# um relatório CSV (linha, campo, mensagem).
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'xlsx')
+
+# Cabeçalhos aceitos (os mesmos da exportação) e nome do campo correspondente
+CLIENT_HEADERS = {
+    'nome': 'full_name',
+    'endereço': 'japan_address',
+    'telefone': 'japan_phone',
+    'id': 'japan_id',
+    'email': 'email',
+}
+
+PRODUCT_HEADERS = {
+    'nome': 'name',
+    'descrição': 'description',
+    'categoria': 'category',
+    'preço': 'price',
+    'estoque': 'stock',
+    'data de entrada': 'data_entrada',
+    'custo 1': 'custo1',
+    'custo 2': 'custo2',
+    'custo 3': 'custo3',
+    'custo 4': 'custo4',
+    'custo 5': 'custo5',
+}
+
+# Valores usados quando a coluna não existe no arquivo
+PRODUCT_DEFAULTS = {
+    'custo1': '0', 'custo2': '0', 'custo3': '0', 'custo4': '0', 'custo5': '0',
+}
+
+
+# Leitura
+
+def _field_names(header, mapping):
+    fields = set(mapping.values())
+    names = []
+    for title in header:
+        title = str(title or '').strip().lower()
+        names.append(mapping.get(title, title if title in fields else None))
+    return names
+
+def _as_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def read_rows(fileobj, fmt, mapping):
+    # Gera (número da linha, {campo: texto}) sem carregar o arquivo inteiro
+    if fmt == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+    else:
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+        first_line = text.readline()
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+        rows = csv.reader(_chain_line(first_line, text), delimiter=delimiter)
+    try:
+        header = next(rows)
+    except StopIteration:
+        return
+    names = _field_names(header, mapping)
+    for number, values in enumerate(rows, start=2):
+        if not any(_as_text(value) for value in values):
+            continue
+        yield number, {name: _as_text(value) for name, value in zip(names, values) if name}
+
+def _chain_line(first_line, text):
+    yield first_line
+    yield from text
+
+
+# Validação e gravação
+
+def _form_errors(form):
+    return [(field, message) for field, messages in form.errors.items() for message in messages]
+
+def _validate_client(row):
+    from forms import ClientForm
+    form = ClientForm(formdata=MultiDict(row), meta={'csrf': False})
+    if not form.validate():
+        return None, _form_errors(form)
+    return {
+        'full_name': form.full_name.data,
+        'japan_address': form.japan_address.data,
+        'japan_phone': form.japan_phone.data,
+        'japan_id': form.japan_id.data,
+        'email': form.email.data,
+    }, []
+
+def _validate_product(row, categories):
+    from routes.products import ProductForm
+    data = dict(PRODUCT_DEFAULTS)
+    data.update({key: value for key, value in row.items() if value != '' or key not in data})
+    if not data.get('data_entrada'):
+        data['data_entrada'] = date.today().strftime('%Y-%m-%d')
+    form = ProductForm(formdata=MultiDict(data), meta={'csrf': False})
+    # A categoria vem pelo nome; evita uma consulta de categorias por linha
+    del form['category']
+    errors = [] if form.validate() else _form_errors(form)
+    category_id = None
+    if data.get('category'):
+        category_id = categories.get(data['category'].lower())
+        if category_id is None:
+            errors.append(('category', f'Categoria "{data["category"]}" não encontrada.'))
+    if errors:
+        return None, errors
+    return {
+        'name': form.name.data,
+        'description': form.description.data,
+        'price': form.price.data,
+        'stock': form.stock.data,
+        'is_active': form.stock.data > 0,
+        'data_entrada': datetime.combine(form.data_entrada.data, datetime.min.time()),
+        'custo1': form.custo1.data,
+        'custo2': form.custo2.data,
+        'custo3': form.custo3.data,
+        'custo4': form.custo4.data,
+        'custo5': form.custo5.data,
+        'category_id': category_id,
+    }, []
+
+def _insert_clients(valid, report):
+    # Duplicados: uma consulta por lote (japan_id ou email já cadastrados) e
+    # conjuntos para repetições dentro do próprio lote
+    japan_ids = {values['japan_id'] for _, values in valid}
+    emails = {values['email'] for _, values in valid}
+    existing_ids, existing_emails = set(), set()
+    for japan_id, email in db.session.query(Client.japan_id, Client.email)\
+            .filter(or_(Client.japan_id.in_(japan_ids), Client.email.in_(emails))):
+        existing_ids.add(japan_id)
+        existing_emails.add(email)
+
+    mappings = []
+    for number, values in valid:
+        if values['japan_id'] in existing_ids:
+            report(number, 'japan_id', 'ID japonês já cadastrado.')
+        elif values['email'] in existing_emails:
+            report(number, 'email', 'Email já cadastrado.')
+        else:
+            existing_ids.add(values['japan_id'])
+            existing_emails.add(values['email'])
+            mappings.append(values)
+    db.session.bulk_insert_mappings(Client, mappings, return_defaults=True)
+    index_documents('client', mappings)
+    return len(mappings)
+
+def _insert_products(valid, report):
+    mappings = [values for _, values in valid]
+    db.session.bulk_insert_mappings(Product, mappings, return_defaults=True)
+    index_documents('product', mappings)
+    # Estoque inicial no livro de movimentações, como no cadastro individual
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(InventoryMovement, [
+        {'product_id': values['id'], 'quantity': values['stock'], 'reason': 'initial', 'created_at': now}
+        for values in mappings if values['stock']
+    ])
+    return len(mappings)
+
+def import_rows(kind, rows, report, batch_size=BATCH_SIZE, progress=None):
+    # rows: iterável de (linha, dados); report(linha, campo, mensagem) recebe as rejeições
+    started = time.monotonic()
+    stats = {'processed': 0, 'imported': 0, 'rejected': 0}
+    categories = {}
+    if kind == 'products':
+        categories = {name.lower(): category_id for category_id, name in db.session.query(Category.id, Category.name)}
+
+    rejected_rows = set()
+
+    def reject(number, field, message):
+        if number not in rejected_rows:
+            rejected_rows.add(number)
+            stats['rejected'] += 1
+        report(number, field, message)
+
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            _import_batch(kind, batch, categories, reject, stats)
+            batch = []
+            if progress:
+                progress(_with_rate(stats, started))
+    if batch:
+        _import_batch(kind, batch, categories, reject, stats)
+    return _with_rate(stats, started)
+
+def _import_batch(kind, batch, categories, reject, stats):
+    valid = []
+    for number, row in batch:
+        if kind == 'clients':
+            values, errors = _validate_client(row)
+        else:
+            values, errors = _validate_product(row, categories)
+        if errors:
+            # Uma linha no relatório por campo com erro
+            for field in dict.fromkeys(field for field, _ in errors):
+                reject(number, field, '; '.join(message for name, message in errors if name == field))
+        else:
+            valid.append((number, values))
+
+    if kind == 'clients':
+        imported = _insert_clients(valid, reject)
+    else:
+        imported = _insert_products(valid, reject)
+    mark_dirty()
+    db.session.commit()
+    stats['processed'] += len(batch)
+    stats['imported'] += imported
+
+def _with_rate(stats, started):
+    elapsed = time.monotonic() - started
+    return dict(stats, elapsed=round(elapsed, 2),
+                rows_per_sec=round(stats['processed'] / elapsed) if elapsed else 0)
+
+def import_file(kind, fileobj, fmt, report_file, batch_size=BATCH_SIZE, progress=None):
+    # Importa um arquivo e grava o relatório de rejeições em report_file (texto)
+    mapping = CLIENT_HEADERS if kind == 'clients' else PRODUCT_HEADERS
+    writer = csv.writer(report_file)
+    writer.writerow(['linha', 'campo', 'mensagem'])
+    return import_rows(kind, read_rows(fileobj, fmt, mapping),
+                       lambda number, field, message: writer.writerow([number, field, message]),
+                       batch_size=batch_size, progress=progress)
+
+def file_format(filename):
+    fmt = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    # Sem openpyxl a importação de Excel fica indisponível (importado só ao ler o arquivo)
+    if fmt == 'xlsx' and find_spec('openpyxl') is None:
+        return None
+    return fmt if fmt in FORMATS else None
+
+
+# Importações enviadas pela página de administração rodam em segundo plano;
+# o estado fica em arquivos JSON, como nas exportações.
+
+def _imports_dir():
+    path = app.config.get('IMPORTS_PATH', os.path.join(app.instance_path, 'imports'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _job_path(job_id, suffix):
+    return os.path.join(_imports_dir(), f'{job_id}{suffix}')
+
+def _save_job(job):
+    path = _job_path(job['id'], '.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(job, f)
+    os.replace(f'{path}.tmp', path)
+
+def get_job(job_id):
+    try:
+        uuid.UUID(job_id)
+        with open(_job_path(job_id, '.json')) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+def report_path(job):
+    return _job_path(job['id'], '-erros.csv')
+
+def _run_job(job, upload_path):
+    with app.app_context():
+        def progress(stats):
+            job.update(stats)
+            _save_job(job)
+        try:
+            with open(upload_path, 'rb') as upload, \
+                    open(report_path(job), 'w', newline='', encoding='utf-8-sig') as report:
+                job.update(import_file(job['kind'], upload, job['format'], report, progress=progress))
+            job['status'] = 'done'
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'Erro na importação {job["id"]}: {e}')
+            job['status'] = 'error'
+        finally:
+            job['finished_at'] = datetime.utcnow().isoformat()
+            db.session.remove()
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+        _save_job(job)
+
+def start_job(kind, file_storage, user_id):
+    fmt = file_format(file_storage.filename)
+    job = {
+        'id': uuid.uuid4().hex,
+        'kind': kind,
+        'format': fmt,
+        'filename': file_storage.filename,
+        'user_id': user_id,
+        'status': 'running',
+        'processed': 0,
+        'imported': 0,
+        'rejected': 0,
+        'rows_per_sec': 0,
+        'created_at': datetime.utcnow().isoformat(),
+    }
+    upload_path = _job_path(job['id'], f'.upload.{fmt}')
+    file_storage.save(upload_path)
+    _save_job(job)
+    threading.Thread(target=_run_job, args=(job, upload_path), daemon=True).start()
+    return job
@@ -0,0 +1,146 @@
+from datetime import datetime
+from flask_login import current_user
+from sqlalchemy import func, insert
+from config import db
+from models import Product, InventoryMovement, StockSnapshot
+
+# Livro de movimentações de estoque. Toda alteração de Product.stock grava uma
+# linha em inventory_movement (que nunca é alterada nem apagada). A cada
+# SNAPSHOT_EVERY movimentações de um produto é gravado um snapshot do estoque,
+# então o estoque em qualquer data é o snapshot mais próximo mais no máximo
+# SNAPSHOT_EVERY movimentações, sem percorrer o histórico inteiro.
+
+SNAPSHOT_EVERY = 50
+
+REASONS = {
+    'initial': 'Estoque inicial',
+    'adjustment': 'Ajuste manual',
+    'sale': 'Venda finalizada',
+    'cancel': 'Cancelamento de venda',
+    'delete': 'Produto excluído',
+}
+
+
+def _current_user_id():
+    try:
+        return current_user.id if current_user.is_authenticated else None
+    except (AttributeError, RuntimeError):
+        # Fora de uma requisição (comandos, scripts)
+        return None
+
+def record_movement(product_id, quantity, reason, sale_id=None):
+    if not quantity:
+        return None
+    movement = InventoryMovement(product_id=product_id, quantity=quantity, reason=reason,
+                                 sale_id=sale_id, user_id=_current_user_id(),
+                                 created_at=datetime.utcnow())
+    db.session.add(movement)
+    db.session.flush()
+    _maybe_snapshot(product_id, movement)
+    return movement
+
+def record_movements(rows):
+    # Várias movimentações de uma vez (operações em lote): rows são tuplas
+    # (produto, quantidade, motivo, venda); um INSERT e uma verificação de
+    # snapshot por produto
+    user_id = _current_user_id()
+    now = datetime.utcnow()
+    mappings = [
+        {'product_id': product_id, 'quantity': quantity, 'reason': reason,
+         'sale_id': sale_id, 'user_id': user_id, 'created_at': now}
+        for product_id, quantity, reason, sale_id in rows if quantity
+    ]
+    if not mappings:
+        return 0
+    db.session.execute(insert(InventoryMovement), mappings)
+    product_ids = {row['product_id'] for row in mappings}
+    last = db.session.query(InventoryMovement.product_id, func.max(InventoryMovement.id))\
+        .filter(InventoryMovement.product_id.in_(product_ids))\
+        .group_by(InventoryMovement.product_id).all()
+    for product_id, movement_id in last:
+        _maybe_snapshot(product_id, db.session.get(InventoryMovement, movement_id))
+    return len(mappings)
+
+def latest_snapshot(product_id, before=None):
+    query = StockSnapshot.query.filter(StockSnapshot.product_id == product_id)
+    if before is not None:
+        query = query.filter(StockSnapshot.taken_at <= before)
+    return query.order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc()).first()
+
+def _tail(product_id, snapshot, until=None):
+    query = db.session.query(func.count(InventoryMovement.id), func.coalesce(func.sum(InventoryMovement.quantity), 0))\
+        .filter(InventoryMovement.product_id == product_id)
+    if snapshot is not None:
+        query = query.filter(InventoryMovement.id > snapshot.movement_id)
+    if until is not None:
+        query = query.filter(InventoryMovement.created_at <= until)
+    return query.one()
+
+def _maybe_snapshot(product_id, movement):
+    snapshot = latest_snapshot(product_id)
+    count, total = _tail(product_id, snapshot)
+    if count >= SNAPSHOT_EVERY:
+        db.session.add(StockSnapshot(product_id=product_id, movement_id=movement.id,
+                                     stock=(snapshot.stock if snapshot else 0) + total,
+                                     taken_at=movement.created_at))
+
+def stock_at(product_id, when=None):
+    # Estoque do produto numa data (agora, se when for None) segundo o livro
+    snapshot = latest_snapshot(product_id, before=when)
+    _, total = _tail(product_id, snapshot, until=when)
+    return (snapshot.stock if snapshot else 0) + total
+
+def movements(product_id, start=None, end=None, limit=200):
+    # Movimentações de um produto, da mais recente para a mais antiga
+    query = InventoryMovement.query.filter(InventoryMovement.product_id == product_id)
+    if start is not None:
+        query = query.filter(InventoryMovement.created_at >= start)
+    if end is not None:
+        query = query.filter(InventoryMovement.created_at < end)
+    return query.order_by(InventoryMovement.id.desc()).limit(limit).all()
+
+def _last_snapshots():
+    return db.session.query(StockSnapshot.product_id,
+                            func.max(StockSnapshot.movement_id).label('movement_id'))\
+        .group_by(StockSnapshot.product_id).subquery()
+
+def ledger_stock():
+    # Estoque de todos os produtos segundo o livro: último snapshot de cada
+    # produto mais as movimentações posteriores, em duas consultas agregadas
+    last = _last_snapshots()
+    stock = dict(
+        db.session.query(StockSnapshot.product_id, StockSnapshot.stock)
+        .join(last, (StockSnapshot.product_id == last.c.product_id) &
+                    (StockSnapshot.movement_id == last.c.movement_id))
+    )
+    tails = db.session.query(InventoryMovement.product_id, func.sum(InventoryMovement.quantity))\
+        .outerjoin(last, InventoryMovement.product_id == last.c.product_id)\
+        .filter(InventoryMovement.id > func.coalesce(last.c.movement_id, 0))\
+        .group_by(InventoryMovement.product_id)
+    for product_id, total in tails:
+        stock[product_id] = stock.get(product_id, 0) + total
+    return stock
+
+def reconcile():
+    # Produtos cujo Product.stock diverge do livro: [(produto, estoque, livro)]
+    ledger = ledger_stock()
+    return [
+        (product, product.stock, ledger.get(product.id, 0))
+        for product in Product.query.order_by(Product.id)
+        if (product.stock or 0) != ledger.get(product.id, 0)
+    ]
+
+def snapshot_all():
+    # Snapshot de todos os produtos com movimentações desde o último (uso periódico)
+    ledger = ledger_stock()
+    last = _last_snapshots()
+    pending = db.session.query(InventoryMovement.product_id, func.max(InventoryMovement.id))\
+        .outerjoin(last, InventoryMovement.product_id == last.c.product_id)\
+        .filter(InventoryMovement.id > func.coalesce(last.c.movement_id, 0))\
+        .group_by(InventoryMovement.product_id).all()
+    for product_id, movement_id in pending:
+        movement = db.session.get(InventoryMovement, movement_id)
+        db.session.add(StockSnapshot(product_id=product_id, movement_id=movement_id,
+                                     stock=ledger.get(product_id, 0), taken_at=movement.created_at))
+    db.session.commit()
+    return len(pending)
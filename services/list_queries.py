@@ -0,0 +1,30 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models import Product, ProductImage, Client, ClientImage, Category
+
+# Consultas das páginas de listagem com os relacionamentos usados nos templates
+# carregados antecipadamente: cada página faz um número fixo de consultas,
+# qualquer que seja o número de linhas. As imagens vêm sem image_data, que só
+# é lido pelo endpoint da imagem.
+
+def _product_images():
+    return selectinload(Product.images).load_only(
+        ProductImage.id, ProductImage.product_id, ProductImage.mime_type, ProductImage.content_hash
+    )
+
+def _client_images():
+    return selectinload(Client.images).load_only(
+        ClientImage.id, ClientImage.client_id, ClientImage.mime_type, ClientImage.content_hash
+    )
+
+def products_list_query(category_id=None):
+    query = Product.query.options(joinedload(Product.category), _product_images())
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    return query.order_by(Product.id)
+
+def clients_list_query():
+    return Client.query.options(_client_images()).order_by(Client.id)
+
+def categories_with_products():
+    # Apenas as categorias que têm produtos
+    return Category.query.filter(Category.products.any()).order_by(Category.name)
@@ -0,0 +1,83 @@
+from sqlalchemy import and_, or_
+from models import Client, Product
+from services.search import matching_ids
+from services.stock import available
+
+# Autocompletar de clientes e produtos no formulário de vendas. Em vez de um
+# <select> com o cadastro inteiro, o formulário recebe só a opção escolhida e
+# o navegador busca as demais aos poucos: páginas ordenadas por nome com
+# paginação por chave (nome, id) sobre índices, filtradas pelo índice de
+# busca quando há texto. O custo não depende do tamanho do cadastro.
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+
+def encode_cursor(name, record_id):
+    return f'{name}_{record_id}'
+
+def decode_cursor(cursor):
+    try:
+        name, record_id = cursor.rsplit('_', 1)
+        return name, int(record_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _page(query, name_column, id_column, kind, text, cursor, page_size):
+    page_size = min(max(page_size or PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    ids = matching_ids(kind, text)
+    if ids is not None:
+        query = query.filter(id_column.in_(ids))
+    position = decode_cursor(cursor)
+    if position:
+        name, record_id = position
+        query = query.filter(or_(name_column > name, and_(name_column == name, id_column > record_id)))
+    rows = query.order_by(name_column, id_column).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(getattr(rows[-1], name_column.key), rows[-1].id)
+    return rows, next_cursor
+
+def product_label(product):
+    # O formulário lê o preço do texto da opção (updatePrice)
+    return f'{product.name} - ¥{product.price}'
+
+def client_page(text='', cursor=None, page_size=PAGE_SIZE):
+    clients, next_cursor = _page(Client.query.with_entities(Client.id, Client.full_name),
+                                 Client.full_name, Client.id, 'client', text, cursor, page_size)
+    return {
+        'results': [{'id': client.id, 'text': client.full_name} for client in clients],
+        'next_cursor': next_cursor,
+    }
+
+def product_page(text='', cursor=None, page_size=PAGE_SIZE):
+    query = Product.query.with_entities(Product.id, Product.name, Product.price, Product.stock, Product.reserved)\
+        .filter(Product.is_active == True)
+    products, next_cursor = _page(query, Product.name, Product.id, 'product', text, cursor, page_size)
+    return {
+        'results': [
+            {'id': product.id, 'text': product_label(product), 'price': product.price,
+             'available': available(product)}
+            for product in products
+        ],
+        'next_cursor': next_cursor,
+    }
+
+# Opções do formulário: só o registro enviado (ou o da venda em edição), então
+# a validação do SelectField confere apenas os ids recebidos
+
+def client_choices(client_id):
+    client = Client.query.with_entities(Client.id, Client.full_name).filter(Client.id == client_id).first() \
+        if client_id else None
+    return [(client.id, client.full_name)] if client else []
+
+def product_choices(product_id, current_product_id=None):
+    # Produtos inativos só valem se já forem o produto da venda em edição
+    if not product_id:
+        return []
+    query = Product.query.with_entities(Product.id, Product.name, Product.price).filter(Product.id == product_id)
+    if product_id != current_product_id:
+        query = query.filter(Product.is_active == True)
+    product = query.first()
+    return [(product.id, product_label(product))] if product else []
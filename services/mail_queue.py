@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, delete, func, insert, or_, select, update
+from config import app, db, mail
+from models import MailMessage
+
+# Fila de emails: as rotas só gravam a mensagem na tabela mail_queue do banco
+# da aplicação (enqueue) e respondem; o envio fica com um processo separado
+# (flask mail worker, em outro dyno), que entrega em lotes usando uma conexão
+# SMTP por lote. Falhas são repetidas com espera crescente (30s, 1min, 2min...
+# até 1h) e, depois de MAX_ATTEMPTS tentativas, a mensagem fica como 'failed'.
+#
+# MAIL_TRANSPORT escolhe a entrega: 'smtp' (padrão, Flask-Mail), 'console'
+# (só registra no log) ou 'file' (grava .eml em MAIL_FILE_PATH), para testes
+# sem servidor de email.
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+RETRY_BASE = 30
+RETRY_MAX = 3600
+# Uma mensagem reservada por um worker que morreu volta para a fila depois disto
+LOCK_TIMEOUT = 300
+POLL_INTERVAL = 5
+
+STATUSES = ('pending', 'sent', 'failed')
+
+
+def _due(now):
+    return (MailMessage.status == 'pending') & (MailMessage.next_attempt_at <= now) & \
+        or_(MailMessage.locked_until.is_(None), MailMessage.locked_until <= now)
+
+
+class MailQueue:
+    # Cada operação usa uma transação própria, fora da sessão da requisição:
+    # a mensagem fica gravada mesmo que a requisição não faça commit.
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def put(self, message):
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            result = conn.execute(insert(MailMessage).values(
+                message=json.dumps(message), status='pending', attempts=0,
+                next_attempt_at=now, created_at=now))
+            return result.inserted_primary_key[0]
+
+    def claim(self, limit):
+        # Reserva até `limit` mensagens vencidas para este worker. O UPDATE só
+        # pega as que continuam livres: outro worker que escolheu as mesmas
+        # mensagens ao mesmo tempo fica sem elas.
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            ids = conn.execute(
+                select(MailMessage.id).where(_due(now)).order_by(MailMessage.next_attempt_at).limit(limit)
+            ).scalars().all()
+            if not ids:
+                return []
+            conn.execute(
+                update(MailMessage).where(MailMessage.id.in_(ids), _due(now))
+                .values(locked_by=token, locked_until=now + timedelta(seconds=LOCK_TIMEOUT)))
+            rows = conn.execute(
+                select(MailMessage.id, MailMessage.message, MailMessage.attempts)
+                .where(MailMessage.locked_by == token).order_by(MailMessage.id)).all()
+        return [(row.id, json.loads(row.message), row.attempts) for row in rows]
+
+    def mark_sent(self, message_ids):
+        if not message_ids:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(MailMessage).where(MailMessage.id.in_(message_ids))
+                .values(status='sent', sent_at=datetime.utcnow(), locked_by=None, locked_until=None,
+                        last_error=None))
+
+    def mark_failed(self, failures):
+        # failures: [(id, tentativas até agora, erro)]
+        if not failures:
+            return
+        now = datetime.utcnow()
+        rows = []
+        for message_id, attempts, error in failures:
+            attempts += 1
+            status = 'failed' if attempts >= MAX_ATTEMPTS else 'pending'
+            delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+            rows.append({'message_id': message_id, 'new_status': status, 'new_attempts': attempts,
+                         'retry_at': now + timedelta(seconds=delay), 'error': error[:500]})
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(MailMessage.__table__).where(MailMessage.id == bindparam('message_id'))
+                .values(status=bindparam('new_status'), attempts=bindparam('new_attempts'),
+                        next_attempt_at=bindparam('retry_at'), locked_by=None, locked_until=None,
+                        last_error=bindparam('error')),
+                rows)
+
+    def retry_failed(self):
+        with self.engine.begin() as conn:
+            return conn.execute(
+                update(MailMessage).where(MailMessage.status == 'failed')
+                .values(status='pending', attempts=0, next_attempt_at=datetime.utcnow())).rowcount
+
+    def purge_sent(self, older_than):
+        with self.engine.begin() as conn:
+            return conn.execute(
+                delete(MailMessage).where(MailMessage.status == 'sent',
+                                          MailMessage.sent_at < datetime.utcnow() - timedelta(seconds=older_than))
+            ).rowcount
+
+    def counts(self):
+        counts = dict.fromkeys(STATUSES, 0)
+        with self.engine.connect() as conn:
+            counts.update(conn.execute(
+                select(MailMessage.status, func.count()).group_by(MailMessage.status)).all())
+        return counts
+
+    def errors(self, limit=10):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(MailMessage.id, MailMessage.attempts, MailMessage.last_error)
+                .where(MailMessage.last_error.isnot(None), MailMessage.status != 'sent')
+                .order_by(MailMessage.id.desc()).limit(limit)).all()
+
+
+_queue = None
+_lock = threading.Lock()
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _lock:
+            if _queue is None:
+                _queue = MailQueue(db.engine)
+    return _queue
+
+def enqueue(subject, recipients, body, html=None, sender=None):
+    # Grava a mensagem para envio pelo worker; retorna o id na fila
+    return get_queue().put({
+        'subject': subject,
+        'recipients': list(recipients),
+        'body': body,
+        'html': html,
+        'sender': sender or app.config.get('MAIL_DEFAULT_SENDER'),
+    })
+
+
+# Entrega
+
+def _message(data):
+    # Flask-Mail só é necessário no worker de envio
+    from flask_mail import Message
+    return Message(data['subject'], sender=data['sender'], recipients=data['recipients'],
+                   body=data['body'], html=data.get('html'))
+
+def _deliver_console(batch):
+    for message_id, data, _ in batch:
+        app.logger.info(f'Email {message_id} para {", ".join(data["recipients"])}: {data["subject"]}\n{data["body"]}')
+    return [message_id for message_id, _, _ in batch], []
+
+def _deliver_file(batch):
+    path = app.config.get('MAIL_FILE_PATH', os.path.join(app.instance_path, 'mail'))
+    os.makedirs(path, exist_ok=True)
+    for message_id, data, _ in batch:
+        with open(os.path.join(path, f'{message_id}.eml'), 'wb') as f:
+            f.write(_message(data).as_bytes())
+    return [message_id for message_id, _, _ in batch], []
+
+def _deliver_smtp(batch):
+    sent, failures = [], []
+    try:
+        with mail.connect() as connection:
+            for message_id, data, attempts in batch:
+                try:
+                    connection.send(_message(data))
+                    sent.append(message_id)
+                except Exception as e:
+                    # Recusa de um destinatário não derruba o resto do lote
+                    failures.append((message_id, attempts, str(e)))
+    except Exception as e:
+        # Falha ao conectar (ou a conexão caiu): o restante do lote é repetido depois
+        done = set(sent) | {failure[0] for failure in failures}
+        failures.extend((message_id, attempts, str(e)) for message_id, _, attempts in batch if message_id not in done)
+    return sent, failures
+
+TRANSPORTS = {
+    'smtp': _deliver_smtp,
+    'console': _deliver_console,
+    'file': _deliver_file,
+}
+
+def process_batch(batch_size=BATCH_SIZE):
+    # Envia um lote de mensagens vencidas; retorna (enviadas, falhas)
+    queue = get_queue()
+    batch = queue.claim(batch_size)
+    if not batch:
+        return 0, 0
+    sent, failures = TRANSPORTS[app.config.get('MAIL_TRANSPORT', 'smtp')](batch)
+    queue.mark_sent(sent)
+    queue.mark_failed(failures)
+    for message_id, attempts, error in failures:
+        app.logger.warning(f'Falha ao enviar email {message_id} (tentativa {attempts + 1}): {error}')
+    return len(sent), len(failures)
+
+def run_worker(batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL, once=False):
+    # Envia lotes enquanto houver mensagens; sem mensagens, espera poll_interval
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = process_batch(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent or failed:
+            continue
+        if once:
+            return total_sent, total_failed
+        time.sleep(poll_interval)
@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import threading
+import time
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import app
+
+# Métricas por requisição: latência por endpoint (histograma), número e tempo
+# das consultas SQL, tempo de renderização dos templates e tamanho da
+# resposta. Os valores são somados em memória e, a cada FLUSH_INTERVAL
+# segundos, acumulados num arquivo SQLite local compartilhado pelos workers do
+# gunicorn; /metrics lê o total em formato texto do Prometheus.
+#
+# Requisições mais lentas que SLOW_REQUEST_SECONDS vão para o log com as
+# consultas SQL mais demoradas.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+FLUSH_INTERVAL = 5
+SLOW_REQUEST_SECONDS = 1.0
+# Consultas guardadas por requisição para o log de lentidão
+SLOW_LOG_STATEMENTS = 5
+
+HELP = {
+    'http_requests_total': ('counter', 'Requisições atendidas.'),
+    'http_request_duration_seconds': ('histogram', 'Tempo de resposta por endpoint.'),
+    'http_response_size_bytes': ('histogram', 'Tamanho da resposta por endpoint.'),
+    'db_queries_per_request': ('histogram', 'Consultas SQL por requisição.'),
+    'db_query_seconds_total': ('counter', 'Tempo gasto em consultas SQL.'),
+    'template_render_seconds_total': ('counter', 'Tempo gasto renderizando templates.'),
+    'slow_requests_total': ('counter', 'Requisições acima de SLOW_REQUEST_SECONDS.'),
+}
+
+
+class MetricsStore:
+    # Valores acumulados (contadores e baldes de histograma), somados entre processos
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS metric ('
+            'name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (name, labels))'
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add(self, values):
+        # values: {(nome, rótulos): incremento}
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO metric (name, labels, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value',
+                [(name, labels, value) for (name, labels), value in values.items()])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def all(self):
+        return self._connect().execute('SELECT name, labels, value FROM metric ORDER BY name, labels').fetchall()
+
+    def clear(self):
+        self._connect().execute('DELETE FROM metric')
+
+
+_store = None
+_pending = {}
+_last_flush = time.monotonic()
+_lock = threading.Lock()
+
+def get_store():
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                path = app.config.get('METRICS_PATH', os.path.join(app.instance_path, 'metrics.db'))
+                _store = MetricsStore(path)
+    return _store
+
+def _labels(**labels):
+    return ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+def _inc(values, name, value=1, **labels):
+    key = (name, _labels(**labels))
+    values[key] = values.get(key, 0) + value
+
+def _observe(values, name, value, buckets, **labels):
+    # Histograma cumulativo, como o Prometheus espera
+    for bound in buckets:
+        if value <= bound:
+            _inc(values, f'{name}_bucket', le=bound, **labels)
+    _inc(values, f'{name}_bucket', le='+Inf', **labels)
+    _inc(values, f'{name}_sum', value, **labels)
+    _inc(values, f'{name}_count', **labels)
+
+def flush(force=False):
+    global _pending, _last_flush
+    with _lock:
+        if not _pending or (not force and time.monotonic() - _last_flush < FLUSH_INTERVAL):
+            return
+        values, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    try:
+        get_store().add(values)
+    except sqlite3.Error as e:
+        app.logger.warning(f'Falha ao gravar métricas: {e}')
+
+def record(endpoint, method, status, duration, queries, query_time, render_time, size):
+    values = {}
+    _inc(values, 'http_requests_total', endpoint=endpoint, method=method, status=status)
+    _observe(values, 'http_request_duration_seconds', duration, LATENCY_BUCKETS, endpoint=endpoint)
+    _observe(values, 'db_queries_per_request', queries, QUERY_COUNT_BUCKETS, endpoint=endpoint)
+    _inc(values, 'db_query_seconds_total', query_time, endpoint=endpoint)
+    _inc(values, 'template_render_seconds_total', render_time, endpoint=endpoint)
+    if size is not None:
+        _observe(values, 'http_response_size_bytes', size, SIZE_BUCKETS, endpoint=endpoint)
+    if duration >= app.config.get('SLOW_REQUEST_SECONDS', SLOW_REQUEST_SECONDS):
+        _inc(values, 'slow_requests_total', endpoint=endpoint)
+    with _lock:
+        for key, value in values.items():
+            _pending[key] = _pending.get(key, 0) + value
+    flush()
+
+def _sort_key(row):
+    # Baldes em ordem numérica (le="+Inf" por último)
+    name, labels, _ = row
+    rest, _, le = labels.partition('le="')
+    return name, rest, float(le.split('"')[0].replace('+Inf', 'inf')) if le else 0
+
+def render():
+    # Texto no formato de exposição do Prometheus
+    flush(force=True)
+    lines = []
+    current = None
+    for name, labels, value in sorted(get_store().all(), key=_sort_key):
+        base = name.rsplit('_', 1)[0] if name.endswith(('_bucket', '_sum', '_count')) else name
+        if base not in HELP:
+            base = name
+        if base != current:
+            current = base
+            kind, help_text = HELP.get(base, ('untyped', ''))
+            lines.append(f'# HELP {base} {help_text}')
+            lines.append(f'# TYPE {base} {kind}')
+        lines.append(f'{name}{{{labels}}} {_format(value)}' if labels else f'{name} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+def _format(value):
+    # Sem perder dígitos: contadores acima de 1e6 com :g viravam 1.23457e+06
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+# Coleta: consultas SQL e templates contam para a requisição em andamento
+
+def _request_stats():
+    if has_request_context():
+        return g.get('_metrics')
+    return None
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['_metrics_started'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('_metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _request_stats()
+    if stats is None:
+        return
+    stats['queries'] += 1
+    stats['query_time'] += elapsed
+    slowest = stats['statements']
+    if len(slowest) < SLOW_LOG_STATEMENTS or elapsed > slowest[-1][0]:
+        slowest.append((elapsed, statement))
+        slowest.sort(key=lambda item: item[0], reverse=True)
+        del slowest[SLOW_LOG_STATEMENTS:]
+
+def _before_render(sender, template, context, **extra):
+    stats = _request_stats()
+    if stats is not None:
+        stats['render_started'].append(time.perf_counter())
+
+def _rendered(sender, template, context, **extra):
+    stats = _request_stats()
+    if stats is not None and stats['render_started']:
+        stats['render_time'] += time.perf_counter() - stats['render_started'].pop()
+
+before_render_template.connect(_before_render, app)
+template_rendered.connect(_rendered, app)
+
+@app.before_request
+def _start_request():
+    g._metrics = {'started': time.perf_counter(), 'queries': 0, 'query_time': 0.0,
+                  'render_time': 0.0, 'render_started': [], 'statements': []}
+
+@app.after_request
+def _finish_request(response):
+    stats = g.pop('_metrics', None)
+    if stats is None or not app.config.get('METRICS_ENABLED', True):
+        return response
+    duration = time.perf_counter() - stats['started']
+    # Respostas em streaming (exportações) não têm tamanho conhecido
+    size = None if response.is_streamed else response.calculate_content_length()
+    endpoint = request.endpoint or 'not_found'
+    record(endpoint, request.method, response.status_code, duration,
+           stats['queries'], stats['query_time'], stats['render_time'], size)
+    if duration >= app.config.get('SLOW_REQUEST_SECONDS', SLOW_REQUEST_SECONDS):
+        statements = '\n'.join(f'  {elapsed * 1000:.1f} ms: {" ".join(statement.split())[:500]}'
+                               for elapsed, statement in stats['statements'])
+        app.logger.warning(
+            f'Requisição lenta: {request.method} {request.full_path} ({endpoint}) em {duration * 1000:.0f} ms, '
+            f'{stats["queries"]} consulta(s) em {stats["query_time"] * 1000:.0f} ms, '
+            f'templates em {stats["render_time"] * 1000:.0f} ms\n{statements}')
+    return response
@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import app, bcrypt
+
+# Hash e verificação de senhas (bcrypt) num pool de threads de tamanho fixo com
+# fila limitada. O bcrypt libera o GIL, então as threads usam CPUs de verdade,
+# mas nunca mais que PASSWORD_HASH_WORKERS ao mesmo tempo por processo: uma
+# rajada de logins espera na fila (até PASSWORD_HASH_QUEUE pedidos) ou é
+# recusada na hora, em vez de ocupar todos os workers do gunicorn com CPU.
+#
+# O custo vem de BCRYPT_LOG_ROUNDS; hashes gravados com outro custo são
+# regravados no próximo login (verify_and_update).
+
+DEFAULT_ROUNDS = 12
+
+
+class PasswordHasherBusy(Exception):
+    # Fila do pool cheia ou hash demorando mais que PASSWORD_HASH_TIMEOUT: a
+    # requisição deve ser recusada (503) e repetida depois
+    pass
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+def _pool():
+    # Criado no primeiro uso, depois do fork dos workers
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+                _slots = threading.BoundedSemaphore(workers + app.config.get('PASSWORD_HASH_QUEUE', 8))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor, _slots
+
+def _run(function, *args):
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = executor.submit(function, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10))
+    except FutureTimeoutError:
+        # O hash continua na fila e libera a vaga quando terminar; as rotas
+        # tratam como pool ocupado e pedem para tentar novamente
+        raise PasswordHasherBusy()
+
+def rounds():
+    return app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS)
+
+def _hash(password, log_rounds):
+    return bcrypt.generate_password_hash(password, rounds=log_rounds).decode('utf-8')
+
+def _check(password_hash, password):
+    try:
+        return bcrypt.check_password_hash(password_hash, password)
+    except ValueError:
+        # Hash inválido ou de outro algoritmo
+        return False
+
+def hash_password(password):
+    return _run(_hash, password, rounds())
+
+def check_password(password_hash, password):
+    if not password_hash:
+        return False
+    return _run(_check, password_hash, password)
+
+def hash_rounds(password_hash):
+    # '$2b$12$...' -> 12
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def needs_rehash(password_hash):
+    return hash_rounds(password_hash) != rounds()
+
+def verify_and_update(user, password):
+    # Confere a senha do usuário e, se o hash usa outro custo, regrava com o
+    # custo atual. O commit fica com quem chamou.
+    if not check_password(user.password, password):
+        return False
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+    return True
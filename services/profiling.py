@@ -0,0 +1,175 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import g, request
+from flask_login import current_user
+from config import app
+
+# Perfil de desempenho sob demanda: um administrador acrescenta ?_profile=1 à
+# URL (ou envia o cabeçalho X-Profile: 1) e a requisição roda com o cProfile
+# e com um amostrador de pilhas. O resultado fica em disco, num buffer
+# circular com os PROFILES_KEEP perfis mais recentes, e aparece em
+# /admin/profiles:
+#   <id>.prof    estatísticas do cProfile (python -m pstats, snakeviz)
+#   <id>.folded  pilhas agrupadas para flamegraph (flamegraph.pl, speedscope)
+# Sem a marcação o custo por requisição é só conferir o parâmetro.
+
+PROFILES_KEEP = 50
+SAMPLE_INTERVAL = 0.002
+PROFILE_ID = re.compile(r'^\d{14}-[0-9a-f]{8}$')
+
+
+def profiles_dir():
+    path = app.config.get('PROFILES_PATH', os.path.join(app.instance_path, 'profiles'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def profile_path(profile_id, suffix):
+    return os.path.join(profiles_dir(), f'{profile_id}{suffix}')
+
+
+class StackSampler:
+    # Amostra a pilha da thread da requisição a cada SAMPLE_INTERVAL segundos
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _requested():
+    return request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+@app.before_request
+def _start_profile():
+    if not _requested():
+        return
+    if not (current_user.is_authenticated and current_user.is_admin):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Outro profiler já ativo neste processo (Python 3.12+)
+        return
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    g._profile = {'profiler': profiler, 'sampler': sampler, 'started': time.perf_counter()}
+
+def _stop():
+    profile = g.pop('_profile', None)
+    if profile is None:
+        return None
+    profile['profiler'].disable()
+    profile['sampler'].stop()
+    profile['duration'] = time.perf_counter() - profile['started']
+    return profile
+
+@app.after_request
+def _finish_profile(response):
+    profile = _stop()
+    if profile is not None:
+        try:
+            profile_id = save(profile, response.status_code)
+            response.headers['X-Profile-Id'] = profile_id
+        except OSError as e:
+            app.logger.warning(f'Falha ao gravar o perfil de {request.path}: {e}')
+    return response
+
+@app.teardown_request
+def _discard_profile(exc):
+    # Requisição interrompida antes do after_request: só desliga o profiler
+    _stop()
+
+
+# Armazenamento (buffer circular em disco)
+
+def save(profile, status):
+    profile_id = f'{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}'
+    profile['profiler'].dump_stats(profile_path(profile_id, '.prof'))
+    with open(profile_path(profile_id, '.folded'), 'w') as f:
+        f.write(profile['sampler'].folded())
+    meta = {
+        'id': profile_id,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': status,
+        'duration_ms': round(profile['duration'] * 1000, 1),
+        'samples': sum(profile['sampler'].stacks.values()),
+        'user': current_user.username,
+        'created_at': datetime.utcnow().isoformat(),
+    }
+    with open(profile_path(profile_id, '.json'), 'w') as f:
+        json.dump(meta, f)
+    _prune()
+    return profile_id
+
+def _prune():
+    keep = app.config.get('PROFILES_KEEP', PROFILES_KEEP)
+    for profile_id in _profile_ids()[keep:]:
+        for suffix in ('.json', '.prof', '.folded'):
+            try:
+                os.remove(profile_path(profile_id, suffix))
+            except OSError:
+                pass
+
+def _profile_ids():
+    # Mais recentes primeiro (o id começa pela data)
+    return sorted((name[:-5] for name in os.listdir(profiles_dir()) if name.endswith('.json')), reverse=True)
+
+def list_profiles():
+    profiles = []
+    for profile_id in _profile_ids():
+        meta = get_profile(profile_id)
+        if meta is not None:
+            profiles.append(meta)
+    return profiles
+
+def get_profile(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id, '.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def top_functions(profile_id, sort='cumulative', limit=40):
+    # Tabela do pstats, como em python -m pstats
+    output = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id, '.prof'), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,102 @@
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from config import app
+
+# Limite de tentativas por token bucket: cada chave (IP, email) tem até
+# `capacity` fichas, repostas a `rate` fichas por segundo, e cada tentativa
+# gasta uma. O estado fica num arquivo SQLite local, compartilhado entre os
+# workers do gunicorn, como o cache do dashboard.
+
+# (capacidade, fichas por segundo)
+DEFAULT_LIMITS = {
+    'login_ip': (20, 20 / 60),
+    'login_email': (5, 5 / 300),
+    'register_ip': (5, 5 / 600),
+}
+
+# Buckets parados há mais que isto já estão cheios e podem ser apagados
+STALE_AFTER = 3600
+
+
+class TokenBuckets:
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS bucket ('
+                     'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets):
+        # buckets: [(chave, capacidade, fichas por segundo)]. Gasta uma ficha de
+        # cada bucket se todos tiverem; senão não gasta nenhuma. Retorna 0 ou os
+        # segundos até a próxima tentativa ser aceita.
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            states = []
+            wait = 0
+            for key, capacity, rate in buckets:
+                row = conn.execute('SELECT tokens, updated_at FROM bucket WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                if tokens < 1:
+                    wait = max(wait, math.ceil((1 - tokens) / rate))
+                states.append((key, tokens))
+            if not wait:
+                conn.executemany('INSERT OR REPLACE INTO bucket (key, tokens, updated_at) VALUES (?, ?, ?)',
+                                 [(key, tokens - 1, now) for key, tokens in states])
+            if random.random() < 0.01:
+                conn.execute('DELETE FROM bucket WHERE updated_at < ?', (now - STALE_AFTER,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def clear(self):
+        self._connect().execute('DELETE FROM bucket')
+
+
+_buckets = None
+_lock = threading.Lock()
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        with _lock:
+            if _buckets is None:
+                path = app.config.get('RATE_LIMIT_PATH', os.path.join(app.instance_path, 'rate_limit.db'))
+                _buckets = TokenBuckets(path)
+    return _buckets
+
+def _limit(name):
+    return app.config.get('RATE_LIMITS', {}).get(name, DEFAULT_LIMITS[name])
+
+def attempt(**keys):
+    # attempt(login_ip='1.2.3.4', login_email='a@b.c') -> segundos de espera (0 = liberado)
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return 0
+    buckets = [(f'{name}:{value}', *_limit(name)) for name, value in keys.items() if value]
+    if not buckets:
+        return 0
+    try:
+        return get_buckets().take(buckets)
+    except sqlite3.Error as e:
+        # Sem o arquivo de limites o login continua funcionando
+        app.logger.warning(f'Falha no limite de tentativas: {e}')
+        return 0
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import contains_eager
+from config import db
+from models import Sale, Product, Client, User
+from services.search import matching_ids, normalize
+
+# Consulta da lista de vendas com filtros avaliados no banco e paginação por
+# chave (keyset) em (sale_date, id): cada página continua a partir da última
+# linha da anterior, então o custo não cresce com o número de páginas.
+# Vendas sem data vêm depois de todas as outras (NULLS LAST), por id.
+
+PAGE_SIZE = 50
+# Parte da data no cursor de uma venda sem data
+NULL_DATE = 'null'
+MAX_PAGE_SIZE = 200
+STATUSES = ('negotiating', 'pending', 'completed', 'cancelled')
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_filters(args):
+    # Mesmos filtros que a página oferecia em JavaScript (applyFilters)
+    return {
+        'client': (args.get('client') or '').strip(),
+        'product': (args.get('product') or '').strip(),
+        'seller': (args.get('seller') or '').strip(),
+        'status': args.get('status') if args.get('status') in STATUSES else '',
+        'date_start': _parse_date(args.get('date_start')),
+        'date_end': _parse_date(args.get('date_end')),
+        'price_min': _parse_float(args.get('price_min')),
+        'price_max': _parse_float(args.get('price_max')),
+    }
+
+def _matching(kind, id_column, text):
+    # Nomes de clientes e produtos pelo índice de busca (services/search.py),
+    # sem acentos e sem diferenciar maiúsculas: "jose" encontra "José"
+    ids = matching_ids(kind, text, title_only=True)
+    return id_column.in_(ids) if ids is not None else None
+
+def _matching_sellers(text):
+    # Poucos usuários: a comparação sem acentos é feita em Python
+    term = normalize(text)
+    return User.id.in_([user.id for user in User.query.with_entities(User.id, User.username)
+                        if term in normalize(user.username)])
+
+def filtered_sales_query(filters):
+    # Usando LEFT JOIN para incluir vendas mesmo quando o vendedor foi excluído
+    query = Sale.query\
+        .join(Client, Sale.client_id == Client.id)\
+        .join(Product, Sale.product_id == Product.id)\
+        .outerjoin(User, Sale.seller_id == User.id)\
+        .options(contains_eager(Sale.client), contains_eager(Sale.product), contains_eager(Sale.seller))
+
+    conditions = [
+        _matching('client', Sale.client_id, filters['client']) if filters['client'] else None,
+        _matching('product', Sale.product_id, filters['product']) if filters['product'] else None,
+        _matching_sellers(filters['seller']) if filters['seller'] else None,
+    ]
+    query = query.filter(*[condition for condition in conditions if condition is not None])
+    if filters['status']:
+        query = query.filter(Sale.status == filters['status'])
+    if filters['date_start']:
+        query = query.filter(Sale.sale_date >= filters['date_start'])
+    if filters['date_end']:
+        # Data final inclusiva
+        query = query.filter(Sale.sale_date < filters['date_end'] + timedelta(days=1))
+    if filters['price_min'] is not None:
+        query = query.filter(Sale.total_price >= filters['price_min'])
+    if filters['price_max'] is not None:
+        query = query.filter(Sale.total_price <= filters['price_max'])
+    return query
+
+def encode_cursor(sale):
+    if sale.sale_date is None:
+        return f'{NULL_DATE}_{sale.id}'
+    return f'{sale.sale_date.strftime("%Y-%m-%dT%H:%M:%S.%f")}_{sale.id}'
+
+def decode_cursor(cursor):
+    try:
+        date_part, id_part = cursor.rsplit('_', 1)
+        if date_part == NULL_DATE:
+            return None, int(id_part)
+        return datetime.strptime(date_part, '%Y-%m-%dT%H:%M:%S.%f'), int(id_part)
+    except (AttributeError, ValueError):
+        return None
+
+def sales_page(filters, cursor=None, page_size=PAGE_SIZE):
+    page_size = max(1, min(page_size or PAGE_SIZE, MAX_PAGE_SIZE))
+    query = filtered_sales_query(filters)
+    position = decode_cursor(cursor) if cursor else None
+    # Uma linha a mais indica se existe próxima página
+    limit = page_size + 1
+
+    sales = []
+    if position is None or position[0] is not None:
+        dated = query.filter(Sale.sale_date.isnot(None))
+        if position:
+            last_date, last_id = position
+            dated = dated.filter(or_(
+                Sale.sale_date < last_date,
+                and_(Sale.sale_date == last_date, Sale.id < last_id)
+            ))
+        sales = dated.order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(limit).all()
+    if len(sales) < limit:
+        # Acabaram as vendas com data: completa com as sem data. Consulta
+        # separada para que as duas usem o índice (sale_date, id).
+        undated = query.filter(Sale.sale_date.is_(None))
+        if position and position[0] is None:
+            undated = undated.filter(Sale.id < position[1])
+        sales += undated.order_by(Sale.id.desc()).limit(limit - len(sales)).all()
+
+    next_cursor = None
+    if len(sales) > page_size:
+        sales = sales[:page_size]
+        next_cursor = encode_cursor(sales[-1])
+    return sales, next_cursor
+
+def price_range():
+    # Limites do controle de faixa de preço. MIN e MAX em consultas separadas:
+    # cada uma lê uma ponta do índice ix_sale_total_price, sem varrer a tabela.
+    low = db.session.query(func.min(Sale.total_price)).scalar()
+    high = db.session.query(func.max(Sale.total_price)).scalar()
+    return round(low or 0), round(high or 0)
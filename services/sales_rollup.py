@@ -0,0 +1,145 @@
+from sqlalchemy import func, insert, select
+from datetime import datetime
+from config import db
+from models import Sale, Product, SaleDailyRollup
+from services.dashboard_metrics import sale_total_expr, unit_cost_expr
+from services.dashboard_cache import mark_dirty, get_cache
+
+# Manutenção incremental da tabela sale_daily_rollup.
+# Só vendas finalizadas contam; cada alteração de venda aplica a diferença
+# entre a contribuição anterior e a nova.
+
+# seller_id do rollup para vendas sem vendedor (a chave única não pode ter NULL)
+NO_SELLER = 0
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def sale_contribution(sale):
+    # Retorna a contribuição da venda para o rollup, ou None se ela não conta
+    if sale.status != 'completed' or sale.sale_date is None:
+        return None
+    product = Product.query.get(sale.product_id)
+    total = sale.total_amount if sale.is_financed else sale.total_price
+    return {
+        'date': _as_date(sale.sale_date),
+        'product_id': sale.product_id,
+        'client_id': sale.client_id,
+        'seller_id': sale.seller_id or NO_SELLER,
+        'count': 1,
+        'quantity': sale.quantity,
+        'revenue': round(total or 0),
+        'cost': (product.total_custos() if product else 0) * sale.quantity,
+    }
+
+def _apply(contribution, sign):
+    values = dict(contribution)
+    for field in ('count', 'quantity', 'revenue', 'cost'):
+        values[field] = sign * values[field]
+    _upsert([values])
+
+def _upsert(rows):
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Upsert atômico: evita perder incrementos entre workers concorrentes
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        table = SaleDailyRollup.__table__
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['date', 'product_id', 'client_id', 'seller_id'],
+            set_={field: table.c[field] + stmt.excluded[field]
+                  for field in ('count', 'quantity', 'revenue', 'cost')}
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    for values in rows:
+        row = SaleDailyRollup.query.filter_by(date=values['date'], product_id=values['product_id'],
+                                              client_id=values['client_id'], seller_id=values['seller_id'])\
+            .with_for_update().first()
+        if row is None:
+            db.session.add(SaleDailyRollup(**values))
+        else:
+            row.count += values['count']
+            row.quantity += values['quantity']
+            row.revenue += values['revenue']
+            row.cost += values['cost']
+
+def apply_sale_delta(before, after):
+    # before/after são resultados de sale_contribution() antes e depois da alteração
+    if before == after:
+        return
+    mark_dirty([c['date'] for c in (before, after) if c is not None])
+    if before is not None:
+        _apply(before, -1)
+    if after is not None:
+        _apply(after, 1)
+
+def apply_sale_deltas(changes):
+    # Versão em lote de apply_sale_delta: soma as diferenças de todas as vendas
+    # por linha do rollup e grava todas num único upsert
+    fields = ('count', 'quantity', 'revenue', 'cost')
+    totals = {}
+    for before, after in changes:
+        if before == after:
+            continue
+        for contribution, sign in ((before, -1), (after, 1)):
+            if contribution is None:
+                continue
+            key = (contribution['date'], contribution['product_id'],
+                   contribution['client_id'], contribution['seller_id'])
+            entry = totals.setdefault(key, dict.fromkeys(fields, 0))
+            for field in fields:
+                entry[field] += sign * contribution[field]
+    if not totals:
+        return
+    mark_dirty({key[0] for key in totals})
+    _upsert([
+        dict(values, date=day, product_id=product_id, client_id=client_id, seller_id=seller_id)
+        for (day, product_id, client_id, seller_id), values in totals.items() if any(values.values())
+    ])
+
+def update_product_cost(product):
+    # O custo do rollup acompanha o custo atual do produto, como no cálculo original do dashboard
+    mark_dirty()
+    SaleDailyRollup.query.filter_by(product_id=product.id)\
+        .update({SaleDailyRollup.cost: SaleDailyRollup.quantity * product.total_custos()},
+                synchronize_session=False)
+
+def delete_client_rows(client_id):
+    mark_dirty()
+    SaleDailyRollup.query.filter_by(client_id=client_id).delete(synchronize_session=False)
+
+def rebuild():
+    # Reconstrói o rollup inteiro a partir das vendas (backfill/correção)
+    day = func.date(Sale.sale_date)
+    seller = func.coalesce(Sale.seller_id, NO_SELLER)
+    source = select(
+            day,
+            Sale.product_id,
+            Sale.client_id,
+            seller,
+            func.count(Sale.id),
+            func.sum(Sale.quantity),
+            func.sum(func.round(sale_total_expr())),
+            func.sum(unit_cost_expr() * Sale.quantity))\
+        .join(Product, Sale.product_id == Product.id)\
+        .where(Sale.status == 'completed')\
+        .group_by(day, Sale.product_id, Sale.client_id, seller)
+
+    table = SaleDailyRollup.__table__
+    db.session.execute(table.delete())
+    db.session.execute(insert(table).from_select(
+        ['date', 'product_id', 'client_id', 'seller_id', 'count', 'quantity', 'revenue', 'cost'],
+        source
+    ))
+    db.session.commit()
+    get_cache().clear()
+    return SaleDailyRollup.query.count()
@@ -0,0 +1,257 @@
+import re
+import time
+import unicodedata
+from types import SimpleNamespace
+from flask import has_request_context, url_for
+from sqlalchemy import event, inspect, text
+from config import app, db
+from models import Client, Product, Sale
+
+# Busca textual no servidor sobre clientes, produtos e vendas. Cada registro
+# vira um documento na tabela search_index: no SQLite uma tabela virtual FTS5,
+# no PostgreSQL uma tabela com tsvector e índice GIN. O texto é normalizado
+# como no normalizeText() das páginas (sem acentos, minúsculas), então "jose"
+# encontra "José". Cada palavra da busca é um prefixo ("mar" encontra "Maria")
+# e todas precisam aparecer; os resultados vêm ordenados por relevância, com o
+# nome pesando mais que os demais campos.
+#
+# O índice é atualizado na mesma transação da gravação (evento after_flush da
+# sessão). Inserções em massa que não passam pela sessão chamam
+# index_documents() diretamente.
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+BATCH_SIZE = 5000
+# Acima disto a busca não é ordenada por relevância (ver _find)
+RANK_LIMIT = 5000
+
+# O id do documento codifica o tipo: ref_id * 4 + código, para que apagar ou
+# regravar um documento seja uma busca pela chave primária
+KINDS = {'client': 1, 'product': 2, 'sale': 3}
+
+# Campos que, quando alterados, exigem regravar o documento
+INDEXED_FIELDS = {
+    Client: ('full_name', 'japan_address', 'japan_phone', 'japan_id', 'email'),
+    Product: ('name', 'description'),
+    Sale: ('notes',),
+}
+
+
+def normalize(value):
+    # Mesmo resultado do normalizeText() em JavaScript
+    value = unicodedata.normalize('NFD', str(value or ''))
+    return ''.join(c for c in value if not unicodedata.combining(c)).lower().strip()
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+def _doc_id(kind, ref_id):
+    return ref_id * 4 + KINDS[kind]
+
+def _client_document(client):
+    # O telefone também entra só com dígitos: "09012345678" encontra "090-1234-5678"
+    return {
+        'label': client.full_name,
+        'title': client.full_name,
+        'body': ' '.join(filter(None, (client.japan_address, client.japan_phone, _digits(client.japan_phone),
+                                       client.japan_id, client.email))),
+    }
+
+def _product_document(product):
+    return {'label': product.name, 'title': product.name, 'body': product.description}
+
+def _sale_document(sale):
+    notes = (sale.notes or '').strip()
+    label = f'Venda #{sale.id} - {notes[:60]}' if notes else f'Venda #{sale.id}'
+    return {'label': label, 'title': '', 'body': notes}
+
+DOCUMENTS = {
+    'client': _client_document,
+    'product': _product_document,
+    'sale': _sale_document,
+}
+
+MODEL_KINDS = {Client: 'client', Product: 'product', Sale: 'sale'}
+
+
+# Estrutura da tabela (também criada pela migração add_search_index)
+
+def create_index_table(connection):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, label UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+    elif connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS search_index ("
+            "rowid BIGINT PRIMARY KEY, kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, "
+            "label TEXT, title TEXT, body TEXT, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING gin (document)"
+        ))
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_after_metadata(target, connection, **kw):
+    # db.create_all() (instalações novas e testes) cria o índice junto com as tabelas
+    create_index_table(connection)
+
+
+# Gravação
+
+def _connection(session=None):
+    return (session or db.session).connection()
+
+def delete_documents(kind, ref_ids, session=None):
+    doc_ids = [_doc_id(kind, ref_id) for ref_id in ref_ids if ref_id is not None]
+    if doc_ids:
+        _connection(session).execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                                     [{'rowid': doc_id} for doc_id in doc_ids])
+
+def index_documents(kind, objects, session=None, replace=True):
+    # objects: instâncias do modelo ou dicionários com os mesmos campos (e id).
+    # Registros sem texto (vendas sem observações) só têm o documento removido.
+    objects = [SimpleNamespace(**obj) if isinstance(obj, dict) else obj for obj in objects]
+    if replace:
+        delete_documents(kind, [obj.id for obj in objects], session)
+    documents = []
+    for obj in objects:
+        document = DOCUMENTS[kind](obj)
+        if not (document['title'] or document['body']):
+            continue
+        documents.append({
+            'rowid': _doc_id(kind, obj.id),
+            'kind': kind,
+            'ref_id': obj.id,
+            'label': document['label'] or '',
+            'title': normalize(document['title']),
+            'body': normalize(document['body']),
+        })
+    if not documents:
+        return 0
+    _connection(session).execute(text(
+        'INSERT INTO search_index (rowid, kind, ref_id, label, title, body) '
+        'VALUES (:rowid, :kind, :ref_id, :label, :title, :body)'
+    ), documents)
+    return len(documents)
+
+def _changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS[type(obj)])
+
+@event.listens_for(db.session, 'after_flush')
+def _index_after_flush(session, flush_context):
+    changed = {}
+    deleted = {}
+    for obj in session.new:
+        if type(obj) in MODEL_KINDS:
+            changed.setdefault(MODEL_KINDS[type(obj)], []).append(obj)
+    for obj in session.dirty:
+        if type(obj) in MODEL_KINDS and _changed(obj):
+            changed.setdefault(MODEL_KINDS[type(obj)], []).append(obj)
+    for obj in session.deleted:
+        if type(obj) in MODEL_KINDS:
+            deleted.setdefault(MODEL_KINDS[type(obj)], []).append(obj.id)
+    for kind, objects in changed.items():
+        index_documents(kind, objects, session)
+    for kind, ref_ids in deleted.items():
+        delete_documents(kind, ref_ids, session)
+
+def rebuild():
+    # Regera o índice inteiro a partir das tabelas (carga inicial/correção)
+    create_index_table(_connection())
+    db.session.execute(text('DELETE FROM search_index'))
+    count = 0
+    for model, kind in MODEL_KINDS.items():
+        columns = [getattr(model, field) for field in ('id',) + INDEXED_FIELDS[model]]
+        batch = []
+        for row in db.session.query(*columns).order_by(model.id).yield_per(BATCH_SIZE):
+            batch.append(row._asdict())
+            if len(batch) == BATCH_SIZE:
+                count += index_documents(kind, batch, replace=False)
+                batch = []
+        count += index_documents(kind, batch, replace=False)
+    db.session.commit()
+    return count
+
+
+# Consulta
+
+def _terms(query):
+    return re.findall(r'\w+', normalize(query))
+
+def _match_expression(terms, dialect, title_only=False):
+    # title_only: só o nome (coluna title, peso A no PostgreSQL)
+    if dialect == 'postgresql':
+        return ' & '.join(f'{term}:*A' if title_only else f'{term}:*' for term in terms)
+    return ' '.join(f'title : "{term}"*' if title_only else f'"{term}"*' for term in terms)
+
+def matching_ids(kind, query, title_only=False):
+    # Subconsulta com os ids dos registros do tipo que atendem à busca, para
+    # filtrar consultas do ORM: Model.id.in_(matching_ids(...)). None sem termos.
+    terms = _terms(query)
+    if not terms:
+        return None
+    dialect = db.session.get_bind().dialect.name
+    return text(f'SELECT ref_id FROM search_index WHERE {_match_condition(dialect)} AND rowid % 4 = :code')\
+        .bindparams(match=_match_expression(terms, dialect, title_only), code=KINDS[kind])\
+        .columns(ref_id=db.Integer)
+
+URL_ENDPOINTS = {'client': 'clients.edit_client', 'product': 'products.edit_product', 'sale': 'sales.edit_sale'}
+
+def _url(kind, ref_id):
+    return url_for(URL_ENDPOINTS[kind], id=ref_id) if has_request_context() else None
+
+def _match_condition(dialect):
+    if dialect == 'postgresql':
+        return "document @@ to_tsquery('simple', :match)"
+    return 'search_index MATCH :match'
+
+def _rank_order(dialect):
+    if dialect == 'postgresql':
+        return "ts_rank(document, to_tsquery('simple', :match)) DESC"
+    # bm25: o nome (title) vale 5x os demais campos
+    return 'bm25(search_index, 0, 0, 0, 5.0, 1.0)'
+
+def _find(terms, kind, limit):
+    dialect = db.session.get_bind().dialect.name
+    # O tipo sai do próprio id do documento, sem ler as colunas guardadas
+    where = _match_condition(dialect) + (' AND rowid % 4 = :code' if kind else '')
+    params = {'match': _match_expression(terms, dialect), 'code': KINDS.get(kind), 'limit': limit,
+              'cap': RANK_LIMIT + 1}
+    # Calcular a relevância custa por documento encontrado. Buscas muito amplas
+    # ("ma", "silva") encontram centenas de milhares de documentos; nelas a
+    # relevância pouco diz e os resultados vêm dos registros mais recentes.
+    matches = db.session.execute(text(
+        f'SELECT count(*) FROM (SELECT 1 FROM search_index WHERE {where} LIMIT :cap) AS matches'
+    ), params).scalar()
+    order = _rank_order(dialect) if matches <= RANK_LIMIT else 'rowid DESC'
+    return db.session.execute(text(
+        f'SELECT kind, ref_id, label FROM search_index WHERE {where} ORDER BY {order} LIMIT :limit'
+    ), params).all()
+
+def search(query, kind=None, limit=SEARCH_LIMIT):
+    # Resultados ordenados por relevância: [{'kind', 'id', 'label', 'url'}]
+    started = time.monotonic()
+    terms = _terms(query)
+    limit = min(max(limit or SEARCH_LIMIT, 1), MAX_SEARCH_LIMIT)
+    rows = []
+    if terms and (kind is None or kind in KINDS):
+        try:
+            rows = _find(terms, kind, limit)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'Erro na busca "{query}": {e}')
+    return {
+        'query': query,
+        'results': [
+            {'kind': row.kind, 'id': row.ref_id, 'label': row.label, 'url': _url(row.kind, row.ref_id)}
+            for row in rows
+        ],
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+    }
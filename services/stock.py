@@ -0,0 +1,153 @@
+from sqlalchemy import case, update
+from sqlalchemy.orm.attributes import set_committed_value
+from config import db
+from models import Product, Sale
+from services.inventory import record_movement, record_movements
+
+# Controle de estoque com atualizações atômicas condicionais no banco
+# (UPDATE ... WHERE stock >= :q), em vez de ler, alterar e gravar o valor em
+# Python: com vários workers concorrentes nenhuma atualização se perde e o
+# estoque nunca fica negativo.
+#
+# Vendas pendentes ou em negociação reservam a quantidade (Product.reserved);
+# o disponível para novas vendas é stock - reserved. Ao finalizar a venda a
+# reserva vira baixa de estoque; ao cancelar, a reserva ou a baixa é desfeita.
+# Toda alteração do estoque é registrada no livro de movimentações
+# (services/inventory.py).
+
+RESERVING_STATUSES = ('pending', 'negotiating')
+
+
+def _update_product(product_id, condition=None, **values):
+    stmt = update(Product).where(Product.id == product_id)
+    if condition is not None:
+        stmt = stmt.where(condition)
+    if 'stock' in values:
+        # is_active acompanha o estoque, como em Product.update_status()
+        values['is_active'] = case((values['stock'] > 0, True), else_=False)
+    result = db.session.execute(stmt.values(**values).execution_options(synchronize_session='fetch'))
+    return result.rowcount == 1
+
+def available(product):
+    return (product.stock or 0) - (product.reserved or 0)
+
+def reserve(product_id, quantity):
+    # Reserva a quantidade se houver disponível; False se não houver
+    if quantity <= 0:
+        return release(product_id, -quantity)
+    return _update_product(product_id, Product.stock - Product.reserved >= quantity,
+                           reserved=Product.reserved + quantity)
+
+def release(product_id, quantity):
+    if quantity == 0:
+        return True
+    return _update_product(product_id, Product.reserved >= quantity,
+                           reserved=Product.reserved - quantity)
+
+def change_reservation(old_product_id, old_quantity, new_product_id, new_quantity):
+    # Edição de venda pendente: troca a reserva antiga pela nova
+    if old_product_id == new_product_id:
+        return reserve(new_product_id, new_quantity - old_quantity)
+    if not reserve(new_product_id, new_quantity):
+        return False
+    return release(old_product_id, old_quantity)
+
+def consume_reservation(product_id, quantity, sale_id=None):
+    # Finalização: a reserva vira baixa de estoque
+    if not _update_product(product_id, Product.stock >= quantity,
+                           stock=Product.stock - quantity,
+                           reserved=case((Product.reserved >= quantity, Product.reserved - quantity), else_=0)):
+        return False
+    record_movement(product_id, -quantity, 'sale', sale_id=sale_id)
+    return True
+
+def restock(product_id, quantity, sale_id=None):
+    # Cancelamento de venda finalizada: devolve a quantidade ao estoque
+    if not _update_product(product_id, stock=Product.stock + quantity):
+        return False
+    record_movement(product_id, quantity, 'cancel', sale_id=sale_id)
+    return True
+
+def set_stock(product, new_stock, loaded_stock=None):
+    # Ajuste manual (edição do produto): grava a diferença no livro. loaded_stock
+    # é o estoque mostrado no formulário; só altera se o estoque ainda for esse,
+    # para não sobrescrever uma venda finalizada entre abrir e enviar o
+    # formulário. Sem alteração no campo, nada é gravado.
+    old_stock = (product.stock or 0) if loaded_stock is None else loaded_stock
+    if new_stock == old_stock:
+        return True
+    if not _update_product(product.id, Product.stock == old_stock,
+                           stock=Product.stock + (new_stock - old_stock)):
+        return False
+    record_movement(product.id, new_stock - old_stock, 'adjustment')
+    return True
+
+def transition_sale(sale, from_statuses, to_status):
+    # Troca o status só se a venda ainda estiver num dos status esperados, para
+    # que duas requisições simultâneas não finalizem (ou cancelem) a mesma venda
+    return transition_sales([sale], from_statuses, to_status)
+
+def transition_sales(sales, from_statuses, to_status, **values):
+    # Versão em lote: um único UPDATE; False se alguma venda já mudou de status
+    if not sales:
+        return True
+    result = db.session.execute(
+        update(Sale)
+        .where(Sale.id.in_([sale.id for sale in sales]), Sale.status.in_(from_statuses))
+        .values(status=to_status, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(sales):
+        return False
+    for sale in sales:
+        set_committed_value(sale, 'status', to_status)
+        for key, value in values.items():
+            set_committed_value(sale, key, value)
+    return True
+
+def quantities_by_product(sales):
+    totals = {}
+    for sale in sales:
+        totals[sale.product_id] = totals.get(sale.product_id, 0) + sale.quantity
+    return totals
+
+# Operações em lote: as quantidades são somadas por produto (um UPDATE por
+# produto) e o livro recebe uma movimentação por venda, num único INSERT
+
+def consume_reservations(sales):
+    for product_id, quantity in quantities_by_product(sales).items():
+        if not _update_product(product_id, Product.stock >= quantity,
+                               stock=Product.stock - quantity,
+                               reserved=case((Product.reserved >= quantity, Product.reserved - quantity), else_=0)):
+            return False
+    record_movements([(sale.product_id, -sale.quantity, 'sale', sale.id) for sale in sales])
+    return True
+
+def restock_sales(sales):
+    for product_id, quantity in quantities_by_product(sales).items():
+        if not _update_product(product_id, stock=Product.stock + quantity):
+            return False
+    record_movements([(sale.product_id, sale.quantity, 'cancel', sale.id) for sale in sales])
+    return True
+
+def release_sales(sales):
+    # Todos os produtos são tentados, mesmo depois de uma falha
+    return all([release(product_id, quantity) for product_id, quantity in quantities_by_product(sales).items()])
+
+def release_deleted_sales(sales):
+    # Vendas que vão ser excluídas (cliente ou usuário removido): as pendentes e
+    # em negociação são canceladas com a troca condicional de status e liberam a
+    # reserva, como no cancelamento. False se alguma mudou de status no meio tempo.
+    reserving = [sale for sale in sales if sale.status in RESERVING_STATUSES]
+    if not transition_sales(reserving, RESERVING_STATUSES, 'cancelled'):
+        return False
+    return release_sales(reserving)
+
+def reserved_quantities():
+    # Reservas esperadas a partir das vendas (para conferência e para a migração)
+    return dict(
+        db.session.query(Sale.product_id, db.func.sum(Sale.quantity))
+        .filter(Sale.status.in_(RESERVING_STATUSES))
+        .group_by(Sale.product_id)
+        .all()
+    )
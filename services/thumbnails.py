@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+from importlib.util import find_spec
+from concurrent.futures import ThreadPoolExecutor
+from config import app
+from services.blob_store import get_blob_store
+
+# Geração de versões reduzidas das imagens (miniaturas) para a galeria e a lista de clientes.
+# As versões são geradas em segundo plano logo após o upload e gravadas ao lado do
+# original no armazenamento, nomeadas pelo hash do original, tamanho e formato.
+
+SIZES = (256, 768)
+FORMATS = ('webp', 'jpeg')
+MAX_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def enabled():
+    # Sem Pillow as imagens são servidas sempre no tamanho original. O Pillow só
+    # é importado na primeira miniatura gerada.
+    return find_spec('PIL') is not None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=app.config.get('THUMBNAIL_WORKERS', MAX_WORKERS),
+                                               thread_name_prefix='thumbnails')
+    return _executor
+
+def derivative_name(size, fmt):
+    return f'{size}.{fmt}'
+
+def _failed_path(store, digest, size, fmt):
+    # Marca de falha ao lado das miniaturas: removida junto com elas
+    return store.derived_path(digest, f'{derivative_name(size, fmt)}.failed')
+
+def mark_failed(digest, size, fmt):
+    # Imagem que o Pillow não consegue converter (arquivo corrompido, formato ou
+    # modo não suportado): as próximas requisições servem o original sem tentar de novo
+    path = _failed_path(get_blob_store(), digest, size, fmt)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+    except OSError as e:
+        app.logger.warning(f'Erro ao marcar miniatura {size}/{fmt} de {digest} como falha: {e}')
+
+def generate(digest, size, fmt):
+    # Gera (se ainda não existir) uma versão da imagem e devolve o caminho
+    store = get_blob_store()
+    target = store.derived_path(digest, derivative_name(size, fmt))
+    if os.path.exists(target):
+        return target
+    if not enabled() or not store.exists(digest) or os.path.exists(_failed_path(store, digest, size, fmt)):
+        return None
+
+    from PIL import Image
+    with Image.open(store.path(digest)) as img:
+        img.thumbnail((size, size), Image.LANCZOS)
+        if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.thumb-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                img.save(temp, format=fmt.upper(), quality=80)
+            os.replace(temp_path, target)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return target
+
+def _generate_all(digest):
+    for size in SIZES:
+        for fmt in FORMATS:
+            try:
+                generate(digest, size, fmt)
+            except Exception as e:
+                app.logger.warning(f'Erro ao gerar miniatura {size}/{fmt} de {digest}: {e}')
+                mark_failed(digest, size, fmt)
+
+def schedule(digest):
+    # Enfileira a geração de todas as versões, sem bloquear a requisição do upload
+    if enabled() and digest:
+        _get_executor().submit(_generate_all, digest)
+
+def negotiate_format(accept_mimetypes):
+    return 'webp' if accept_mimetypes['image/webp'] else 'jpeg'
@@ -0,0 +1,138 @@
+import argparse
+import multiprocessing
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from app import app
+from config import db
+from models import Product, Client, Sale, User
+from services.inventory import record_movement
+
+# Teste de carga do controle de estoque (services/stock.py): vários workers
+# finalizam, cancelam e criam vendas do mesmo produto ao mesmo tempo, pelas
+# rotas da aplicação. No fim o estoque não pode estar negativo, nenhuma venda
+# pode ter sido finalizada duas vezes e estoque/reserva precisam bater com as
+# vendas. Cria um produto e um cliente próprios e remove tudo ao final.
+# Uso: python stress_stock.py [--workers 8] [--processes] [--stock 20] [--rounds 3]
+
+def setup(stock):
+    admin = User.query.filter_by(is_admin=True).first()
+    if admin is None:
+        raise SystemExit('Nenhum administrador cadastrado.')
+    tag = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+    product = Product(name=f'stress-{tag}', description='stress', price=100, stock=stock, reserved=stock)
+    client = Client(full_name=f'stress-{tag}', japan_id=f'stress-{tag}', email=f'stress-{tag}@example.com')
+    db.session.add_all([product, client])
+    db.session.flush()
+    record_movement(product.id, stock, 'initial')
+    # Uma venda pendente por unidade: todo o estoque começa reservado
+    sales = [
+        Sale(product_id=product.id, client_id=client.id, seller_id=admin.id, quantity=1,
+             original_price=100, discount_percentage=0, total_price=100, status='pending',
+             sale_date=datetime.utcnow())
+        for _ in range(stock)
+    ]
+    db.session.add_all(sales)
+    db.session.commit()
+    return admin.id, product.id, client.id, [sale.id for sale in sales]
+
+def login(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+def worker(args):
+    seed, user_id, product_id, client_id, sale_ids, rounds = args
+    rng = random.Random(seed)
+    client = login(user_id)
+    for _ in range(rounds):
+        rng.shuffle(sale_ids)
+        for sale_id in sale_ids:
+            action = rng.random()
+            if action < 0.1:
+                client.post(f'/sales/{sale_id}/cancel')
+            else:
+                client.post(f'/sales/{sale_id}/complete')
+            if action > 0.8:
+                client.post('/sales/new', data={
+                    'product_id': product_id, 'client_id': client_id, 'quantity': 1,
+                    'discount_percentage': 0, 'sale_date': datetime.utcnow().strftime('%Y-%m-%d'),
+                    'financing_years': 1, 'interest_rate': 0, 'notes': 'stress',
+                })
+    return seed
+
+def process_init():
+    # Cada processo abre as próprias conexões
+    with app.app_context():
+        db.engine.dispose()
+
+def check(product_id, initial_stock):
+    db.session.expire_all()
+    product = db.session.get(Product, product_id)
+    sales = Sale.query.filter_by(product_id=product_id).all()
+    completed = sum(sale.quantity for sale in sales if sale.status == 'completed')
+    pending = sum(sale.quantity for sale in sales if sale.status in ('pending', 'negotiating'))
+    problems = []
+    if product.stock < 0:
+        problems.append(f'estoque negativo: {product.stock}')
+    if product.stock != initial_stock - completed:
+        problems.append(f'estoque {product.stock} != {initial_stock} - {completed} finalizadas')
+    if product.reserved != pending:
+        problems.append(f'reservado {product.reserved} != {pending} pendentes')
+    if product.stock - product.reserved < 0:
+        problems.append(f'reservado ({product.reserved}) maior que o estoque ({product.stock})')
+    print(f'Vendas: {len(sales)} ({completed} finalizadas, {pending} pendentes), '
+          f'estoque {product.stock}, reservado {product.reserved}')
+    return problems
+
+def cleanup(product_id, client_id):
+    from services.sales_rollup import delete_client_rows
+    from services.financing import delete_installments
+    from services.search import delete_documents
+    sale_ids = [sale_id for (sale_id,) in db.session.query(Sale.id).filter_by(client_id=client_id)]
+    delete_installments(sale_ids)
+    delete_documents('sale', sale_ids)
+    delete_client_rows(client_id)
+    Sale.query.filter_by(client_id=client_id).delete()
+    product = db.session.get(Product, product_id)
+    record_movement(product_id, -product.stock, 'delete')
+    db.session.delete(product)
+    db.session.delete(db.session.get(Client, client_id))
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do controle de estoque.')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', action='store_true', help='usa processos em vez de threads')
+    parser.add_argument('--stock', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3)
+    options = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        user_id, product_id, client_id, sale_ids = setup(options.stock)
+
+    jobs = [(seed, user_id, product_id, client_id, list(sale_ids), options.rounds)
+            for seed in range(options.workers)]
+    if options.processes:
+        with multiprocessing.get_context('fork').Pool(options.workers, initializer=process_init) as pool:
+            pool.map(worker, jobs)
+    else:
+        with ThreadPoolExecutor(options.workers) as executor:
+            list(executor.map(worker, jobs))
+
+    with app.app_context():
+        try:
+            problems = check(product_id, options.stock)
+        finally:
+            cleanup(product_id, client_id)
+
+    for problem in problems:
+        print(f'!! {problem}')
+    print('Estoque consistente.' if not problems else f'{len(problems)} problema(s).')
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())